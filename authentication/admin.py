@@ -4,6 +4,8 @@ from django.contrib import admin
 
 from rest_framework_simplejwt import token_blacklist
 
+from authentication.models import RevokedToken
+
 
 class OutstandingTokenAdmin(token_blacklist.admin.OutstandingTokenAdmin):
     actions = ['delete_selected']
@@ -14,3 +16,9 @@ class OutstandingTokenAdmin(token_blacklist.admin.OutstandingTokenAdmin):
 
 admin.site.unregister(token_blacklist.models.OutstandingToken)
 admin.site.register(token_blacklist.models.OutstandingToken, OutstandingTokenAdmin)
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ('jti', 'expires_at')
+    search_fields = ('jti',)
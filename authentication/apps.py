@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from django.contrib.auth.password_validation import get_default_password_validators
+
+        # Registers the OpenAPI extensions of the authentication classes, and the job handlers
+        from . import jobs, schema  # noqa: F401
+
+        # The validators, and the common passwords list, are cached per process:
+        # load them at startup rather than during the first registration
+        get_default_password_validators()
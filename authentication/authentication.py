@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from authentication.tokens import USER_CLAIMS
+from users.models import ClaimsUser
+
+User = get_user_model()
+
+
+class ClaimsJWTCookieAuthentication(JWTCookieAuthentication):
+    """
+    JWT cookie authentication building request.user from the token claims.
+
+    The user row is only loaded if a field outside of the claims is accessed.
+    When JWT_REVALIDATE_ACTIVE_TTL is set, the active status is revalidated at
+    most once per TTL and user through the cache, otherwise the claim is trusted
+    until the access token expires. Tokens issued without the claims fall back
+    to loading the user.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if not validated_token['is_active'] or not self.is_active(user_id):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        claims = {api_settings.USER_ID_FIELD: user_id}
+        claims.update((claim, validated_token[claim]) for claim in USER_CLAIMS)
+        return ClaimsUser.from_claims(claims)
+
+    def is_active(self, user_id):
+        ttl = getattr(settings, 'JWT_REVALIDATE_ACTIVE_TTL', None)
+        if not ttl:
+            return True
+
+        key = 'auth:user-active:{}'.format(user_id)
+        active = cache.get(key)
+        if active is None:
+            active = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id, 'is_active': True}).exists()
+            cache.set(key, active, ttl)
+        return active
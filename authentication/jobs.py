@@ -0,0 +1,7 @@
+from jobs.registry import job
+from .revocation import purge_expired
+
+
+@job('authentication.purge_revocations')
+def purge_revocations(payload):
+    purge_expired()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from authentication.revocation import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired token revocations and expired legacy outstanding tokens in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help='Number of rows deleted per statement.')
+        parser.add_argument('--max-chunks', type=int, default=None,
+                            help='Maximum number of chunks per table, unlimited by default.')
+
+    def handle(self, *args, **options):
+        revocations, outstanding = purge_expired(options['chunk_size'], options['max_chunks'])
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted {} expired revocations and {} expired outstanding tokens.'.format(revocations, outstanding)))
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def revoke_blacklisted_tokens(apps, schema_editor):
+    """Revoke the unexpired refresh tokens of the legacy blacklist, which isn't checked anymore."""
+
+    BlacklistedToken = apps.get_model('token_blacklist', 'BlacklistedToken')
+    RevokedToken = apps.get_model('authentication', 'RevokedToken')
+
+    blacklisted = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()) \
+        .order_by('id').values_list('token__jti', 'token__expires_at')
+    batch = []
+    for jti, expires_at in blacklisted.iterator():
+        batch.append(RevokedToken(jti=jti, expires_at=expires_at))
+        if len(batch) == BATCH_SIZE:
+            RevokedToken.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    RevokedToken.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(revoke_blacklisted_tokens, migrations.RunPython.noop),
+    ]
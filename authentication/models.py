@@ -1,3 +1,16 @@
 from django.db import models
 
-# Create your models here.
+
+class RevokedToken(models.Model):
+    """
+    Revoked refresh token, kept only until the token expires.
+    """
+
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,163 @@
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from authentication.models import RevokedToken
+from jobs.registry import enqueue
+
+DEFAULTS = {
+    'BLOOM_CAPACITY': 100000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'BLOOM_REBUILD_INTERVAL': 3600,
+    'GENERATION_CHECK_INTERVAL': 5,
+    'PURGE_INTERVAL': 600,
+    'PURGE_CHUNK_SIZE': 1000,
+}
+
+GENERATION_KEY = 'auth:revocations:generation'
+
+
+def get_setting(name):
+    return getattr(settings, 'TOKEN_REVOCATION', {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter of strings, sized for a capacity and a false positive rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing, the k positions are derived from two 64 bits hashes
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationStore:
+    """
+    Membership of refresh tokens in the revoked tokens table.
+
+    Lookups are answered by a process local Bloom filter of the unexpired
+    revocations, only its hits are confirmed in the database. Other processes'
+    revocations are loaded incrementally whenever the generation value kept in
+    the shared cache changes, which is checked at most every
+    GENERATION_CHECK_INTERVAL seconds, and the filter is rebuilt periodically
+    to drop the expired tokens.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.built_at = 0
+        self.last_id = 0
+        self.generation = None
+        self.checked_at = 0
+
+    def sync(self):
+        now = time.monotonic()
+        expired = now - self.built_at > get_setting('BLOOM_REBUILD_INTERVAL')
+        outdated = self.bloom is None or expired or self.bloom.count > self.bloom.capacity
+        # The shared cache is the database on production, not queried on every lookup
+        if not outdated and now - self.checked_at < get_setting('GENERATION_CHECK_INTERVAL'):
+            return
+
+        generation = cache.get(GENERATION_KEY)
+        with self.lock:
+            self.checked_at = now
+            if outdated:
+                capacity = get_setting('BLOOM_CAPACITY')
+                if self.bloom is not None:
+                    capacity = max(capacity, self.bloom.count * 2)
+                self.bloom = BloomFilter(capacity, get_setting('BLOOM_ERROR_RATE'))
+                self.built_at = time.monotonic()
+                self.last_id = 0
+            elif generation == self.generation:
+                return
+
+            revocations = RevokedToken.objects.filter(id__gt=self.last_id, expires_at__gt=timezone.now()) \
+                .order_by('id').values_list('id', 'jti')
+            for revocation_id, jti in revocations.iterator():
+                self.bloom.add(jti)
+                self.last_id = revocation_id
+            self.generation = generation
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def revoke(self, jti, expires_at):
+        """
+        Revoke a token until its expiration, return False if it was already revoked.
+        """
+
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+        transaction.on_commit(self.revoked)
+        return True
+
+    def revoked(self):
+        # A new random value rather than an increment, which isn't atomic on every cache backend
+        cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+        # Periodic cleanup by the job workers, at most one pending purge at a time
+        enqueue('authentication.purge_revocations', dedup_key='authentication.purge_revocations',
+                delay=get_setting('PURGE_INTERVAL'))
+
+
+def purge_expired(chunk_size=None, max_chunks=None):
+    """
+    Delete expired revocations, and expired legacy blacklist tokens, in chunks.
+
+    Return the number of deleted revocations and outstanding tokens.
+    """
+
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    chunk_size = chunk_size or get_setting('PURGE_CHUNK_SIZE')
+    deleted = {}
+    for model in (RevokedToken, OutstandingToken):
+        deleted[model] = 0
+        chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            ids = list(model.objects.filter(expires_at__lte=timezone.now())
+                       .order_by('expires_at').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            model.objects.filter(id__in=ids).delete()
+            deleted[model] += len(ids)
+            chunks += 1
+    return deleted[RevokedToken], deleted[OutstandingToken]
+
+
+revocations = RevocationStore()
@@ -0,0 +1,16 @@
+from drf_spectacular.contrib.rest_auth import SimpleJWTCookieScheme
+from drf_spectacular.contrib.rest_framework_simplejwt import (
+    TokenObtainPairSerializerExtension, TokenRefreshSerializerExtension
+)
+
+
+class ClaimsJWTCookieScheme(SimpleJWTCookieScheme):
+    target_class = 'authentication.authentication.ClaimsJWTCookieAuthentication'
+
+
+class ClaimsTokenObtainPairSerializerExtension(TokenObtainPairSerializerExtension):
+    target_class = 'authentication.serializers.TokenObtainPairSerializer'
+
+
+class ClaimsTokenRefreshSerializerExtension(TokenRefreshSerializerExtension):
+    target_class = 'authentication.serializers.TokenRefreshSerializer'
@@ -1,3 +1,250 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from authentication.models import RevokedToken
+from authentication.revocation import BloomFilter, RevocationStore, get_setting
+from authentication.throttling import password_hashing_slot
 
-# Create your tests here.
+User = get_user_model()
+
+
+class ClaimsAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User(email='testuser@snip.com', username='test_user', first_name='Test')
+        user.set_password('test_pass')
+        user.save()
+        self.user = user
+
+        response = self.client.post('/api/auth/login/', {
+            'username': 'test_user',
+            'password': 'test_pass',
+        }, format='json')
+        self.tokens = json.loads(response.content)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.tokens['access'])
+
+    @override_settings(JWT_REVALIDATE_ACTIVE_TTL=0)
+    def test_user_from_claims(self):
+        """
+        Verify authentication doesn't query the user and loads it once when needed
+        """
+
+        # Only the count of the (empty) snippets page
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/me/snippets/')
+        self.assertEqual(200, response.status_code)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/me/')
+        result = json.loads(response.content)
+        self.assertEqual(result['email'], 'testuser@snip.com')
+        self.assertEqual(result['first_name'], 'Test')
+
+    def test_inactive_user_revalidated(self):
+        """
+        Verify deactivated users are rejected once the cached active status expires
+        """
+
+        self.assertEqual(200, self.client.get('/api/users/me/').status_code)
+        self.user.is_active = False
+        self.user.save()
+        cache.clear()
+        self.assertEqual(401, self.client.get('/api/users/me/').status_code)
+
+    def test_refresh_updates_claims(self):
+        """
+        Verify refreshed access tokens carry the current user claims
+        """
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post('/api/auth/login/refresh/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(200, response.status_code)
+
+        self.assertTrue(AccessToken(json.loads(response.content)['access'])['is_staff'])
+
+
+class RevocationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='testuser@snip.com', username='test_user', password='test_pass')
+        response = self.client.post('/api/auth/login/', {
+            'username': 'test_user',
+            'password': 'test_pass',
+        }, format='json')
+        self.tokens = json.loads(response.content)
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/login/refresh/', {'refresh': token}, format='json')
+
+    def test_rotated_token_revoked(self):
+        """
+        Verify a rotated refresh token can't be used again and no blacklist rows are written
+        """
+
+        response = self.refresh(self.tokens['refresh'])
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(200, self.refresh(json.loads(response.content)['refresh']).status_code)
+        self.assertEqual(401, self.refresh(self.tokens['refresh']).status_code)
+
+        self.assertEqual(RevokedToken.objects.count(), 2)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_legacy_blacklist_revoked(self):
+        """
+        Verify the refresh tokens blacklisted before the revocation store stay revoked
+        """
+
+        blacklisted = RefreshToken.for_user(self.user)
+        blacklisted.blacklist()
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now())
+
+        migration = import_module('authentication.migrations.0002_revoke_blacklisted_tokens')
+        migration.revoke_blacklisted_tokens(apps, None)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), [blacklisted['jti']])
+        self.assertEqual(401, self.refresh(str(blacklisted)).status_code)
+
+    def test_bloom_filter_lookup(self):
+        """
+        Verify tokens missing from the Bloom filter are not looked up in the database
+        """
+
+        store = RevocationStore()
+        store.revoke('revoked', timezone.now() + timedelta(days=1))
+        store.sync()
+
+        with self.assertNumQueries(0):
+            self.assertFalse(store.is_revoked('valid'))
+        self.assertTrue(store.is_revoked('revoked'))
+
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(str(i))
+        self.assertTrue(all(str(i) in bloom for i in range(1000)))
+        self.assertLess(sum(str(i) in bloom for i in range(1000, 11000)), 300)
+
+    def test_other_process_revocations(self):
+        """
+        Verify the revocations of other processes are loaded once the generation is checked again
+        """
+
+        store = RevocationStore()
+        store.sync()
+        with self.captureOnCommitCallbacks(execute=True):
+            RevocationStore().revoke('other', timezone.now() + timedelta(days=1))
+
+        self.assertFalse(store.is_revoked('other'))
+        store.checked_at -= get_setting('GENERATION_CHECK_INTERVAL')
+        self.assertTrue(store.is_revoked('other'))
+
+    def test_purge_expired(self):
+        """
+        Verify only expired revocations are purged
+        """
+
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti='expired-{}'.format(i), expires_at=timezone.now() - timedelta(hours=1))
+             for i in range(5)] + [RevokedToken(jti='valid', expires_at=timezone.now() + timedelta(hours=1))])
+
+        call_command('purge_revoked_tokens', chunk_size=2, stdout=StringIO())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['valid'])
+
+
+class ThrottlingTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(email='testuser@snip.com', username='test_user', password='test_pass')
+
+    def login(self, username='test_user', password='wrong_pass', **extra):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': password}, format='json',
+                                **extra)
+
+    @mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'login_username': '2/min'})
+    def test_login_username_throttle(self):
+        """
+        Verify login attempts are limited per username across client IPs
+        """
+
+        self.assertEqual(401, self.login(REMOTE_ADDR='10.0.0.1').status_code)
+        self.assertEqual(401, self.login(REMOTE_ADDR='10.0.0.2').status_code)
+        self.assertEqual(429, self.login(REMOTE_ADDR='10.0.0.3').status_code)
+        self.assertEqual(401, self.login(username='other_user').status_code)
+
+    @mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'login_ip': '2/min'})
+    def test_login_ip_throttle(self):
+        """
+        Verify login attempts are limited per client IP
+        """
+
+        self.assertEqual(401, self.login(username='first').status_code)
+        self.assertEqual(401, self.login(username='second').status_code)
+        self.assertEqual(429, self.login(username='third').status_code)
+
+    def test_login_body_not_object(self):
+        """
+        Verify login bodies which aren't objects are rejected rather than failing the username throttle
+        """
+
+        for body in ([], 'test_user'):
+            response = self.client.post('/api/auth/login/', body, format='json')
+            self.assertEqual(400, response.status_code)
+
+    @mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'login_ip': '2/min'})
+    def test_spoofed_forwarded_for(self):
+        """
+        Verify the client supplied X-Forwarded-For entries don't change the throttled client IP
+        """
+
+        self.assertEqual(401, self.login(HTTP_X_FORWARDED_FOR='1.1.1.1').status_code)
+        self.assertEqual(401, self.login(HTTP_X_FORWARDED_FOR='2.2.2.2').status_code)
+        self.assertEqual(429, self.login(HTTP_X_FORWARDED_FOR='3.3.3.3').status_code)
+
+        cache.clear()
+        with override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, NUM_PROXIES=1)):
+            self.assertEqual(401, self.login(HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.1').status_code)
+            self.assertEqual(401, self.login(HTTP_X_FORWARDED_FOR='2.2.2.2, 10.0.0.1').status_code)
+            self.assertEqual(429, self.login(HTTP_X_FORWARDED_FOR='3.3.3.3, 10.0.0.1').status_code)
+            self.assertEqual(401, self.login(HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.2').status_code)
+
+    @override_settings(PASSWORD_HASHING_CONCURRENCY=2)
+    def test_hashing_concurrency(self):
+        """
+        Verify requests are shed when every password hashing slot is taken
+        """
+
+        cache.add('auth:hashing-slot:0', 'busy')
+        cache.add('auth:hashing-slot:1', 'busy')
+        self.assertEqual(429, self.login(password='test_pass').status_code)
+
+        cache.delete('auth:hashing-slot:1')
+        self.assertEqual(200, self.login(password='test_pass').status_code)
+        self.assertIsNone(cache.get('auth:hashing-slot:1'))
+
+    @override_settings(PASSWORD_HASHING_CONCURRENCY=1)
+    def test_expired_hashing_slot(self):
+        """
+        Verify a request doesn't release a slot taken by another one once its own expired
+        """
+
+        with password_hashing_slot():
+            # Expired, then taken by another request
+            cache.set('auth:hashing-slot:0', 'other')
+        self.assertEqual('other', cache.get('auth:hashing-slot:0'))
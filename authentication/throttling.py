@@ -0,0 +1,83 @@
+import hashlib
+import random
+import uuid
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class IPRateThrottle(SimpleRateThrottle):
+    """
+    Sliding window rate limit of a scope per client IP, stored in the shared cache.
+    """
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginIPRateThrottle(IPRateThrottle):
+    scope = 'login_ip'
+
+
+class RegisterIPRateThrottle(IPRateThrottle):
+    scope = 'register_ip'
+
+
+class LoginUsernameRateThrottle(SimpleRateThrottle):
+    """
+    Sliding window rate limit of the login attempts per username, whatever the client IP.
+    """
+
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        # Throttles run before the serializer rejects bodies which aren't objects
+        data = request.data if isinstance(request.data, Mapping) else {}
+        username = data.get('username')
+        if not isinstance(username, str) or not username:
+            return None
+        ident = hashlib.sha256(username.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+@contextmanager
+def password_hashing_slot():
+    """
+    Hold one of the PASSWORD_HASHING_CONCURRENCY slots shared by every process.
+
+    Raises Throttled when all the slots are taken, so that requests are shed
+    before starting to hash. Slots expire after PASSWORD_HASHING_SLOT_TIMEOUT
+    seconds in case a process dies while holding one, and are only released by
+    their holder.
+    """
+
+    slots = list(range(settings.PASSWORD_HASHING_CONCURRENCY))
+    random.shuffle(slots)
+    token = uuid.uuid4().hex
+    for slot in slots:
+        key = 'auth:hashing-slot:{}'.format(slot)
+        if cache.add(key, token, settings.PASSWORD_HASHING_SLOT_TIMEOUT):
+            break
+    else:
+        raise Throttled(wait=1, detail='Too many concurrent authentication requests, try again shortly.')
+
+    try:
+        yield
+    finally:
+        # The slot may have expired and been taken by another request meanwhile
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+class PasswordHashingLimitMixin:
+    """
+    Runs POST requests, which hash passwords, in a password hashing slot.
+    """
+
+    def post(self, request, *args, **kwargs):
+        with password_hashing_slot():
+            return super().post(request, *args, **kwargs)
@@ -0,0 +1,47 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from authentication.revocation import revocations
+
+# User fields embedded in the tokens, enough to authenticate and authorize most requests
+USER_CLAIMS = ('username', 'is_staff', 'is_active')
+
+
+def set_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+
+
+class RefreshToken(tokens.Token):
+    """
+    Refresh token carrying the user claims, which are copied to its access tokens.
+
+    Unlike simplejwt's refresh token it isn't recorded as an outstanding token,
+    rotated tokens are revoked in the revocation store until they expire.
+    """
+
+    token_type = 'refresh'
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+    no_copy_claims = tokens.RefreshToken.no_copy_claims
+    access_token_class = tokens.AccessToken
+    access_token = tokens.RefreshToken.access_token
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_user_claims(token, user)
+        return token
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if revocations.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is revoked'))
+
+    def revoke(self):
+        """Revoke the token, raise a TokenError if it was already revoked."""
+
+        if not revocations.revoke(self[api_settings.JTI_CLAIM], datetime_from_epoch(self['exp'])):
+            raise TokenError(_('Token is revoked'))
@@ -1,4 +1,4 @@
-from rest_framework_simplejwt.tokens import RefreshToken
+from authentication.tokens import RefreshToken
 
 def get_user_tokens(user):
     refresh = RefreshToken.for_user(user)
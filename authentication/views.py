@@ -2,7 +2,10 @@ from allauth.socialaccount.providers.github.views import GitHubOAuth2Adapter
 from dj_rest_auth.registration.views import SocialLoginView
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework.permissions import AllowAny
+from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import RegisterSerializer
+from .throttling import LoginIPRateThrottle, LoginUsernameRateThrottle, PasswordHashingLimitMixin, \
+    RegisterIPRateThrottle
 from rest_framework import generics
 
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
@@ -16,12 +19,22 @@ User = get_user_model()
 @extend_schema_view(
     post=extend_schema(description='Registers a user and returns an access and refresh JSON web token pair.'),
 )
-class RegisterView(generics.CreateAPIView):
+class RegisterView(PasswordHashingLimitMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
+    throttle_classes = (RegisterIPRateThrottle,)
     serializer_class = RegisterSerializer
 
 
+class LoginView(PasswordHashingLimitMixin, TokenObtainPairView):
+    """
+    Takes a set of user credentials and returns an access and refresh JSON web
+    token pair to prove the authentication of those credentials.
+    """
+
+    throttle_classes = (LoginIPRateThrottle, LoginUsernameRateThrottle)
+
+
 class GoogleLogin(SocialLoginView):
     """
     Exchanges Google's access code for an access_token.
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from changes.models import Change
+
+DEFAULTS = {
+    'PAGE_SIZE': 500,
+    'MAX_PAGE_SIZE': 1000,
+    'SETTLE_TIME': 5,
+    'COMPACT_AFTER': 24 * 3600,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'CHANGES', {}).get(name, DEFAULTS[name])
+
+
+def record(entity, operation, entity_ids, snippet_id=None):
+    """
+    Log the changes of entities of a snippet in the current transaction, the
+    entities are snippets themselves without snippet_id.
+    """
+
+    Change.objects.bulk_create([
+        Change(entity=entity, entity_id=entity_id, snippet_id=snippet_id or entity_id, operation=operation)
+        for entity_id in entity_ids
+    ])
+
+
+def settled_changes():
+    """
+    Changes old enough for the transactions of the changes before them to be
+    committed, sequence numbers are allotted before the commits so a change
+    can become visible after a later one.
+    """
+
+    changes = Change.objects.all()
+    settle_time = get_setting('SETTLE_TIME')
+    if settle_time:
+        changes = changes.filter(created_at__lt=timezone.now() - timedelta(seconds=settle_time))
+    return changes
+
+
+def compact(batch_size, dry_run=False):
+    """
+    Drop the changes older than COMPACT_AFTER followed by a later change of the
+    same entity, which clients syncing from before them get anyway. Returns the
+    number of dropped changes.
+    """
+
+    horizon = Change.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=get_setting('COMPACT_AFTER'))) \
+        .order_by('-seq').values_list('seq', flat=True).first()
+    if horizon is None:
+        return 0
+
+    superseded = Exists(Change.objects.filter(
+        entity=OuterRef('entity'), entity_id=OuterRef('entity_id'), seq__gt=OuterRef('seq')))
+    dropped = 0
+    last_seq = 0
+    while True:
+        seqs = list(Change.objects.filter(seq__gt=last_seq, seq__lte=horizon).order_by('seq')
+                    .values_list('seq', flat=True)[:batch_size])
+        if not seqs:
+            return dropped
+        changes = Change.objects.filter(seq__gte=seqs[0], seq__lte=seqs[-1]).filter(superseded)
+        dropped += changes.count() if dry_run else changes.delete()[0]
+        last_seq = seqs[-1]
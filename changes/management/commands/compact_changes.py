@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from changes.log import compact
+
+
+class Command(BaseCommand):
+    help = 'Drop the changes of the change feed followed by a later change of the same entity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of changes per batch.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the changes to drop.')
+        parser.add_argument('--every', type=int, default=None,
+                            help='Keep running and compact the changes every given number of seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            dropped = compact(options['batch_size'], dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS('{} {} changes in {:.2f}s.'.format(
+                'Found' if options['dry_run'] else 'Dropped', dropped, time.perf_counter() - started)))
+
+            if options['every'] is None:
+                return
+            time.sleep(max(0, options['every'] - (time.perf_counter() - started)))
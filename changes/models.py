@@ -0,0 +1,48 @@
+from django.db import models
+
+
+class Change(models.Model):
+    """
+    Entry of the append-only log of the changes of the snippets, their files,
+    comments and topic assignments, written in the transaction of the change.
+    The sequence numbers let clients fetch only what changed since their last
+    sync, see changes.views.
+    """
+
+    SNIPPET = 'snippet'
+    FILE = 'file'
+    COMMENT = 'comment'
+    # The topic assignments of a snippet, the entity id is the snippet id
+    SNIPPET_TOPICS = 'snippet_topics'
+    ENTITIES = (
+        (SNIPPET, 'Snippet'),
+        (FILE, 'File'),
+        (COMMENT, 'Comment'),
+        (SNIPPET_TOPICS, 'Snippet topics'),
+    )
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    OPERATIONS = (
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    )
+
+    seq = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=20, choices=ENTITIES)
+    entity_id = models.BigIntegerField()
+    snippet_id = models.BigIntegerField()
+    operation = models.CharField(max_length=10, choices=OPERATIONS)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        indexes = [
+            models.Index(fields=['entity', 'entity_id', 'seq'], name='change_entity_idx'),
+            models.Index(fields=['created_at'], name='change_created_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {}:{}'.format(self.operation, self.entity, self.entity_id)
@@ -0,0 +1,14 @@
+from rest_framework import serializers
+
+from .models import Change
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Change
+        fields = ('seq',
+                  'entity',
+                  'entity_id',
+                  'snippet_id',
+                  'operation',
+                  'created_at')
@@ -0,0 +1,53 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from snippets.models import Snippet, File, Comment
+from topics.models import Topic
+from changes.log import record
+from changes.models import Change
+
+
+@receiver(post_save, sender=Snippet)
+def log_saved_snippet(sender, instance, created, **kwargs):
+    record(Change.SNIPPET, Change.CREATE if created else Change.UPDATE, [instance.id])
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=Comment)
+def log_saved_snippet_child(sender, instance, created, **kwargs):
+    entity = Change.FILE if sender is File else Change.COMMENT
+    record(entity, Change.CREATE if created else Change.UPDATE, [instance.id], instance.snippet_id)
+
+
+@receiver(post_delete, sender=Snippet)
+def log_deleted_snippet(sender, instance, **kwargs):
+    record(Change.SNIPPET, Change.DELETE, [instance.id])
+
+
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=Comment)
+def log_deleted_snippet_child(sender, instance, **kwargs):
+    entity = Change.FILE if sender is File else Change.COMMENT
+    record(entity, Change.DELETE, [instance.id], instance.snippet_id)
+
+
+@receiver(m2m_changed, sender=Snippet.topics.through)
+def log_snippet_topics(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The snippets of a cleared topic are only known before
+        snippet_ids = list(instance.snippets.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        # Without pk_set nothing was added or removed
+        snippet_ids = list(pk_set) if reverse else [instance.id] if pk_set else []
+    elif action == 'post_clear' and not reverse:
+        snippet_ids = [instance.id]
+    else:
+        return
+    if snippet_ids:
+        record(Change.SNIPPET_TOPICS, Change.UPDATE, snippet_ids)
+
+
+@receiver(pre_delete, sender=Topic)
+def log_deleted_topic_assignments(sender, instance, **kwargs):
+    # Deleting the topic removes it from its snippets without m2m_changed
+    record(Change.SNIPPET_TOPICS, Change.UPDATE, list(instance.snippets.values_list('id', flat=True)))
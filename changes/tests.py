@@ -0,0 +1,87 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from changes.models import Change
+from snippets.models import Snippet, File, Comment
+from topics.models import Topic
+from users.models import User
+
+
+class ChangeFeedTestCase(APITestCase):
+    url = reverse('changes:change-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', email='author@snip.com', password='test_pass')
+
+    def changes(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(200, response.status_code)
+        return response.json()
+
+    def test_logged_changes(self):
+        """
+        Verify the changes of the snippets, files, comments and topics are logged in order
+        """
+
+        self.client.force_authenticate(self.user)
+        topic = Topic.objects.create(name='JS')
+        response = self.client.post(reverse('snippets:snippet-list'), {
+            'name': 'Snippet', 'description': 'Description', 'topic_ids': [topic.id],
+            'files': [{'name': 'main.js', 'content': 'console.log(1)'}]}, format='json')
+        snippet = Snippet.objects.get(id=response.json()['id'])
+        file_id = File.objects.get(snippet=snippet).id
+        comment = Comment.objects.create(snippet=snippet, user=self.user, content='Comment')
+        snippet.topics.clear()
+        File.objects.get(id=file_id).delete()
+
+        feed = self.changes()
+        self.assertEqual([
+            ('snippet', snippet.id, 'create'),
+            ('file', file_id, 'create'),
+            ('snippet_topics', snippet.id, 'update'),
+            ('comment', comment.id, 'create'),
+            ('snippet_topics', snippet.id, 'update'),
+            ('file', file_id, 'delete'),
+        ], [(change['entity'], change['entity_id'], change['operation']) for change in feed['results']])
+        self.assertTrue(all(change['snippet_id'] == snippet.id for change in feed['results']))
+        self.assertEqual(feed['results'][-1]['seq'], feed['cursor'])
+        self.assertIsNone(feed['next'])
+
+    def test_pagination(self):
+        """
+        Verify the feed is fetched in pages after the cursor
+        """
+
+        snippets = [Snippet.objects.create(user=self.user, name='Snippet {}'.format(i)) for i in range(5)]
+
+        feed = self.changes(limit=2)
+        self.assertEqual([snippet.id for snippet in snippets[:2]], [c['entity_id'] for c in feed['results']])
+        self.assertIn('since={}'.format(feed['cursor']), feed['next'])
+        feed = self.changes(since=feed['cursor'], limit=10)
+        self.assertEqual([snippet.id for snippet in snippets[2:]], [c['entity_id'] for c in feed['results']])
+        self.assertIsNone(feed['next'])
+        self.assertEqual(feed['cursor'], self.changes(since=feed['cursor'])['cursor'])
+
+        self.assertEqual(400, self.client.get(self.url, {'since': 'x'}).status_code)
+
+    def test_compaction(self):
+        """
+        Verify compaction drops the old changes followed by a later change of the same entity
+        """
+
+        snippet = Snippet.objects.create(user=self.user, name='Snippet')
+        snippet.save()
+        other = Snippet.objects.create(user=self.user, name='Other')
+        Change.objects.update(created_at=timezone.now() - timedelta(days=2))
+        snippet.save()
+
+        out = StringIO()
+        call_command('compact_changes', stdout=out)
+        self.assertIn('Dropped 2 changes', out.getvalue())
+        self.assertEqual([(other.id, 'create'), (snippet.id, 'update')],
+                         list(Change.objects.values_list('entity_id', 'operation')))
@@ -0,0 +1,10 @@
+from rest_framework.routers import DefaultRouter
+
+from .views import ChangeViewSet
+
+app_name = 'changes'
+
+router = DefaultRouter()
+router.register('', ChangeViewSet, basename='change')
+
+urlpatterns = router.urls
@@ -0,0 +1,32 @@
+from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework import mixins
+from rest_framework.viewsets import GenericViewSet
+
+from shared.mixins import InstrumentedViewMixin
+from shared.paginations import SequencePagination
+from .log import get_setting, settled_changes
+from .serializers import ChangeSerializer
+
+
+class ChangePagination(SequencePagination):
+
+    @property
+    def page_size(self):
+        return get_setting('PAGE_SIZE')
+
+    @property
+    def max_page_size(self):
+        return get_setting('MAX_PAGE_SIZE')
+
+
+@extend_schema_view(
+    list=extend_schema(description='Get the changes of the snippets, files, comments and snippet topics after a '
+                                   'sequence number, in order. Older changes of an entity followed by a later one '
+                                   'are compacted away, fetch the current state of the changed entities.'),
+)
+class ChangeViewSet(InstrumentedViewMixin, mixins.ListModelMixin, GenericViewSet):
+    serializer_class = ChangeSerializer
+    pagination_class = ChangePagination
+
+    def get_queryset(self):
+        return settled_changes()
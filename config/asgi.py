@@ -2,15 +2,36 @@
 ASGI config for snippet_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The event streams of the snippets are served by this application, the other
+paths are passed to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Once Django is set up
+from events.asgi import EventStream  # noqa: E402
+from snippets.events import get_snippet_channel  # noqa: E402
+
+routes = [
+    (re.compile(r'^/api/snippets/(?P<snippet_id>\d+)/events/$'), EventStream(get_snippet_channel)),
+]
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        for pattern, route in routes:
+            match = pattern.match(scope['path'])
+            if match:
+                scope = dict(scope, url_route={'args': (), 'kwargs': match.groupdict()})
+                return await route(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -14,6 +14,7 @@ from . import __version__ as APP_VERSION
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
+from corsheaders.defaults import default_headers
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -60,6 +61,9 @@ INSTALLED_APPS = [
     'users',
     'snippets',
     'topics',
+    'jobs',
+    'events',
+    'changes',
 ]
 
 # allauth
@@ -86,12 +90,19 @@ SOCIALACCOUNT_PROVIDERS = {
 ACCOUNT_LOGOUT_ON_GET = False
 LOGOUT_ON_PASSWORD_CHANGE = False
 REST_USE_JWT = True  # depends on SimpleJWT
+REST_AUTH_SERIALIZERS = {
+    'JWT_TOKEN_CLAIMS_SERIALIZER': 'authentication.serializers.TokenObtainPairSerializer',
+}
 JWT_AUTH_COOKIE = 'jwt-auth-token'
 JWT_AUTH_REFRESH_COOKIE = 'jwt-refresh-token'
 
 CORS_ORIGIN_ALLOW_ALL = True
+# Versions of the snippets, for the optimistic concurrency of the updates
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match')
+CORS_EXPOSE_HEADERS = ['ETag']
 
 MIDDLEWARE = [
+    'shared.middleware.RequestProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -135,6 +146,15 @@ DATABASES = {
     }
 }
 
+# Cache
+# Must be shared by all the processes in production (see settings_production)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -179,27 +199,81 @@ AUTHENTICATION_BACKENDS = [
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_SCHEMA_CLASS': 'shared.schema.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        "dj_rest_auth.utils.JWTCookieAuthentication",
+        'authentication.authentication.ClaimsJWTCookieAuthentication',
+    ],
+    # MessagePack for the clients sending and accepting application/msgpack, JSON otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'shared.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'shared.parsers.MessagePackParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Proxies in front of the application, the client IPs of the throttles are the
+    # X-Forwarded-For entries they appended rather than the spoofable client ones
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('LOGIN_IP_THROTTLE_RATE', default='30/min'),
+        'login_username': config('LOGIN_USERNAME_THROTTLE_RATE', default='10/min'),
+        'register_ip': config('REGISTER_IP_THROTTLE_RATE', default='10/hour'),
+    },
 }
 
+# Maximum number of login and registration requests hashing passwords at the same
+# time across all the processes, further requests are rejected with a 429
+PASSWORD_HASHING_CONCURRENCY = config('PASSWORD_HASHING_CONCURRENCY', default=4, cast=int)
+PASSWORD_HASHING_SLOT_TIMEOUT = 30
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True,
+    # Rotated tokens are revoked in authentication.revocation instead of the blacklist app
+    'BLACKLIST_AFTER_ROTATION': False,
     'UPDATE_LAST_LOGIN': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'authentication.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.TokenRefreshSerializer',
+}
+
+# Seconds the topic facet counts of a filter are cached, they are also invalidated
+# whenever snippets are created or deleted, their searched fields, files or topics
+# change, or topics change
+FACETS_CACHE_TTL = config('FACETS_CACHE_TTL', default=300, cast=int)
+
+# Seconds the composite snippet pages are cached, they are also invalidated whenever
+# the snippet, its files, topics, comments or votes change. The statistics of the
+# users on the pages aren't, they can be as old as the pages
+SNIPPET_PAGE_CACHE_TTL = config('SNIPPET_PAGE_CACHE_TTL', default=300, cast=int)
+
+TOKEN_REVOCATION = {
+    'BLOOM_CAPACITY': 100000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'BLOOM_REBUILD_INTERVAL': 3600,
+    # Seconds before the revocations of other processes are seen
+    'GENERATION_CHECK_INTERVAL': 5,
+    'PURGE_INTERVAL': 600,
+    'PURGE_CHUNK_SIZE': 1000,
 }
 
+# Seconds an access token's active claim is trusted before it is checked against
+# the database again, 0 trusts it until the token expires
+JWT_REVALIDATE_ACTIVE_TTL = config('JWT_REVALIDATE_ACTIVE_TTL', default=60, cast=int)
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Snippets API',
     'DESCRIPTION': 'Snippet Management backend project',
     'VERSION': APP_VERSION,
     'SCHEMA_PATH_PREFIX': r'/api/',
+    # Response fields can be left out with the fields parameter, unlike request ones
+    'COMPONENT_SPLIT_REQUEST': True,
 }
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -211,6 +285,70 @@ STATICFILES_DIRS = (
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Share of requests profiled with a Server-Timing header and a structured log line,
+# defaults to every request in DEBUG and to 1% otherwise
+SERVER_TIMING_SAMPLE_RATE = config('SERVER_TIMING_SAMPLE_RATE', default=None,
+                                   cast=lambda value: None if value in (None, '') else float(value))
+
+# Per viewset action metrics exposed on /api/metrics/ to the requests with the
+# METRICS_TOKEN bearer token, the endpoint responds with a 404 without one.
+# Aggregated across worker processes when PROMETHEUS_MULTIPROC_DIR is set
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Detection of repeated (N+1) and slow queries per request, the "log" mode logs
+# them as warnings while the "raise" mode fails the request
+QUERY_INSPECTOR = {
+    'MODE': config('QUERY_INSPECTOR_MODE', default='log'),
+    'REPEATED_THRESHOLD': 5,
+    'SLOW_QUERY_MS': config('SLOW_QUERY_MS', default=100, cast=int),
+    'STACK_SAMPLE_RATE': config('QUERY_INSPECTOR_STACK_SAMPLE_RATE', default=0.1, cast=float),
+}
+
+# Database backed job queue run by the run_jobs workers, the EAGER mode runs the
+# jobs after each commit in the current thread instead
+JOB_QUEUE = {
+    'EAGER': False,
+    'BATCH_SIZE': 100,
+    'POLL_INTERVAL': 1.0,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 10,
+    'MAX_RETRY_DELAY': 3600,
+    'RETENTION': 3600,
+    'FAILED_RETENTION': 7 * 24 * 3600,
+}
+
+# Server-Sent Events of the snippets, streamed by the ASGI application. The
+# database backend carries the events across processes, the local one keeps
+# them in process
+EVENTS = {
+    'BACKEND': config('EVENTS_BACKEND', default='events.backends.DatabaseBackend'),
+    'HEARTBEAT': 15,
+    'RETRY': 3000,
+    'QUEUE_SIZE': 100,
+    'REPLAY_SIZE': 500,
+    'POLL_INTERVAL': 0.5,
+    'RETENTION': 3600,
+    'PURGE_INTERVAL': 300,
+}
+
+# Change feed of the snippets for the incremental syncs of the clients. Changes
+# are listed once they are SETTLE_TIME seconds old, so that the ones of slower
+# concurrent transactions aren't skipped, and compacted after COMPACT_AFTER
+CHANGES = {
+    'PAGE_SIZE': 500,
+    'MAX_PAGE_SIZE': 1000,
+    'SETTLE_TIME': 5,
+    'COMPACT_AFTER': 24 * 3600,
+}
+
+# Process pool rendering the highlighted files and descriptions, 0 renders in process
+RENDERING = {
+    'PROCESSES': config('RENDERING_PROCESSES', default=2, cast=int),
+    'TIMEOUT': 30,
+}
+
 LOGGING = {
     'version': 1,
     'filters': {
@@ -223,13 +361,27 @@ LOGGING = {
             'level': 'DEBUG',
             'filters': ['require_debug_true'],
             'class': 'logging.StreamHandler',
-        }
+        },
+        'structured': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+        },
     },
     'loggers': {
         'django.db.backends': {
             'level': 'DEBUG',
             'handlers': ['console'],
-        }
+        },
+        'shared.instrumentation': {
+            'level': 'INFO',
+            'handlers': ['structured'],
+            'propagate': False,
+        },
+        'shared.query_inspector': {
+            'level': 'WARNING',
+            'handlers': ['structured'],
+            'propagate': False,
+        },
     }
 }
 
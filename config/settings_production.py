@@ -1,8 +1,20 @@
 import dj_database_url
 from decouple import config
 
+from .settings import REST_FRAMEWORK
+
 DATABASES = {
     'default': dj_database_url.config(
         default=config('DATABASE_URL')
     )
-}
\ No newline at end of file
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_table',
+    }
+}
+
+# Behind the Heroku router
+REST_FRAMEWORK['NUM_PROXIES'] = config('NUM_PROXIES', default=1, cast=int)
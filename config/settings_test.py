@@ -0,0 +1,12 @@
+from .settings import *  # noqa: F401,F403
+
+# Repeated queries fail the requests of the test suite
+QUERY_INSPECTOR = dict(QUERY_INSPECTOR, MODE='raise', STACK_SAMPLE_RATE=1.0)  # noqa: F405
+
+# Jobs run after each commit, events stay in process and are listed right away
+JOB_QUEUE = dict(JOB_QUEUE, EAGER=True)  # noqa: F405
+EVENTS = dict(EVENTS, BACKEND='events.backends.LocalBackend')  # noqa: F405
+CHANGES = dict(CHANGES, SETTLE_TIME=0)  # noqa: F405
+
+# Rendered in process
+RENDERING = dict(RENDERING, PROCESSES=0)  # noqa: F405
@@ -5,6 +5,8 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, Spec
 from django.conf import settings
 from django.conf.urls.static import static
 
+from config.views import metrics
+
 urlpatterns = [
    path('admin/', admin.site.urls),
    # path('dj-rest-auth/', include('dj_rest_auth.urls')),
@@ -15,4 +17,7 @@ urlpatterns = [
    path('api/users/', include('users.urls')),
    path('api/snippets/', include('snippets.urls')),
    path('api/topics/', include('topics.urls')),
+   path('api/jobs/', include('jobs.urls')),
+   path('api/changes/', include('changes.urls')),
+   path('api/metrics/', metrics, name='metrics'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1 +1,19 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from shared.metrics import render_metrics
+
+
+def metrics(request):
+    """Expose the API metrics in the Prometheus text format, to the scrapers with the token only."""
+
+    # Not exposed at all without a token
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    authorization = request.headers.get('Authorization', '')
+    if not constant_time_compare(authorization, 'Bearer {}'.format(settings.METRICS_TOKEN)):
+        return HttpResponse(status=401)
+
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
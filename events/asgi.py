@@ -0,0 +1,147 @@
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from corsheaders.conf import conf as cors_conf
+
+from events.backends import get_backend, get_setting, run_query
+from events.broker import get_broker
+
+
+def format_event(event):
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        event.id, event.type, json.dumps(event.data, separators=(',', ':'))).encode()
+
+
+def get_header(scope, name):
+    for header, value in scope.get('headers', ()):
+        if header == name:
+            return value.decode('latin-1')
+    return None
+
+
+def get_last_event_id(scope):
+    try:
+        return int(get_header(scope, b'last-event-id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def cors_headers(scope):
+    """
+    CORS headers of the allowed origins, like django-cors-headers adds to the
+    responses of Django, whose middlewares the streams don't go through.
+    """
+
+    origin = get_header(scope, b'origin')
+    if origin is None:
+        return []
+    allowed = cors_conf.CORS_ALLOW_ALL_ORIGINS or origin in cors_conf.CORS_ALLOWED_ORIGINS \
+        or any(re.match(pattern, origin) for pattern in cors_conf.CORS_ALLOWED_ORIGIN_REGEXES)
+    if not allowed:
+        return []
+
+    if cors_conf.CORS_ALLOW_ALL_ORIGINS and not cors_conf.CORS_ALLOW_CREDENTIALS:
+        return [(b'access-control-allow-origin', b'*')]
+    headers = [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'origin')]
+    if cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
+
+
+async def _send_error(scope, send, status, detail):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), *cors_headers(scope)]})
+    await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode()})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+class EventStream:
+    """
+    ASGI application streaming the events of a channel as Server-Sent Events.
+
+    get_channel is an async function returning the channel of a request scope,
+    or None for a 404. Clients reconnecting with the Last-Event-ID header get
+    the events they missed first, or a "reset" event when they can't be
+    replayed anymore, after which they should fetch the state again. A comment
+    is sent every HEARTBEAT seconds without events, to keep the connection
+    through the proxies, and streams of clients too slow to keep up are
+    closed so that they resume.
+    """
+
+    def __init__(self, get_channel):
+        self.get_channel = get_channel
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            await _send_error(scope, send, 405, 'Method "{}" not allowed.'.format(scope['method']))
+            return
+        channel = await self.get_channel(scope)
+        if channel is None:
+            await _send_error(scope, send, 404, 'Not found.')
+            return
+
+        broker = get_broker()
+        # Subscribed before the replay so that no event is missed in between
+        subscription = broker.subscribe(channel)
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *cors_headers(scope),
+            ]})
+            await send({'type': 'http.response.body', 'body': 'retry: {}\n\n'.format(get_setting('RETRY')).encode(),
+                        'more_body': True})
+
+            replayed = set()
+            last_id = get_last_event_id(scope)
+            if last_id is not None:
+                events = await sync_to_async(run_query)(get_backend().replay, channel, last_id)
+                if events is None:
+                    await send({'type': 'http.response.body', 'body': b'event: reset\ndata: {}\n\n',
+                                'more_body': True})
+                else:
+                    replayed = {event.id for event in events}
+                    body = b''.join(format_event(event) for event in events)
+                    if body:
+                        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+            await self.stream(subscription, disconnect, replayed, send)
+        finally:
+            broker.unsubscribe(subscription)
+            disconnect.cancel()
+
+    async def stream(self, subscription, disconnect, replayed, send):
+        heartbeat = get_setting('HEARTBEAT')
+        get = asyncio.ensure_future(subscription.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait({get, disconnect}, timeout=heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    return
+                if not done:
+                    body = b': heartbeat\n\n'
+                else:
+                    event = get.result()
+                    if event is None:
+                        # Overflowed, the client reconnects and resumes from its last event
+                        await send({'type': 'http.response.body', 'body': b''})
+                        return
+                    get = asyncio.ensure_future(subscription.get())
+                    if event.id in replayed:
+                        continue
+                    body = format_event(event)
+                # Waits for the client when the server applies flow control, the queue fills up meanwhile
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            get.cancel()
@@ -0,0 +1,192 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'BACKEND': 'events.backends.DatabaseBackend',
+    'HEARTBEAT': 15,
+    'RETRY': 3000,
+    'QUEUE_SIZE': 100,
+    'REPLAY_SIZE': 500,
+    'POLL_INTERVAL': 0.5,
+    'RETENTION': 3600,
+    'PURGE_INTERVAL': 300,
+}
+
+Event = namedtuple('Event', 'id channel type data')
+
+# Seconds within which the events published by concurrent transactions are expected to be committed
+SETTLE_TIME = 2
+
+_backend = None
+_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'EVENTS', {}).get(name, DEFAULTS[name])
+
+
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = import_string(get_setting('BACKEND'))()
+        return _backend
+
+
+def reset_backend():
+    """Drop the backend, the next get_backend creates a new one. For the tests."""
+
+    global _backend
+    with _lock:
+        _backend = None
+
+
+def publish(channel, type, data):
+    """Publish an event to the streams of a channel, once the changes it reports are committed."""
+
+    get_backend().publish(channel, type, data)
+
+
+def run_query(function, *args):
+    """Run database queries outside of a request, in the threads of sync_to_async."""
+
+    # Connections in a transaction, like the ones of the test cases, are left as they are
+    if connection.in_atomic_block:
+        return function(*args)
+    close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+class BaseBackend:
+    """
+    Transport of the events between the processes publishing them and the
+    processes streaming them. Events are numbered with increasing ids, which
+    clients resume from with Last-Event-ID.
+    """
+
+    def publish(self, channel, type, data):
+        """Publish an event, called from synchronous code once the transaction is committed."""
+
+        raise NotImplementedError
+
+    def replay(self, channel, last_id):
+        """Events of a channel published after last_id, None when some of them can't be replayed anymore."""
+
+        raise NotImplementedError
+
+    async def listen(self, dispatch):
+        """Call dispatch with the events published by every process, until cancelled."""
+
+        raise NotImplementedError
+
+
+class LocalBackend(BaseBackend):
+    """
+    Events of the current process only, the last REPLAY_SIZE of each channel
+    are kept in memory for resuming. For the tests and single process servers.
+    """
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.events = defaultdict(lambda: deque(maxlen=get_setting('REPLAY_SIZE')))
+        # Last id of the events dropped from the buffer of each channel
+        self.dropped = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def publish(self, channel, type, data):
+        from events.broker import get_broker
+
+        with self.lock:
+            event = Event(next(self.ids), channel, type, data)
+            events = self.events[channel]
+            if len(events) == events.maxlen:
+                self.dropped[channel] = events[0].id
+            events.append(event)
+        get_broker().dispatch(event)
+
+    def replay(self, channel, last_id):
+        with self.lock:
+            if last_id < self.dropped[channel]:
+                return None
+            return [event for event in self.events[channel] if event.id > last_id]
+
+    async def listen(self, dispatch):
+        # Published events are dispatched right away
+        pass
+
+
+class DatabaseBackend(BaseBackend):
+    """
+    Events stored in the events table, which every streaming process polls
+    every POLL_INTERVAL seconds and purges of the ones older than RETENTION.
+    """
+
+    def publish(self, channel, type, data):
+        from events.models import Event as EventModel
+
+        EventModel.objects.create(channel=channel, type=type, data=data)
+
+    def replay(self, channel, last_id):
+        from events.models import Event as EventModel
+
+        # Purged, the oldest events are deleted first
+        if last_id > 0 and not EventModel.objects.filter(id__lte=last_id).exists():
+            return None
+        limit = get_setting('REPLAY_SIZE')
+        events = list(EventModel.objects.filter(channel=channel, id__gt=last_id)
+                      .values_list('id', 'channel', 'type', 'data')[:limit + 1])
+        if len(events) > limit:
+            return None
+        return [Event(*event) for event in events]
+
+    def last_id(self):
+        from events.models import Event as EventModel
+
+        return EventModel.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def poll(self, last_id, since):
+        from events.models import Event as EventModel
+
+        events = EventModel.objects.filter(Q(id__gt=last_id) | Q(created_at__gte=since)) \
+            .values_list('id', 'channel', 'type', 'data')
+        return [Event(*event) for event in events]
+
+    def purge(self):
+        from events.models import Event as EventModel
+
+        EventModel.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=get_setting('RETENTION'))).delete()
+
+    async def listen(self, dispatch):
+        last_id = await sync_to_async(run_query)(self.last_id)
+        # Concurrent transactions can commit their events out of id order, the
+        # events of the last seconds are read again and deduplicated
+        seen = {}
+        purged_at = time.monotonic()
+        while True:
+            now = time.monotonic()
+            since = timezone.now() - timedelta(seconds=SETTLE_TIME)
+            for event in await sync_to_async(run_query)(self.poll, last_id, since):
+                if event.id not in seen:
+                    seen[event.id] = now
+                    last_id = max(last_id, event.id)
+                    dispatch(event)
+            seen = {event_id: seen_at for event_id, seen_at in seen.items() if now - seen_at < 2 * SETTLE_TIME}
+
+            if now - purged_at > get_setting('PURGE_INTERVAL'):
+                await sync_to_async(run_query)(self.purge)
+                purged_at = now
+            await asyncio.sleep(get_setting('POLL_INTERVAL'))
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from events.backends import get_backend, get_setting
+
+_broker = None
+_lock = threading.Lock()
+
+
+class Subscription:
+    """
+    Events of a channel for a single stream, in a bounded queue. A stream too
+    slow to keep up is closed instead of buffering its events without limit,
+    None is queued once it is and the client resumes with Last-Event-ID.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue = asyncio.Queue(get_setting('QUEUE_SIZE'))
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflow()
+
+    def overflow(self):
+        self.overflowed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """
+    In-process pub/sub fanning the events out to the subscriptions of the
+    streams, which run in the event loop of the ASGI server. Events are
+    dispatched from any thread, and the backend listener delivering the events
+    of the other processes is started with the first subscription.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.listener = None
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.subscriptions.clear()
+            self.listener = None
+        if self.listener is None or self.listener.done():
+            self.listener = loop.create_task(get_backend().listen(self.dispatch))
+
+        subscription = Subscription(channel)
+        self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscriptions.get(subscription.channel)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.channel]
+
+    def dispatch(self, event):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.deliver, event)
+
+    def deliver(self, event):
+        for subscription in list(self.subscriptions.get(event.channel, ())):
+            subscription.put(event)
+            if subscription.overflowed:
+                self.unsubscribe(subscription)
+
+
+def get_broker():
+    global _broker
+    with _lock:
+        if _broker is None:
+            _broker = Broker()
+        return _broker
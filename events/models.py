@@ -0,0 +1,23 @@
+from django.db import models
+
+
+class Event(models.Model):
+    """
+    Event published with the DatabaseBackend, polled by the event streams of
+    every process and kept for RETENTION seconds so that clients can resume.
+    """
+
+    channel = models.CharField(max_length=100)
+    type = models.CharField(max_length=50)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['channel', 'id'], name='event_channel_idx'),
+            models.Index(fields=['created_at'], name='event_created_idx'),
+        ]
+
+    def __str__(self):
+        return '{}:{}:{}'.format(self.channel, self.type, self.id)
@@ -0,0 +1,167 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+
+from config.asgi import application
+from events.backends import DatabaseBackend, get_backend, reset_backend
+from events.broker import get_broker
+from events.models import Event
+from snippets.models import Snippet, Comment
+from users.models import User
+
+
+class Stream:
+    """Request to the ASGI application, read as it streams."""
+
+    def __init__(self, path, method='GET', last_event_id=None, headers=()):
+        headers = list(headers)
+        if last_event_id is not None:
+            headers.append((b'last-event-id', str(last_event_id).encode()))
+        self.scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': headers}
+        self.requests = asyncio.Queue()
+        self.messages = asyncio.Queue()
+        self.body = b''
+
+    async def open(self):
+        self.task = asyncio.ensure_future(application(self.scope, self.requests.get, self.messages.put))
+        self.start = await asyncio.wait_for(self.messages.get(), 5)
+        return self.start['status']
+
+    async def read_until(self, text):
+        while text not in self.body:
+            message = await asyncio.wait_for(self.messages.get(), 5)
+            self.body += message.get('body', b'')
+        return self.body
+
+    async def close(self):
+        await self.requests.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 5)
+
+
+class EventStreamTestCase(TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.user = User.objects.create_user(username='author', email='author@snip.com', password='test_pass')
+        self.snippet = Snippet.objects.create(user=self.user, name='Snippet')
+        self.path = '/api/snippets/{}/events/'.format(self.snippet.id)
+        self.channel = 'snippet:{}'.format(self.snippet.id)
+
+    def comment_and_vote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(snippet=self.snippet, user=self.user, content='Comment')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snippet.upvote(self.user)
+        comment_id = comment.id
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.delete()
+        return comment_id
+
+    async def test_events(self):
+        """
+        Verify the comments and votes of a snippet are streamed
+        """
+
+        stream = Stream(self.path)
+        self.assertEqual(200, await stream.open())
+        await stream.read_until(b'retry: 3000\n\n')
+
+        comment_id = await sync_to_async(self.comment_and_vote)()
+        body = await stream.read_until(b'event: comment.deleted')
+        self.assertIn(b'event: comment.created\ndata: {"id":%d' % comment_id, body)
+        self.assertIn(b'event: snippet.votes\ndata: {"upvotes":1,"downvotes":0}', body)
+        await stream.close()
+
+        self.assertEqual(404, await Stream('/api/snippets/0/events/').open())
+        self.assertEqual(405, await Stream(self.path, method='POST').open())
+
+    async def test_cors(self):
+        """
+        Verify the streams have the CORS headers of the other responses
+        """
+
+        stream = Stream(self.path, headers=[(b'origin', b'https://snippets.example')])
+        await stream.open()
+        self.assertIn((b'access-control-allow-origin', b'*'), stream.start['headers'])
+        await stream.close()
+
+        stream = Stream(self.path)
+        await stream.open()
+        self.assertNotIn(b'access-control-allow-origin', dict(stream.start['headers']))
+        await stream.close()
+
+        with override_settings(CORS_ORIGIN_ALLOW_ALL=False, CORS_ALLOWED_ORIGINS=['https://snippets.example']):
+            stream = Stream('/api/snippets/0/events/', headers=[(b'origin', b'https://snippets.example')])
+            self.assertEqual(404, await stream.open())
+            self.assertIn((b'access-control-allow-origin', b'https://snippets.example'), stream.start['headers'])
+            stream = Stream('/api/snippets/0/events/', headers=[(b'origin', b'https://other.example')])
+            await stream.open()
+            self.assertNotIn(b'access-control-allow-origin', dict(stream.start['headers']))
+
+    async def test_resume(self):
+        """
+        Verify clients resume after their last event, or are told to reset when it's too old
+        """
+
+        for index in range(3):
+            get_backend().publish(self.channel, 'test', {'index': index})
+
+        stream = Stream(self.path, last_event_id=1)
+        await stream.open()
+        body = await stream.read_until(b'id: 3\n')
+        self.assertNotIn(b'id: 1\n', body)
+        self.assertIn(b'id: 2\nevent: test\ndata: {"index":1}\n\n', body)
+        await stream.close()
+
+        with override_settings(EVENTS={'BACKEND': 'events.backends.LocalBackend', 'REPLAY_SIZE': 2}):
+            reset_backend()
+            for index in range(3):
+                get_backend().publish(self.channel, 'test', {'index': index})
+            stream = Stream(self.path, last_event_id=0)
+            await stream.open()
+            await stream.read_until(b'event: reset\n')
+            await stream.close()
+
+    @override_settings(EVENTS={'BACKEND': 'events.backends.LocalBackend', 'HEARTBEAT': 0.01, 'QUEUE_SIZE': 2})
+    async def test_heartbeat_and_backpressure(self):
+        """
+        Verify idle streams get heartbeats and streams falling behind are closed
+        """
+
+        stream = Stream(self.path)
+        await stream.open()
+        await stream.read_until(b': heartbeat\n\n')
+        await stream.close()
+
+        broker = get_broker()
+        subscription = broker.subscribe(self.channel)
+        for index in range(3):
+            get_backend().publish(self.channel, 'test', {'index': index})
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.overflowed)
+        self.assertIsNone(await subscription.get())
+        self.assertNotIn(self.channel, broker.subscriptions)
+
+
+class DatabaseBackendTestCase(TestCase):
+
+    def test_publish_and_replay(self):
+        """
+        Verify the events are stored, replayed and purged
+        """
+
+        backend = DatabaseBackend()
+        for index in range(3):
+            backend.publish('snippet:1', 'test', {'index': index})
+        backend.publish('snippet:2', 'test', {})
+        first, second, third = Event.objects.filter(channel='snippet:1').values_list('id', flat=True)
+
+        self.assertEqual([{'index': 1}, {'index': 2}], [event.data for event in backend.replay('snippet:1', first)])
+        self.assertEqual(4, len(backend.poll(0, Event.objects.get(id=third).created_at)))
+
+        Event.objects.filter(id__lte=second).delete()
+        self.assertIsNone(backend.replay('snippet:1', first))
+        with override_settings(EVENTS={'RETENTION': -1}):
+            backend.purge()
+        self.assertFalse(Event.objects.exists())
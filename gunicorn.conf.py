@@ -0,0 +1,19 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+# The hooks run in the master, whichever worker class serves the requests
+
+
+def on_starting(server):
+    # Metrics of a previous master would otherwise be aggregated with the new ones
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of dead workers from the multiprocess metrics store
+    multiprocess.mark_process_dead(worker.pid)
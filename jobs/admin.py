@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'queue', 'name', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('queue', 'status', 'name')
+    search_fields = ('name', 'dedup_key')
@@ -0,0 +1,51 @@
+import signal
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from jobs.worker import Worker
+
+
+def _run_worker(options):
+    worker = Worker(options['queues'], options['batch_size'], options['poll_interval'])
+    # Stop after the current batch, the previous handlers let the pool terminate its idle workers
+    handlers = {signum: signal.signal(signum, worker.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        return worker.run(options['burst'])
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Run the workers of the job queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', dest='queues', action='append',
+                            help='Queue to run, may be repeated. Defaults to the "default" queue.')
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of jobs claimed at once.')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to wait when there are no jobs to run.')
+        parser.add_argument('--burst', action='store_true', help='Exit once there are no jobs left to run.')
+
+    def handle(self, *args, **options):
+        options = {
+            'queues': options['queues'] or ['default'],
+            'batch_size': options['batch_size'],
+            'poll_interval': options['poll_interval'],
+            'burst': options['burst'],
+            'processes': max(1, options['processes']),
+        }
+
+        if options['processes'] == 1:
+            processed = _run_worker(options)
+        else:
+            # The connections can't be shared with the forked workers
+            connections.close_all()
+            with get_context('fork').Pool(options['processes']) as pool:
+                processed = sum(pool.map(_run_worker, [options] * options['processes']))
+
+        self.stdout.write(self.style.SUCCESS('Processed {} jobs.'.format(processed)))
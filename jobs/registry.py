@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.models import Job
+
+DEFAULTS = {
+    'EAGER': False,
+    'BATCH_SIZE': 100,
+    'POLL_INTERVAL': 1.0,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 10,
+    'MAX_RETRY_DELAY': 3600,
+    'RETENTION': 3600,
+    'FAILED_RETENTION': 7 * 24 * 3600,
+}
+
+handlers = {}
+
+
+def get_setting(name):
+    return getattr(settings, 'JOB_QUEUE', {}).get(name, DEFAULTS[name])
+
+
+class Handler:
+    def __init__(self, name, func, batch, queue, max_attempts):
+        self.name = name
+        self.func = func
+        self.batch = batch
+        self.queue = queue
+        self.max_attempts = max_attempts or get_setting('MAX_ATTEMPTS')
+
+    def __call__(self, payloads):
+        """Run the handler on a list of payloads, in a single call for batch handlers."""
+
+        if self.batch:
+            self.func(payloads)
+        else:
+            for payload in payloads:
+                self.func(payload)
+
+
+def job(name, batch=False, queue='default', max_attempts=None):
+    """
+    Register a job handler under a name.
+
+    The handler is called with the payload of a job, or with the list of the
+    payloads of all the claimed jobs of that name for batch handlers. Jobs can be
+    run more than once, handlers must be idempotent.
+    """
+
+    def decorator(func):
+        handlers[name] = Handler(name, func, batch, queue, max_attempts)
+        return func
+
+    return decorator
+
+
+def enqueue_many(name, payloads, dedup_keys=None, delay=0):
+    """
+    Enqueue jobs of the named handler in a single statement, once the current
+    transaction is committed, right away outside of transactions.
+
+    Jobs whose dedup key is already pending are skipped. Enqueued after the
+    commit, a pending job of the same key then always runs after the commit
+    too, rather than possibly before it when a worker claims it while the
+    transaction is still open. In the EAGER mode of the test suite they are
+    run after the commit in the current thread instead.
+    """
+
+    handler = handlers[name]
+    payloads = list(payloads)
+    if get_setting('EAGER'):
+        transaction.on_commit(lambda: handler(payloads))
+        return
+
+    dedup_keys = dedup_keys or [None] * len(payloads)
+    transaction.on_commit(lambda: _insert_jobs(handler, payloads, dedup_keys, delay))
+
+
+def _insert_jobs(handler, payloads, dedup_keys, delay):
+    run_at = timezone.now() + timedelta(seconds=delay)
+    Job.objects.bulk_create([
+        Job(queue=handler.queue, name=handler.name, payload=payload, dedup_key=dedup_key, run_at=run_at)
+        for payload, dedup_key in zip(payloads, dedup_keys)
+    ], ignore_conflicts=True)
+
+
+def enqueue(name, payload=None, dedup_key=None, delay=0):
+    enqueue_many(name, [payload or {}], [dedup_key], delay)
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITransactionTestCase
+from jobs.models import Job
+from jobs.registry import enqueue, enqueue_many, job
+from jobs.worker import Worker, claim
+
+User = get_user_model()
+
+calls = []
+
+
+@job('tests.record', batch=True)
+def record(payloads):
+    calls.append(sorted(payload['value'] for payload in payloads))
+
+
+@job('tests.fail', max_attempts=2)
+def fail(payload):
+    raise ValueError('failed')
+
+
+# Without the transaction of test cases, the jobs are enqueued once committed
+@override_settings(JOB_QUEUE={'EAGER': False, 'POLL_INTERVAL': 0})
+class JobQueueTestCase(APITransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_dedup_keys(self):
+        """
+        Verify a job isn't enqueued again while one with the same key is pending
+        """
+
+        enqueue('tests.record', {'value': 1}, dedup_key='record:1')
+        enqueue('tests.record', {'value': 1}, dedup_key='record:1')
+        enqueue_many('tests.record', [{'value': 2}, {'value': 3}])
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 3)
+
+        Job.objects.update(status=Job.RUNNING)
+        enqueue('tests.record', {'value': 1}, dedup_key='record:1')
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_enqueued_after_commit(self):
+        """
+        Verify a job claimed before the commit of a transaction enqueuing it again is enqueued again
+        """
+
+        enqueue('tests.record', {'value': 1}, dedup_key='record:1')
+        with transaction.atomic():
+            enqueue('tests.record', {'value': 1}, dedup_key='record:1')
+            self.assertEqual(Job.objects.count(), 1)
+            # The pending job may read the rows before the commit
+            self.assertEqual(len(claim(['default'], 10)), 1)
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_batch_handler(self):
+        """
+        Verify batch handlers get the payloads of all the claimed jobs at once
+        """
+
+        enqueue_many('tests.record', [{'value': value} for value in range(5)])
+        enqueue('tests.record', {'value': 5}, delay=60)
+
+        self.assertEqual(Worker(['default']).run(burst=True), 5)
+        self.assertEqual(calls, [[0, 1, 2, 3, 4]])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 5)
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_retries(self):
+        """
+        Verify failed jobs are retried with a backoff, then marked as failed
+        """
+
+        enqueue('tests.fail')
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            Worker(['default']).run(burst=True)
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Job.PENDING, 1))
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn('ValueError', failed.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            Worker(['default']).run(burst=True)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_expired_lease(self):
+        """
+        Verify jobs of dead workers are claimed again once their lease expires
+        """
+
+        enqueue('tests.record', {'value': 1})
+        self.assertEqual(len(claim(['default'], 10)), 1)
+        self.assertEqual(claim(['default'], 10), [])
+
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        call_command('run_jobs', burst=True, stdout=StringIO())
+        self.assertEqual(calls, [[1]])
+        self.assertEqual(Job.objects.get().attempts, 2)
+
+    def test_metrics(self):
+        """
+        Verify the metrics view reports the depth and latency of the queues
+        """
+
+        enqueue_many('tests.record', [{'value': value} for value in range(3)])
+        Worker(['default'], batch_size=2).run_once()
+        url = reverse('jobs:metrics')
+
+        user = User.objects.create_user('admin', 'admin@snip.com', 'admin_pass', is_staff=True)
+        self.client.force_authenticate(user)
+        metrics = self.client.get(url).json()
+
+        self.assertEqual(len(metrics), 1)
+        self.assertEqual((metrics[0]['pending'], metrics[0]['done']), (1, 2))
+        self.assertIsNotNone(metrics[0]['avg_wait_seconds'])
+
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get(url).status_code, (401, 403))
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from jobs.views import JobMetricsView
+
+app_name = 'jobs'
+
+urlpatterns = [
+    path('metrics/', JobMetricsView.as_view(), name='metrics'),
+]
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from jobs.models import Job
+from jobs.registry import get_setting
+from shared.mixins import InstrumentedViewMixin
+
+
+def _seconds(duration):
+    return None if duration is None else round(duration.total_seconds(), 3)
+
+
+class JobMetricsView(InstrumentedViewMixin, APIView):
+    """
+    Depth and latency of the job queues per queue and job name.
+
+    The wait is the time between a job being due and its last start, the
+    latencies of the done jobs cover the RETENTION period of the queue.
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    @extend_schema(description='Get the depth and latency of the job queues.', responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        now = timezone.now()
+        metrics = {}
+
+        def entry(row):
+            return metrics.setdefault((row['queue'], row['name']), {
+                'queue': row['queue'], 'name': row['name'],
+                'pending': 0, 'running': 0, 'failed': 0, 'done': 0, 'oldest_pending_seconds': None,
+                'avg_wait_seconds': None, 'max_wait_seconds': None, 'avg_run_seconds': None,
+            })
+
+        counts = Job.objects.filter(status__in=(Job.PENDING, Job.RUNNING, Job.FAILED)) \
+            .values('queue', 'name', 'status').annotate(count=Count('id'), oldest=Min('run_at')).order_by()
+        for row in counts:
+            entry(row)[row['status']] = row['count']
+            if row['status'] == Job.PENDING:
+                entry(row)['oldest_pending_seconds'] = _seconds(max(now - row['oldest'], timedelta()))
+
+        wait = ExpressionWrapper(F('started_at') - F('run_at'), output_field=DurationField())
+        run = ExpressionWrapper(F('finished_at') - F('started_at'), output_field=DurationField())
+        done = Job.objects.filter(status=Job.DONE, finished_at__gte=now - timedelta(seconds=get_setting('RETENTION'))) \
+            .values('queue', 'name').annotate(count=Count('id'), avg_wait=Avg(wait), max_wait=Max(wait),
+                                              avg_run=Avg(run)).order_by()
+        for row in done:
+            entry(row).update({
+                'done': row['count'],
+                'avg_wait_seconds': _seconds(row['avg_wait']),
+                'max_wait_seconds': _seconds(row['max_wait']),
+                'avg_run_seconds': _seconds(row['avg_run']),
+            })
+
+        return Response(sorted(metrics.values(), key=lambda metric: (metric['queue'], metric['name'])))
@@ -0,0 +1,152 @@
+import logging
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.registry import get_setting, handlers
+
+logger = logging.getLogger(__name__)
+
+
+def claimable(queues):
+    """Pending jobs which are due, and running jobs whose worker lease expired."""
+
+    now = timezone.now()
+    return Job.objects.filter(queue__in=queues).filter(
+        Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now))
+
+
+def claim(queues, limit):
+    """
+    Claim up to limit jobs for this worker and return them.
+
+    Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED where supported, so
+    concurrent workers skip each other's candidates. Elsewhere, like on SQLite
+    which serialises writes anyway, the claim is a conditional UPDATE of the
+    candidates which are still claimable.
+    """
+
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    claimed = {
+        'status': Job.RUNNING,
+        'locked_by': token,
+        'locked_until': now + timedelta(seconds=get_setting('LEASE')),
+        'started_at': now,
+        'attempts': F('attempts') + 1,
+    }
+    candidates = claimable(queues).order_by('run_at', 'id').values_list('id', flat=True)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(candidates.select_for_update(skip_locked=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**claimed)
+    else:
+        ids = list(candidates[:limit])
+        claimable(queues).filter(id__in=ids).update(**claimed)
+
+    return list(Job.objects.filter(locked_by=token, status=Job.RUNNING).order_by('name', 'id'))
+
+
+def complete(jobs):
+    # Filtered on the claim, a job whose lease expired may have been claimed again
+    Job.objects.filter(id__in=[job.id for job in jobs], locked_by=jobs[0].locked_by, status=Job.RUNNING) \
+        .update(status=Job.DONE, finished_at=timezone.now(), locked_until=None)
+
+
+def fail(jobs, error, max_attempts):
+    """Schedule the jobs again with an exponential backoff, or mark them as failed after max_attempts."""
+
+    now = timezone.now()
+    for job in jobs:
+        claimed = Job.objects.filter(id=job.id, locked_by=job.locked_by, status=Job.RUNNING)
+        if job.attempts >= max_attempts:
+            claimed.update(status=Job.FAILED, finished_at=now, locked_until=None, last_error=error)
+            continue
+
+        delay = min(get_setting('RETRY_DELAY') * 2 ** (job.attempts - 1), get_setting('MAX_RETRY_DELAY'))
+        try:
+            with transaction.atomic():
+                claimed.update(status=Job.PENDING, run_at=now + timedelta(seconds=delay), locked_by=None,
+                               locked_until=None, last_error=error)
+        except IntegrityError:
+            # The same work was enqueued again meanwhile, the pending job replaces this one
+            claimed.update(status=Job.DONE, finished_at=now, locked_until=None, last_error=error)
+
+
+def run(jobs):
+    """Run claimed jobs, grouped by name so that batch handlers get all the jobs of their name at once."""
+
+    for name, group in groupby(jobs, key=lambda job: job.name):
+        group = list(group)
+        handler = handlers.get(name)
+        if handler is None:
+            fail(group, 'No handler registered for "{}".'.format(name), 0)
+            continue
+
+        calls = [group] if handler.batch else [[job] for job in group]
+        for call in calls:
+            started = time.perf_counter()
+            try:
+                handler([job.payload for job in call])
+            except Exception:
+                logger.exception('Job %s failed', name)
+                fail(call, traceback.format_exc(), handler.max_attempts)
+            else:
+                complete(call)
+                logger.info('Ran %d %s jobs in %.1fms', len(call), name, (time.perf_counter() - started) * 1000)
+
+
+def purge_finished():
+    """Delete the jobs done before the retention period, and the failed ones before theirs."""
+
+    now = timezone.now()
+    return Job.objects.filter(
+        Q(status=Job.DONE, finished_at__lt=now - timedelta(seconds=get_setting('RETENTION')))
+        | Q(status=Job.FAILED, finished_at__lt=now - timedelta(seconds=get_setting('FAILED_RETENTION')))
+    ).delete()[0]
+
+
+class Worker:
+    """Claims and runs jobs of the queues until stopped, or until they are empty in burst mode."""
+
+    purge_interval = 60
+
+    def __init__(self, queues, batch_size=None, poll_interval=None):
+        self.queues = queues
+        self.batch_size = batch_size or get_setting('BATCH_SIZE')
+        self.poll_interval = get_setting('POLL_INTERVAL') if poll_interval is None else poll_interval
+        self.stopped = False
+        self.last_purge = 0
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def run_once(self):
+        """Run a batch of jobs and return the number of claimed jobs."""
+
+        if time.monotonic() - self.last_purge > self.purge_interval:
+            purge_finished()
+            self.last_purge = time.monotonic()
+
+        jobs = claim(self.queues, self.batch_size)
+        run(jobs)
+        return len(jobs)
+
+    def run(self, burst=False):
+        processed = 0
+        while not self.stopped:
+            claimed = self.run_once()
+            processed += claimed
+            if not claimed:
+                if burst:
+                    break
+                time.sleep(self.poll_interval)
+        return processed
@@ -0,0 +1,48 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The object was modified since it was fetched, fetch it again before updating it.'
+    default_code = 'precondition_failed'
+
+
+def format_etag(version):
+    return '"{}"'.format(version)
+
+
+def parse_if_match(request):
+    """
+    Versions given in the If-Match header, None without the header or with "*",
+    which match any version. Tags which aren't versions match none, neither do
+    weak tags since If-Match uses the strong comparison (RFC 7232).
+    """
+
+    header = request.headers.get('If-Match')
+    if header is None or header.strip() == '*':
+        return None
+
+    versions = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.add(int(tag[1:-1]))
+    return versions
+
+
+def check_version(version, expected_versions):
+    if expected_versions is not None and version not in expected_versions:
+        raise PreconditionFailed()
+
+
+def lock_version(instance, expected_versions, field='version'):
+    """
+    Lock the row of an instance for the rest of the transaction and return its
+    current version, raising PreconditionFailed when it isn't an expected one.
+    """
+
+    version = type(instance)._default_manager.select_for_update() \
+        .values_list(field, flat=True).get(pk=instance.pk)
+    check_version(version, expected_versions)
+    return version
@@ -1,10 +1,99 @@
+import re
+from datetime import timedelta
+
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
 from rest_framework import filters
+from rest_framework.exceptions import ValidationError
 
 
 class TopicsFilterBackend(filters.BaseFilterBackend):
+    """
+    Filters snippets by topic ids.
+
+    "topics_any" keeps the snippets having at least one of the topics, "topics" being
+    kept as an alias, and "topics_all" the snippets having every topic. Each condition
+    is an EXISTS subquery on the topics join table instead of a join, so snippets are
+    never duplicated and the lookups use its (snippet, topic) unique index.
+    """
+
+    max_topics = 20
+
+    def get_id_list(self, request, param):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+
+        try:
+            id_list = sorted({int(topic_id) for topic_id in value.split(',')})
+        except ValueError:
+            raise ValidationError({param: 'Must be a comma separated list of topic ids.'})
+        if len(id_list) > self.max_topics:
+            raise ValidationError({param: 'At most {} topics can be given.'.format(self.max_topics)})
+        return id_list
+
     def filter_queryset(self, request, queryset, view):
-        id_list = request.query_params.get('topics')
-        if not id_list:
+        through = queryset.model.topics.through.objects.filter(snippet_id=OuterRef('pk'))
+
+        any_list = self.get_id_list(request, 'topics_any') or self.get_id_list(request, 'topics')
+        if any_list:
+            queryset = queryset.filter(Exists(through.filter(topic_id__in=any_list)))
+
+        for topic_id in self.get_id_list(request, 'topics_all') or []:
+            queryset = queryset.filter(Exists(through.filter(topic_id=topic_id)))
+        return queryset
+
+
+class LanguagesFilterBackend(filters.BaseFilterBackend):
+    """
+    Filters snippets having a file in one of the comma separated "languages", with
+    an EXISTS subquery on their denormalised languages.
+    """
+
+    max_languages = 20
+    language_pattern = re.compile(r'^[a-z0-9+#_-]{1,30}$')
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get('languages')
+        if not value:
             return queryset
-        id_list = list(map(int, id_list.split(',')))
-        return queryset.filter(topics__id__in=id_list)
+
+        languages = sorted({language.strip().lower() for language in value.split(',')})
+        if len(languages) > self.max_languages or not all(map(self.language_pattern.match, languages)):
+            raise ValidationError({'languages': 'Must be a comma separated list of at most {} languages.'.format(
+                self.max_languages)})
+        related = queryset.model.languages.rel.related_model
+        return queryset.filter(Exists(related.objects.filter(snippet_id=OuterRef('pk'), language__in=languages)))
+
+
+class RankingFilterBackend(filters.BaseFilterBackend):
+    """
+    Orders snippets by one of the materialised ranking scores.
+
+    "top_day" and "top_week" restrict the snippets to the period before sorting
+    them by their total score.
+    """
+
+    orderings = {
+        'new': ('-id',),
+        'trending': ('-hot_score', '-id'),
+        'controversial': ('-controversy_score', '-id'),
+    }
+    top_periods = {
+        'top_day': timedelta(days=1),
+        'top_week': timedelta(weeks=1),
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = request.query_params.get('ordering')
+        if not ordering:
+            return queryset
+
+        if ordering in self.orderings:
+            return queryset.order_by(*self.orderings[ordering])
+        if ordering in self.top_periods:
+            return queryset.filter(created_date__gte=timezone.now() - self.top_periods[ordering]) \
+                .alias(score=F('upvotes') + F('downvotes')).order_by('-score', '-id')
+
+        raise ValidationError({'ordering': 'Must be one of: {}.'.format(
+            ', '.join(list(self.orderings) + list(self.top_periods)))})
@@ -0,0 +1,104 @@
+import json
+import logging
+import time
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """
+    Collects the timings of a single request.
+
+    Durations are accumulated by name in milliseconds, database queries are
+    counted and timed through a connection execute wrapper, and fed to the
+    query inspector if one is attached. API views set view_labels to the
+    (viewset, action) pair used to label the metrics.
+    """
+
+    def __init__(self, request, inspector=None):
+        self.inspector = inspector
+        self.method = request.method
+        self.path = request.path
+        self.view_labels = None
+        self.started = time.perf_counter()
+        self.timings = {}
+        self.query_count = 0
+        self.query_time = 0.0
+
+    def add(self, name, duration):
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+
+    @property
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.query_count += 1
+            self.query_time += duration
+            if self.inspector is not None:
+                self.inspector.record(sql, duration)
+
+    @contextmanager
+    def activate(self):
+        """Make this profile current and record the queries of every connection."""
+
+        token = _current_profile.set(self)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.record_query))
+                yield self
+        finally:
+            _current_profile.reset(token)
+
+    def server_timing(self, total):
+        metrics = ['db;dur={:.2f};desc="{} queries"'.format(self.query_time, self.query_count)]
+        metrics += ['{};dur={:.2f}'.format(name, duration) for name, duration in self.timings.items()]
+        metrics.append('total;dur={:.2f}'.format(total))
+        return ', '.join(metrics)
+
+    def log(self, status_code, total, **extra):
+        logger.info(json.dumps({
+            'event': 'request_profile',
+            'method': self.method,
+            'path': self.path,
+            'status': status_code,
+            'total_ms': round(total, 2),
+            'db_ms': round(self.query_time, 2),
+            'db_queries': self.query_count,
+            **{'{}_ms'.format(name): round(duration, 2) for name, duration in self.timings.items()},
+            **extra,
+        }))
+
+
+def current_profile():
+    """Return the profile of the request being handled, None if it isn't sampled."""
+
+    return _current_profile.get()
+
+
+@contextmanager
+def measure(name):
+    """Add the duration of the block to the current request profile, if any."""
+
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, (time.perf_counter() - started) * 1000)
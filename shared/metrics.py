@@ -0,0 +1,50 @@
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+
+LABELS = ('viewset', 'action')
+
+REQUESTS = Counter(
+    'api_requests_total', 'Number of API requests.', LABELS + ('method', 'status'))
+ERRORS = Counter(
+    'api_request_errors_total', 'Number of API requests answered with a server error.', LABELS)
+LATENCY = Histogram(
+    'api_request_duration_seconds', 'API request duration.', LABELS,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+QUERIES = Histogram(
+    'api_request_db_queries', 'Number of database queries per API request.', LABELS,
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500))
+QUERY_TIME = Histogram(
+    'api_request_db_duration_seconds', 'Database time per API request.', LABELS,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+
+def observe_request(profile, method, status_code, total):
+    """Record a profiled API request, requests outside of the API views are ignored."""
+
+    if profile.view_labels is None:
+        return
+
+    labels = profile.view_labels
+    REQUESTS.labels(*labels, method, status_code).inc()
+    if status_code >= 500:
+        ERRORS.labels(*labels).inc()
+    LATENCY.labels(*labels).observe(total / 1000)
+    QUERIES.labels(*labels).observe(profile.query_count)
+    QUERY_TIME.labels(*labels).observe(profile.query_time / 1000)
+
+
+def render_metrics():
+    """
+    Render the metrics in the Prometheus text format.
+
+    When PROMETHEUS_MULTIPROC_DIR is set every worker process writes its samples
+    to memory mapped files in that directory, which are aggregated here.
+    """
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
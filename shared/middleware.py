@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.conf import settings
+
+from shared.instrumentation import RequestProfile, current_profile
+from shared.metrics import observe_request
+from shared.query_inspector import QueryInspector, get_setting as get_inspector_setting
+
+
+class RequestProfilingMiddleware:
+    """
+    Profiles the requests for the metrics, the query inspector and the Server-Timing header.
+
+    Every request feeds the metrics when METRICS_ENABLED is set and is checked for
+    repeated and slow queries unless the QUERY_INSPECTOR mode is "off". A sample of the
+    requests, controlled by the SERVER_TIMING_SAMPLE_RATE setting, additionally
+    gets a Server-Timing header with the database, authentication, handler and
+    rendering durations, which are also logged as a JSON line.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def get_sample_rate(self):
+        rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', None)
+        if rate is None:
+            return 1.0 if settings.DEBUG else 0.01
+        return rate
+
+    def __call__(self, request):
+        rate = self.get_sample_rate()
+        sampled = rate > 0 and random.random() < rate
+        metrics_enabled = getattr(settings, 'METRICS_ENABLED', False)
+        inspector = QueryInspector() if get_inspector_setting('MODE') != 'off' else None
+        if not sampled and not metrics_enabled and inspector is None:
+            return self.get_response(request)
+
+        profile = RequestProfile(request, inspector)
+        with profile.activate():
+            response = self.get_response(request)
+
+        total = profile.total
+        if metrics_enabled:
+            observe_request(profile, request.method, response.status_code, total)
+        if sampled:
+            response['Server-Timing'] = profile.server_timing(total)
+            profile.log(response.status_code, total)
+        if inspector is not None:
+            inspector.report(request.method, request.path)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, time it with a post-render callback
+        profile = current_profile()
+        if profile is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: profile.add('render', (time.perf_counter() - started) * 1000))
+        return response
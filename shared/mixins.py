@@ -1,4 +1,14 @@
-from rest_framework import permissions
+import time
+
+from django.shortcuts import get_object_or_404
+from rest_framework import permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from shared.concurrency import format_etag, parse_if_match
+from shared.instrumentation import current_profile, measure
+from shared.serializers import get_fieldset, prune_queryset
 
 
 class DynamicSerializersMixin:
@@ -46,3 +56,154 @@ class DynamicPermissionsMixin:
                 permission_classes = None
 
             return [permission() for permission in (permission_classes or self.permission_classes)]
+
+
+class InstrumentedViewMixin:
+    """
+    Labels the request profile with the viewset and action names and adds the
+    authentication and handler durations to it.
+
+    The handler is measured as its duration minus the time spent in database
+    queries, which covers building querysets and running serializers.
+    """
+
+    def perform_authentication(self, request):
+        with measure('auth'):
+            super().perform_authentication(request)
+
+    def initial(self, request, *args, **kwargs):
+        profile = current_profile()
+        if profile is not None:
+            # Labelled first so that requests failing authentication are counted too
+            action = getattr(self, 'action', None) or request.method.lower()
+            profile.view_labels = (self.__class__.__name__, action)
+
+        super().initial(request, *args, **kwargs)
+        if profile is not None:
+            self._handler_started = (time.perf_counter(), profile.query_time)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profile = current_profile()
+        handler_started = getattr(self, '_handler_started', None)
+        if profile is not None and handler_started is not None:
+            started, query_time = handler_started
+            elapsed = (time.perf_counter() - started) * 1000
+            profile.add('handler', max(0.0, elapsed - (profile.query_time - query_time)))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class SparseQuerysetMixin:
+    """
+    Restricts the columns, joins and prefetches of the queryset of read requests
+    selecting fields with "fields" or "expand" to the ones the selected fields
+    of the serializer need, see SparseFieldsetsMixin.
+    """
+
+    def get_queryset(self):
+        return self.prune_queryset(super().get_queryset())
+
+    def prune_queryset(self, queryset):
+        if get_fieldset(self.request) == (None, None):
+            return queryset
+        return prune_queryset(queryset, self.get_serializer())
+
+
+class MultiGetMixin:
+    """
+    Adds a "batch" action returning the objects of a comma separated list of
+    "ids" in the request order, so that clients fetch many objects in a single
+    request instead of a retrieve per object.
+
+    The objects are loaded with the queryset of the viewset in a single query
+    (plus its prefetches) and serialized as a list, so that list serializers
+    can preload what they need for all of them at once. Missing ids don't fail
+    the request, their results are null and they are listed in "not_found".
+    """
+
+    max_batch_size = 50
+
+    def get_batch_ids(self):
+        value = self.request.query_params.get('ids')
+        if not value:
+            raise ValidationError({'ids': 'This parameter is required.'})
+
+        try:
+            # Ordered like the request, without duplicates
+            ids = list(dict.fromkeys(int(pk) for pk in value.split(',')))
+        except ValueError:
+            raise ValidationError({'ids': 'Must be a comma separated list of ids.'})
+        if len(ids) > self.max_batch_size:
+            raise ValidationError({'ids': 'At most {} ids can be given.'.format(self.max_batch_size)})
+        return ids
+
+    def get_batch_representations(self, ids):
+        """Representations of the found objects by id."""
+
+        objects = self.get_queryset().in_bulk(ids)
+        found = [pk for pk in ids if pk in objects]
+        serializer = self.get_serializer([objects[pk] for pk in found], many=True)
+        return dict(zip(found, serializer.data))
+
+    @action(methods=['get'], detail=False, url_path='batch', url_name='batch')
+    def batch(self, request):
+        ids = self.get_batch_ids()
+        representations = self.get_batch_representations(ids)
+        return Response({
+            'results': [representations.get(pk) for pk in ids],
+            'not_found': [pk for pk in ids if pk not in representations],
+        })
+
+
+class VersionedUpdateMixin:
+    """
+    Optimistic concurrency of the updates. The responses of the retrieve and
+    update actions have the version of the object as ETag, which clients send
+    back in If-Match so that the update fails with a 412 when the object was
+    modified by someone else in the meantime. Updates without If-Match always
+    apply.
+
+    The update serializer gets the expected versions as "expected_versions" in
+    its context, and checks them while writing, see shared.concurrency.
+    """
+
+    version_field = 'version'
+
+    def get_object(self):
+        self.versioned_object = super().get_object()
+        return self.versioned_object
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('update', 'partial_update'):
+            context['expected_versions'] = parse_if_match(self.request)
+        return context
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        instance = getattr(self, 'versioned_object', None)
+        if instance is not None and self.action in ('retrieve', 'update', 'partial_update') \
+                and status.is_success(response.status_code):
+            response['ETag'] = format_etag(getattr(instance, self.version_field))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class NestedResourceMixin:
+    """
+    Views of resources nested in a parent object of the URL, like the files of
+    a snippet. The parent is loaded once per request with only parent_fields,
+    which include its owner for the permissions, and cached on the request.
+
+    With owned_by_parent, the objects belong to the owner of their parent, which
+    is the one IsOwner checks, including for the creations.
+    """
+
+    parent_queryset = None
+    parent_lookup_kwarg = None
+    parent_fields = ('id', 'user_id')
+    owned_by_parent = False
+
+    def get_parent(self):
+        request = self.request
+        if getattr(request, 'nested_parent', None) is None:
+            queryset = self.parent_queryset.only(*self.parent_fields)
+            request.nested_parent = get_object_or_404(queryset, pk=self.kwargs[self.parent_lookup_kwarg])
+        return request.nested_parent
@@ -2,8 +2,12 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F
+from django.dispatch import Signal
+
+# Sent by VoteMixin instances with the changes of their upvotes and downvotes
+score_changed = Signal()
 
 
 class Vote(models.Model):
@@ -31,6 +35,19 @@ class Vote(models.Model):
     def vote_with_user_object(cls, content_object, user_object, score):
         return Vote(content_object=content_object, user=user_object, score=score)
 
+    @classmethod
+    def scores_for(cls, user_object, objects):
+        """Return the user's vote score of each object by id, in a single query."""
+
+        objects = list(objects)
+        if not objects:
+            return {}
+        return dict(cls.objects.filter(
+            user=user_object,
+            content_type=ContentType.objects.get_for_model(objects[0]),
+            object_id__in=[obj.id for obj in objects],
+        ).values_list('object_id', 'score'))
+
 
 class VoteMixin(models.Model):
     votes = GenericRelation(Vote)
@@ -55,7 +72,10 @@ class VoteMixin(models.Model):
             upvotes=F("upvotes") + diff_up,
             downvotes=F("downvotes") + diff_down,
         )
+        score_changed.send(sender=self.__class__, instance=self, upvotes=diff_up, downvotes=diff_down)
 
+    # The vote, the counters and the counters derived from them by score_changed receivers change together
+    @transaction.atomic
     def upvote(self, user_object):
         """Upvote the instance with provided user."""
 
@@ -86,6 +106,7 @@ class VoteMixin(models.Model):
 
         self._update_score(diff_up, diff_down)
 
+    @transaction.atomic
     def downvote(self, user_object):
         """Downvote the instance with the provided user."""
 
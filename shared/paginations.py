@@ -0,0 +1,117 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class FacetedPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination adding the facet counts set by the view to the page.
+    """
+
+    facets = None
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.facets is not None:
+            response.data['facets'] = self.facets
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['facets'] = {
+            'type': 'object',
+            'properties': {
+                'topics': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'id': {'type': 'integer'},
+                            'name': {'type': 'string'},
+                            'count': {'type': 'integer'},
+                        },
+                    },
+                },
+            },
+        }
+        return schema
+
+
+class SequencePagination(BasePagination):
+    """
+    Pagination of append-only logs by increasing sequence number. A page has
+    the entries after the sequence number of the "since" parameter, its
+    "cursor" is the sequence number to fetch the next page from, also linked as
+    "next" while there are more entries.
+    """
+
+    sequence_field = 'seq'
+    page_size = 100
+    max_page_size = 1000
+    since_query_param = 'since'
+    limit_query_param = 'limit'
+
+    def get_int_param(self, request, name, default, maximum=None):
+        value = request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+            if value < 0:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({name: 'Must be a positive integer.'})
+        return min(value, maximum) if maximum is not None else value
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.since = self.get_int_param(request, self.since_query_param, 0)
+        limit = max(1, self.get_int_param(request, self.limit_query_param, self.page_size, self.max_page_size))
+
+        entries = list(queryset.filter(**{self.sequence_field + '__gt': self.since})
+                       .order_by(self.sequence_field)[:limit + 1])
+        self.has_next = len(entries) > limit
+        entries = entries[:limit]
+        self.cursor = getattr(entries[-1], self.sequence_field) if entries else self.since
+        return entries
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.since_query_param, self.cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'cursor': self.cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'cursor': {'type': 'integer', 'description': 'Sequence number to fetch the next changes from.'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.since_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Sequence number of the last entry already fetched, the cursor of the previous page.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.limit_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of entries per page, at most {}.'.format(self.max_page_size),
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,15 @@
+import msgpack
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+
+class MessagePackParser(parsers.BaseParser):
+    """Parses application/msgpack request bodies."""
+
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - {}'.format(exc))
@@ -1,13 +1,39 @@
+from django.contrib.auth import get_user_model
 from rest_framework import permissions
 
 
 class IsOwner(permissions.BasePermission):
     """
-    Allows access only to the owner of the object.
+    Allows access only to the owner of the object, the user itself for users.
+
+    Objects of views owned by their parent, see NestedResourceMixin, belong to
+    the owner of the parent, which is checked before loading them.
+    """
+
+    def has_permission(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return False
+        if getattr(view, 'owned_by_parent', False):
+            return view.get_parent().user_id == request.user.id
+        return True
+
+    def has_object_permission(self, request, view, obj):
+        if getattr(view, 'owned_by_parent', False):
+            return view.get_parent().user_id == request.user.id
+        if isinstance(obj, get_user_model()):
+            return obj.pk == request.user.pk
+        return obj.user_id == request.user.id
+
+
+class IsAdminOrOwner(IsOwner):
+    """
+    Allows access to the admins and to the owner of the object. Unlike
+    IsAdminUser | IsOwner, which lets everyone through the object checks since
+    IsAdminUser has none.
     """
 
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated()
+        return bool(request.user and request.user.is_staff) or super().has_permission(request, view)
 
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        return bool(request.user and request.user.is_staff) or super().has_object_permission(request, view, obj)
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import random
+import re
+import traceback
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'log',
+    'REPEATED_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+    'STACK_SAMPLE_RATE': 0.1,
+    'STACK_DEPTH': 6,
+}
+
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+_placeholder_lists = re.compile(r'\(\s*%s(\s*,\s*%s)*\s*\)')
+_string_literals = re.compile(r"'(?:[^']|'')*'")
+_number_literals = re.compile(r'\b\d+(\.\d+)?\b')
+_whitespace = re.compile(r'\s+')
+
+
+class QueryInspectionError(Exception):
+    pass
+
+
+def get_setting(name):
+    return getattr(settings, 'QUERY_INSPECTOR', {}).get(name, DEFAULTS[name])
+
+
+def fingerprint(sql):
+    """Normalise a statement so that queries differing only by their parameters are grouped."""
+
+    sql = _string_literals.sub('?', sql)
+    sql = _number_literals.sub('?', sql)
+    sql = _placeholder_lists.sub('(...)', sql)
+    return _whitespace.sub(' ', sql).strip()
+
+
+def capture_stack():
+    """Return the innermost frames of the project code, skipping libraries and the profiling code."""
+
+    base_dir = str(settings.BASE_DIR)
+    skipped = {__file__, os.path.join(os.path.dirname(__file__), 'instrumentation.py')}
+    frames = [
+        '{}:{} in {}'.format(os.path.relpath(frame.filename, base_dir), frame.lineno, frame.name)
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in skipped
+    ]
+    return frames[-get_setting('STACK_DEPTH'):]
+
+
+class QueryInspector:
+    """
+    Watches the SQL statements of a request for N+1 patterns and slow queries.
+
+    Statements are grouped by fingerprint, a group executed REPEATED_THRESHOLD
+    times or more is reported as a repeated query, and any statement slower than
+    SLOW_QUERY_MS is reported as slow. The call site stack is captured for a
+    sample of the reported statements.
+    """
+
+    def __init__(self):
+        self.threshold = get_setting('REPEATED_THRESHOLD')
+        self.slow_query_ms = get_setting('SLOW_QUERY_MS')
+        self.stack_sample_rate = get_setting('STACK_SAMPLE_RATE')
+        self.counts = {}
+        self.stacks = {}
+        self.slow = []
+
+    def sample_stack(self):
+        return capture_stack() if random.random() < self.stack_sample_rate else None
+
+    def record(self, sql, duration):
+        if sql.startswith(IGNORED_PREFIXES):
+            return
+
+        key = fingerprint(sql)
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if count == self.threshold:
+            self.stacks[key] = self.sample_stack()
+        if duration >= self.slow_query_ms:
+            self.slow.append({'sql': key, 'duration_ms': round(duration, 2), 'stack': self.sample_stack()})
+
+    def issues(self):
+        repeated = [
+            {'sql': key, 'count': count, 'stack': self.stacks.get(key)}
+            for key, count in self.counts.items() if count >= self.threshold
+        ]
+        return {'repeated': repeated, 'slow': self.slow} if repeated or self.slow else None
+
+    def report(self, method, path):
+        """Log the issues of the request, or raise them in the "raise" mode used by the test suite."""
+
+        issues = self.issues()
+        if issues is None:
+            return
+
+        message = json.dumps({'event': 'query_inspection', 'method': method, 'path': path, **issues})
+        if get_setting('MODE') == 'raise':
+            raise QueryInspectionError(message)
+        logger.warning(message)
@@ -0,0 +1,71 @@
+from drf_spectacular import openapi
+from drf_spectacular.extensions import OpenApiSerializerExtension
+from drf_spectacular.plumbing import force_instance, is_serializer
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+
+from shared.serializers import SparseFieldsetsMixin
+
+
+def fieldset_parameters(serializer):
+    """The "fields" and "expand" query parameters of a serializer with SparseFieldsetsMixin."""
+
+    serializer = force_instance(serializer)
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, SparseFieldsetsMixin):
+        return []
+
+    parameters = [OpenApiParameter(
+        name='fields',
+        type={'type': 'array', 'items': {'type': 'string'}},
+        location=OpenApiParameter.QUERY,
+        required=False,
+        explode=False,
+        description='Fields of the response, the others are omitted. Fields of nested objects are dotted paths '
+                    'like "files.name".'
+    )]
+    expandable_fields = getattr(serializer.Meta, 'expandable_fields', {})
+    if expandable_fields:
+        parameters.append(OpenApiParameter(
+            name='expand',
+            type={'type': 'array', 'items': {'type': 'string', 'enum': list(expandable_fields)}},
+            location=OpenApiParameter.QUERY,
+            required=False,
+            explode=False,
+            description='Fields added to the response.'
+        ))
+    return parameters
+
+
+class AutoSchema(openapi.AutoSchema):
+    """Documents the sparse fieldsets parameters of the read operations responding with their serializers."""
+
+    def get_override_parameters(self):
+        parameters = super().get_override_parameters()
+        if self.method != 'GET':
+            return parameters
+
+        serializer = self.get_response_serializers()
+        if not is_serializer(serializer):
+            return parameters
+        return [*parameters, *fieldset_parameters(serializer)]
+
+
+class SparseFieldsetsSerializerExtension(OpenApiSerializerExtension):
+    """
+    Responses of serializers with SparseFieldsetsMixin have their expandable
+    fields, and none of their fields are required since they can be left out.
+    """
+
+    target_class = 'shared.serializers.SparseFieldsetsMixin'
+    match_subclasses = True
+
+    def map_serializer(self, auto_schema, direction):
+        if direction != 'response':
+            return auto_schema._map_serializer(self.target, direction, bypass_extensions=True)
+
+        serializer = self.target.__class__(context={'expand_all': True})
+        schema = auto_schema._map_serializer(serializer, direction, bypass_extensions=True)
+        schema.pop('required', None)
+        return schema
@@ -1,7 +1,221 @@
-from rest_framework import serializers
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
+from rest_framework.exceptions import ValidationError
 
 
 class RecursiveField(serializers.Serializer):
     def to_representation(self, value):
         serializer = self.parent.parent.__class__(value, context=self.context)
         return serializer.data
+
+
+def parse_paths(value):
+    """Tree of comma separated dotted paths, "id,files.name" being {'id': {}, 'files': {'name': {}}}."""
+
+    tree = {}
+    for path in filter(None, (path.strip() for path in value.split(','))):
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def get_fieldset(request):
+    """
+    Fields selected with the "fields" query parameter and expanded with "expand",
+    as trees of paths. None when not selected, and always for other than read requests.
+    """
+
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None, None
+    fields = request.query_params.get('fields')
+    expand = request.query_params.get('expand')
+    return parse_paths(fields) if fields else None, parse_paths(expand) if expand else None
+
+
+class Expandable:
+    """
+    Field added to a serializer with "expand", with the joins and prefetches
+    of the queryset it needs.
+    """
+
+    def __init__(self, serializer_class, select_related=(), prefetch_related=(), **kwargs):
+        self.serializer_class = serializer_class
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+        self.kwargs = dict(kwargs, read_only=True)
+
+    def get_field(self):
+        return self.serializer_class(**self.kwargs)
+
+
+def _subtree(tree, path):
+    # An empty node selects everything below it
+    for name in path:
+        if not tree:
+            return None
+        tree = tree.get(name)
+    return tree or None
+
+
+class SparseFieldsetsMixin:
+    """
+    Lets clients of read requests select the fields of the responses with the
+    comma separated "fields" query parameter, and add the fields declared in
+    Meta.expandable_fields with "expand". Fields of nested serializers are
+    given as dotted paths, like "files.name", selecting a nested serializer
+    without path selects all its fields.
+
+    Meta.field_sources maps the fields whose source isn't a model field, like
+    method fields, to the model fields they need, so that the views with
+    SparseQuerysetMixin only load what the selected fields need.
+    """
+
+    def get_field_path(self):
+        path = []
+        node = self
+        while node.parent is not None:
+            # Children of list serializers have no field name
+            if node.field_name:
+                path.insert(0, node.field_name)
+            node = node.parent
+        return path
+
+    def get_fieldset(self):
+        if 'fieldset' not in self.context:
+            self.context['fieldset'] = get_fieldset(self.context.get('request'))
+        fields, expand = self.context['fieldset'] or (None, None)
+        path = self.get_field_path()
+        return _subtree(fields, path), _subtree(expand, path)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected, expand = self.get_fieldset()
+        expandable_fields = getattr(self.Meta, 'expandable_fields', {})
+
+        if expand:
+            unknown = set(expand) - set(expandable_fields) - set(fields)
+            if unknown:
+                raise ValidationError({'expand': 'Unknown fields {}.'.format(', '.join(sorted(unknown)))})
+        # All of them in the schema of the responses, see shared.schema
+        expand_all = self.context.get('expand_all', False)
+        for name, expandable in expandable_fields.items():
+            if name not in fields and (expand_all or expand and name in expand or selected and name in selected):
+                fields[name] = expandable.get_field()
+
+        if selected:
+            unknown = set(selected) - set(fields) - set(self.get_optional_fields())
+            if unknown:
+                raise ValidationError({'fields': 'Unknown fields {}.'.format(', '.join(sorted(unknown)))})
+            fields = type(fields)((name, field) for name, field in fields.items() if name in selected)
+        return fields
+
+    def get_optional_fields(self):
+        """Names of the selectable fields which aren't serializer fields, like the ones added by to_representation."""
+
+        return getattr(self.Meta, 'optional_fields', ())
+
+    def is_selected(self, name):
+        selected, _ = self.get_fieldset()
+        return not selected or name in selected
+
+
+def get_field_sources(serializer):
+    """
+    Model fields needed by each field of a serializer, by field name, None when
+    they can't be told.
+    """
+
+    field_sources = getattr(getattr(serializer, 'Meta', None), 'field_sources', {})
+    sources = {}
+    for name, field in serializer.fields.items():
+        if name in field_sources:
+            sources[name] = field_sources[name]
+        elif field.source == '*':
+            sources[name] = None
+        else:
+            sources[name] = [field.source.split('.')[0]]
+    for name in getattr(serializer, 'get_optional_fields', lambda: ())():
+        if serializer.is_selected(name):
+            sources[name] = field_sources.get(name)
+    return sources
+
+
+def _related_lookups(lookups, names):
+    return [lookup for lookup in lookups
+            if (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split('__')[0] in names]
+
+
+def _select_related_paths(select_related, prefix=''):
+    paths = []
+    for name, nested in select_related.items():
+        paths.append(prefix + name)
+        paths += _select_related_paths(nested, prefix + name + '__')
+    return paths
+
+
+def _get_model_field(opts, name):
+    # Reverse relations by their accessor name, which is how serializers and prefetches refer to them
+    for field in opts.get_fields():
+        if (field.get_accessor_name() if field.auto_created and not field.concrete else field.name) == name:
+            return field
+    raise FieldDoesNotExist(name)
+
+
+def prune_queryset(queryset, serializer, required=()):
+    """
+    Restrict the columns, joins and prefetches of a queryset to the ones the
+    fields of a serializer need, recursively for the prefetches of nested
+    serializers, plus the required model fields. The queryset is left as is
+    when the needs of a field can't be told.
+    """
+
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return queryset
+
+    opts = queryset.model._meta
+    columns = {opts.pk.name, *required}
+    relations = {}
+    for name, sources in get_field_sources(serializer).items():
+        if sources is None:
+            return queryset
+        for source in sources:
+            try:
+                model_field = _get_model_field(opts, source)
+            except FieldDoesNotExist:
+                return queryset
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+            if model_field.is_relation:
+                relations[source] = serializer.fields.get(name)
+
+    prefetch_related = list(queryset._prefetch_related_lookups)
+    select_related = []
+    for name, expandable in getattr(serializer.Meta, 'expandable_fields', {}).items():
+        if name in serializer.fields:
+            prefetch_related += [lookup for lookup in expandable.prefetch_related if lookup not in prefetch_related]
+            select_related += expandable.select_related
+
+    lookups = []
+    for lookup in _related_lookups(prefetch_related, relations):
+        nested = relations.get(lookup)
+        model_field = _get_model_field(opts, lookup) if isinstance(lookup, str) and '__' not in lookup else None
+        if nested is not None and model_field is not None and model_field.one_to_many:
+            # With the foreign key the prefetched objects are matched on
+            lookup = Prefetch(lookup, queryset=prune_queryset(
+                model_field.related_model._default_manager.all(), nested, [model_field.field.name]))
+        elif nested is not None and model_field is not None and model_field.many_to_many:
+            lookup = Prefetch(lookup, queryset=prune_queryset(model_field.related_model._default_manager.all(), nested))
+        lookups.append(lookup)
+    queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+
+    if isinstance(queryset.query.select_related, dict):
+        paths = _select_related_paths(queryset.query.select_related)
+        queryset = queryset.select_related(None).select_related(*_related_lookups(paths, relations))
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+
+    return queryset.only(*columns)
@@ -1,7 +1,8 @@
 from rest_framework import viewsets
 
-from shared.mixins import DynamicPermissionsMixin, DynamicSerializersMixin
+from shared.mixins import DynamicPermissionsMixin, DynamicSerializersMixin, InstrumentedViewMixin, SparseQuerysetMixin
 
 
-class BaseModelViewSet(DynamicSerializersMixin, DynamicPermissionsMixin, viewsets.ModelViewSet):
+class BaseModelViewSet(InstrumentedViewMixin, SparseQuerysetMixin, DynamicSerializersMixin, DynamicPermissionsMixin,
+                       viewsets.ModelViewSet):
     pass
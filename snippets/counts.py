@@ -0,0 +1,52 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from snippets.models import Snippet, Comment
+
+
+def _active_count(field):
+    # Correlated subquery, 0 for rows without active comments
+    subquery = Comment.objects.filter(active=True, **{field: OuterRef('pk')}).order_by().values(field) \
+        .annotate(count=Count('id')).values('count')
+    return Coalesce(Subquery(subquery), Value(0))
+
+
+def comment_count():
+    """Expression of the number of active comments and replies of snippets."""
+
+    return _active_count('snippet_id')
+
+
+def reply_count():
+    """Expression of the number of active replies of comments."""
+
+    return _active_count('parent_id')
+
+
+def increment_counts(comment, delta):
+    """Add delta to the counters of the snippet and the parent of a comment, in single UPDATEs."""
+
+    Snippet.objects.filter(id=comment.snippet_id).update(comment_count=F('comment_count') + delta)
+    if comment.parent_id is not None:
+        Comment.objects.filter(id=comment.parent_id).update(reply_count=F('reply_count') + delta)
+
+
+def recount(snippet_ids, fix=True):
+    """
+    Compare the counters of the snippets and of their comments with the ones
+    recomputed from the active comments, and overwrite the drifted ones when
+    fixing. Returns the numbers of drifted snippets and comments.
+    """
+
+    snippets = Snippet.objects.filter(id__in=snippet_ids).annotate(expected=comment_count()) \
+        .exclude(comment_count=F('expected')).values_list('id', flat=True)
+    comments = Comment.objects.filter(snippet_id__in=snippet_ids).annotate(expected=reply_count()) \
+        .exclude(reply_count=F('expected')).values_list('id', flat=True)
+    snippets = list(snippets)
+    comments = list(comments)
+
+    if fix and snippets:
+        Snippet.objects.filter(id__in=snippets).update(comment_count=comment_count())
+    if fix and comments:
+        Comment.objects.filter(id__in=comments).update(reply_count=reply_count())
+    return len(snippets), len(comments)
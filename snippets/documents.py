@@ -0,0 +1,66 @@
+from django.db import transaction
+
+from .models import Snippet, SnippetDocument
+
+# Increment it whenever the serialized snippets change, the documents are read again once rebuilt
+DOCUMENT_VERSION = 1
+
+# Fields of the documents maintained by patch_counters rather than rebuilds
+COUNTER_FIELDS = ('upvotes', 'downvotes', 'comment_count')
+
+
+def build_snippet_documents(snippet_ids):
+    """
+    Serialize the snippets into their documents, replacing the existing ones.
+    Returns the number of built documents.
+
+    The snippets are locked while they are serialized, so that the counters
+    updated meanwhile are patched into the new documents once committed.
+    """
+
+    from .serializers import SnippetSerializer
+
+    with transaction.atomic():
+        snippets = list(Snippet.objects.select_for_update().filter(id__in=snippet_ids)
+                        .prefetch_related('topics', 'files'))
+        # Shared by all the users, without the user votes and the renderings
+        data = SnippetSerializer(snippets, many=True, context={'fieldset': None}).data
+        SnippetDocument.objects.filter(snippet_id__in=snippet_ids).delete()
+        SnippetDocument.objects.bulk_create([
+            SnippetDocument(snippet_id=snippet.id, document=document, format_version=DOCUMENT_VERSION)
+            for snippet, document in zip(snippets, data)])
+    return len(snippets)
+
+
+def invalidate_documents(snippet_ids):
+    """
+    Drop the documents of changed snippets in the current transaction, so that
+    they are read from the snippets until rebuilt after the commit.
+    """
+
+    from .jobs import enqueue_snippet_jobs
+
+    snippet_ids = list(snippet_ids)
+    if snippet_ids:
+        SnippetDocument.objects.filter(snippet_id__in=snippet_ids).delete()
+        enqueue_snippet_jobs('snippets.build_documents', snippet_ids)
+
+
+@transaction.atomic
+def patch_counters(snippet_id):
+    """Copy the current counters of a snippet into its document."""
+
+    document = SnippetDocument.objects.select_for_update().filter(snippet_id=snippet_id).first()
+    counters = Snippet.objects.filter(id=snippet_id).values(*COUNTER_FIELDS).first()
+    if document is None or counters is None or all(document.document.get(field) == value
+                                                   for field, value in counters.items()):
+        return
+    document.document.update(counters)
+    document.save(update_fields=['document', 'built_at'])
+
+
+def get_documents(snippet_ids):
+    """Documents of the snippets by id, in a single query, missing for the snippets without an up to date one."""
+
+    return dict(SnippetDocument.objects.filter(snippet_id__in=snippet_ids, format_version=DOCUMENT_VERSION)
+                .values_list('snippet_id', 'document'))
@@ -0,0 +1,34 @@
+from asgiref.sync import sync_to_async
+
+from events.backends import publish, run_query
+from .models import Snippet, Comment
+
+
+def snippet_channel(snippet_id):
+    return 'snippet:{}'.format(snippet_id)
+
+
+async def get_snippet_channel(scope):
+    """Channel of the events of the snippet of /api/snippets/{id}/events/, None when it doesn't exist."""
+
+    snippet_id = int(scope['url_route']['kwargs']['snippet_id'])
+    exists = await sync_to_async(run_query)(Snippet.objects.filter(id=snippet_id).exists)
+    return snippet_channel(snippet_id) if exists else None
+
+
+def publish_comment_created(comment_id):
+    from .serializers import CommentSerializer
+
+    comment = Comment.objects.select_related('user__stats').prefetch_related('replies').filter(id=comment_id).first()
+    if comment is not None:
+        publish(snippet_channel(comment.snippet_id), 'comment.created', CommentSerializer(comment).data)
+
+
+def publish_comment_deleted(snippet_id, comment_id, parent_id):
+    publish(snippet_channel(snippet_id), 'comment.deleted', {'id': comment_id, 'parent': parent_id})
+
+
+def publish_votes(snippet_id):
+    votes = Snippet.objects.filter(id=snippet_id).values('upvotes', 'downvotes').first()
+    if votes is not None:
+        publish(snippet_channel(snippet_id), 'snippet.votes', votes)
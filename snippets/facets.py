@@ -0,0 +1,85 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from shared.paginations import FacetedPageNumberPagination
+from .models import Snippet
+
+GENERATION_KEY = 'facets:generation'
+
+# Query parameters that don't change the filtered set of snippets
+IGNORED_PARAMS = ('page', 'facets')
+
+# Snippet fields the filters and the search read, the files are searched too
+FILTERED_FIELDS = {'name', 'description'}
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.add(GENERATION_KEY, generation, None)
+        generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def bump_generation():
+    """
+    Invalidate every cached facet count once the current transaction is committed.
+
+    Only for the writes changing the topics of the snippets, the topic names or
+    which snippets the filters match, see snippets.signals.
+    """
+
+    transaction.on_commit(lambda: cache.set(GENERATION_KEY, uuid.uuid4().hex, None))
+
+
+def topic_counts(queryset):
+    """
+    Return the number of snippets of the queryset having each topic, in a single grouped query.
+    """
+
+    ids = queryset.prefetch_related(None).order_by().values('pk')
+    rows = Snippet.topics.through.objects.filter(snippet_id__in=ids) \
+        .values('topic_id', 'topic__name').annotate(count=Count('pk')).order_by('-count', 'topic_id')
+    return [{'id': row['topic_id'], 'name': row['topic__name'], 'count': row['count']} for row in rows]
+
+
+def cached_topic_counts(request, queryset):
+    """
+    Topic counts of the filtered queryset, cached per filter and generation.
+
+    The filter is identified by the path and the query parameters, ignoring the
+    page, and the generation changes whenever the counted snippets or their topics do.
+    """
+
+    params = sorted((key, value) for key, value in request.query_params.lists() if key not in IGNORED_PARAMS)
+    digest = hashlib.sha1(repr((request.path, params)).encode()).hexdigest()
+    key = 'facets:topics:{}:{}'.format(get_generation(), digest)
+
+    counts = cache.get(key)
+    if counts is None:
+        counts = topic_counts(queryset)
+        cache.set(key, counts, getattr(settings, 'FACETS_CACHE_TTL', 300))
+    return counts
+
+
+class TopicFacetsMixin:
+    """
+    Adds the number of snippets per topic for the current filters to the list
+    pages when requested with "facets=topics".
+
+    Computed with FacetedPageNumberPagination, which adds them to the page.
+    """
+
+    pagination_class = FacetedPageNumberPagination
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.request.query_params.get('facets') == 'topics':
+            self.paginator.facets = {'topics': cached_topic_counts(self.request, queryset)}
+        return page
@@ -0,0 +1,33 @@
+from jobs.registry import enqueue_many, job
+from .documents import build_snippet_documents
+from .languages import update_snippet_languages
+from .rendering import render_snippets
+from .similarity import index_snippets
+
+
+@job('snippets.index_similarity', batch=True)
+def index_similarity(payloads):
+    index_snippets(sorted({payload['snippet_id'] for payload in payloads}))
+
+
+@job('snippets.render', batch=True)
+def render(payloads):
+    render_snippets(sorted({payload['snippet_id'] for payload in payloads}))
+
+
+@job('snippets.update_languages', batch=True)
+def update_languages(payloads):
+    update_snippet_languages(sorted({payload['snippet_id'] for payload in payloads}))
+
+
+@job('snippets.build_documents', batch=True)
+def build_documents(payloads):
+    build_snippet_documents(sorted({payload['snippet_id'] for payload in payloads}))
+
+
+def enqueue_snippet_jobs(name, snippet_ids):
+    """Enqueue a job per snippet, deduplicated with the pending jobs of the same snippets."""
+
+    snippet_ids = sorted(set(snippet_ids))
+    enqueue_many(name, [{'snippet_id': snippet_id} for snippet_id in snippet_ids],
+                 ['{}:{}'.format(name, snippet_id) for snippet_id in snippet_ids])
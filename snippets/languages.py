@@ -0,0 +1,83 @@
+import re
+
+from django.db import transaction
+from pygments.lexers import get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+# Extensions whose Pygments lexer isn't the usual language, or is shared by several
+EXTENSIONS = {
+    'sql': 'sql',
+    'h': 'c',
+    'hpp': 'cpp',
+    'jsx': 'javascript',
+    'mjs': 'javascript',
+    'tsx': 'typescript',
+    'yml': 'yaml',
+}
+
+SHEBANGS = {
+    'python': 'python',
+    'node': 'javascript',
+    'bash': 'bash',
+    'sh': 'bash',
+    'zsh': 'bash',
+    'ruby': 'ruby',
+    'php': 'php',
+    'perl': 'perl',
+}
+
+# Checked in order on the beginning of files without a known extension
+CONTENT_PATTERNS = (
+    (re.compile(r'<\?php'), 'php'),
+    (re.compile(r'^\s*(<!DOCTYPE html|<html)', re.IGNORECASE), 'html'),
+    (re.compile(r'^package \w+$.*\bfunc ', re.MULTILINE | re.DOTALL), 'go'),
+    (re.compile(r'^\s*#include\s*[<"]', re.MULTILINE), 'cpp'),
+    (re.compile(r'^\s*(public |private )?(class|interface) \w+.*\{', re.MULTILINE), 'java'),
+    (re.compile(r'^\s*(def \w+\(.*\):|from [\w.]+ import |import \w+$)', re.MULTILINE), 'python'),
+    (re.compile(r'^\s*(const|let|var) \w+ = |\bfunction\s*\w*\(|=> \{|console\.log\(', re.MULTILINE), 'javascript'),
+    (re.compile(r'^\s*(SELECT|INSERT INTO|UPDATE|CREATE TABLE|DELETE FROM)\b', re.MULTILINE | re.IGNORECASE), 'sql'),
+    (re.compile(r'^\s*[.#]?[\w-]+\s*\{[^}]*:[^}]*;', re.MULTILINE), 'css'),
+)
+
+SAMPLE_LENGTH = 4000
+_shebang = re.compile(r'^#!\s*(?:\S*/)?(?:env\s+)?([a-z]+)')
+
+
+def detect_language(name, content):
+    """
+    Language of a file, from its extension or file name and, failing that, from
+    its shebang and content. An empty string when no language is recognised.
+    """
+
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+
+    try:
+        language = get_lexer_for_filename(name).aliases[0]
+    except (ClassNotFound, IndexError):
+        language = None
+    if language and language != 'text':
+        return language
+
+    sample = content[:SAMPLE_LENGTH]
+    shebang = _shebang.match(sample)
+    if shebang and shebang.group(1) in SHEBANGS:
+        return SHEBANGS[shebang.group(1)]
+    for pattern, language in CONTENT_PATTERNS:
+        if pattern.search(sample):
+            return language
+    return ''
+
+
+def update_snippet_languages(snippet_ids):
+    """Synchronise the denormalised languages of the snippets with the ones of their files."""
+
+    from snippets.models import File, SnippetLanguage
+
+    with transaction.atomic():
+        languages = File.objects.filter(snippet_id__in=snippet_ids).exclude(language='') \
+            .values_list('snippet_id', 'language').distinct()
+        SnippetLanguage.objects.filter(snippet_id__in=snippet_ids).delete()
+        SnippetLanguage.objects.bulk_create(
+            [SnippetLanguage(snippet_id=snippet_id, language=language) for snippet_id, language in languages])
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from snippets.languages import update_snippet_languages
+from snippets.models import Snippet, File
+
+
+class Command(BaseCommand):
+    help = 'Detect the language of the files and rebuild the denormalised languages of the snippets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of snippets per batch.')
+        parser.add_argument('--all', action='store_true',
+                            help='Detect the language of every file, not only the ones without one.')
+
+    @transaction.atomic
+    def backfill(self, ids, detect_all):
+        files = File.objects.filter(snippet_id__in=ids).only('id', 'name', 'content', 'language')
+        if not detect_all:
+            files = files.filter(language='')
+        files = list(files)
+
+        for file in files:
+            file.detect_language()
+        File.objects.bulk_update(files, ['language'], batch_size=500)
+        update_snippet_languages(ids)
+        return len(files)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last_id = 0
+        snippets = 0
+        files = 0
+        while True:
+            ids = list(Snippet.objects.filter(id__gt=last_id).order_by('id')
+                       .values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            files += self.backfill(ids, options['all'])
+            snippets += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS('Detected {} file languages of {} snippets in {:.2f}s.'.format(
+            files, snippets, time.perf_counter() - started)))
@@ -0,0 +1,65 @@
+import json
+import time
+
+import msgpack
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from shared.renderers import MessagePackRenderer
+from snippets.models import Snippet
+from snippets.views import SnippetViewSet
+
+
+def _timed(function, data, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function(data)
+    return result, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Compare the size and the encoding and decoding times of the JSON and MessagePack snippet pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=100,
+                            help='Number of snippet pages, of the snippets with the most comments.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of times each page is encoded and decoded.')
+        parser.add_argument('--render', action='store_true', help='Pages with the rendered HTML of the files.')
+
+    def get_pages(self, count, render):
+        view = SnippetViewSet.as_view({'get': 'page'})
+        factory = APIRequestFactory()
+        ids = Snippet.objects.order_by('-comment_count', 'id').values_list('id', flat=True)[:count]
+        for snippet_id in ids:
+            response = view(factory.get('/', {'render': 'html'} if render else {}), pk=str(snippet_id))
+            yield response.data
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        formats = {
+            'JSON': (JSONRenderer(), json.loads),
+            'MessagePack': (MessagePackRenderer(), lambda content: msgpack.unpackb(content, raw=False)),
+        }
+        totals = {name: [0, 0.0, 0.0] for name in formats}
+
+        pages = 0
+        for data in self.get_pages(options['pages'], options['render']):
+            for name, (renderer, decode) in formats.items():
+                content, encode_time = _timed(renderer.render, data, repeat)
+                _, decode_time = _timed(decode, content, repeat)
+                totals[name][0] += len(content)
+                totals[name][1] += encode_time
+                totals[name][2] += decode_time
+            pages += 1
+        if not pages:
+            self.stdout.write('No snippets to benchmark.')
+            return
+
+        for name, (size, encode_time, decode_time) in totals.items():
+            self.stdout.write('{:<12} {:>9.0f} bytes  encode {:>8.1f}µs  decode {:>8.1f}µs per page'.format(
+                name, size / pages, encode_time / pages / repeat * 1e6, decode_time / pages / repeat * 1e6))
+        json_size = totals['JSON'][0]
+        self.stdout.write(self.style.SUCCESS(
+            'Benchmarked {} pages, MessagePack is {:.0%} of the JSON size.'.format(
+                pages, totals['MessagePack'][0] / json_size)))
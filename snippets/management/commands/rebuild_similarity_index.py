@@ -0,0 +1,60 @@
+import os
+import time
+from itertools import groupby
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+
+from snippets.models import Snippet, File
+from snippets.similarity import compute_signatures, save_signatures
+
+
+class Command(BaseCommand):
+    help = 'Recompute the MinHash signatures and LSH buckets of every snippet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Number of snippets per batch.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of processes computing the signatures.')
+
+    def batches(self, batch_size):
+        """Yield lists of (snippet id, file contents) pairs, in batches of primary keys."""
+
+        last_id = 0
+        while True:
+            ids = list(Snippet.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return
+
+            files = File.objects.filter(snippet_id__in=ids).order_by('snippet_id', 'id') \
+                .values_list('snippet_id', 'content')
+            contents = {snippet_id: [content for _, content in group]
+                        for snippet_id, group in groupby(files.iterator(), key=lambda file: file[0])}
+            yield [(snippet_id, contents.get(snippet_id, [])) for snippet_id in ids]
+            last_id = ids[-1]
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        started = time.perf_counter()
+        indexed = 0
+
+        # Only the signatures are computed in the workers, the database is used by this process
+        pool = get_context('fork').Pool(workers) if workers > 1 else None
+        try:
+            for batch in self.batches(options['batch_size']):
+                if pool is None:
+                    results = compute_signatures(batch)
+                else:
+                    chunk_size = -(-len(batch) // workers)
+                    chunks = [batch[start:start + chunk_size] for start in range(0, len(batch), chunk_size)]
+                    results = [result for chunk in pool.map(compute_signatures, chunks) for result in chunk]
+                save_signatures(results)
+                indexed += len(results)
+                self.stdout.write('Indexed {} snippets...'.format(indexed))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Indexed {} snippets in {:.2f}s.'.format(indexed, time.perf_counter() - started)))
@@ -0,0 +1,55 @@
+import os
+import time
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from snippets.documents import build_snippet_documents
+from snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the serialized documents of every snippet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of snippets per batch.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of processes building the documents, one with SQLite.')
+
+    def batches(self, batch_size):
+        """Yield lists of snippet ids, in batches of primary keys."""
+
+        last_id = 0
+        while True:
+            ids = list(Snippet.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def handle(self, *args, **options):
+        # SQLite doesn't take concurrent writers
+        workers = 1 if connection.vendor == 'sqlite' else max(1, options['workers'])
+        started = time.perf_counter()
+        built = 0
+
+        if workers == 1:
+            results = map(build_snippet_documents, self.batches(options['batch_size']))
+            pool = None
+        else:
+            # Every worker builds whole batches with its own connection, which can't be shared with the forked workers
+            connections.close_all()
+            pool = get_context('fork').Pool(workers)
+            results = pool.imap_unordered(build_snippet_documents, self.batches(options['batch_size']))
+        try:
+            for count in results:
+                built += count
+                self.stdout.write('Built {} documents...'.format(built))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Built {} documents in {:.2f}s.'.format(built, time.perf_counter() - started)))
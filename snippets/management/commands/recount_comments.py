@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from snippets.counts import recount
+from snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = 'Recount the active comments of the snippets and the active replies of the comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of snippets per batch.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted counts.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last_id = 0
+        total = 0
+        snippets = 0
+        comments = 0
+        while True:
+            ids = list(Snippet.objects.filter(id__gt=last_id).order_by('id')
+                       .values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                drifted_snippets, drifted_comments = recount(ids, fix=not options['dry_run'])
+            snippets += drifted_snippets
+            comments += drifted_comments
+            total += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            '{} {} drifted snippet and {} drifted comment counts of {} snippets in {:.2f}s.'.format(
+                'Found' if options['dry_run'] else 'Fixed', snippets, comments, total, time.perf_counter() - started)))
@@ -0,0 +1,234 @@
+import random
+from multiprocessing import get_context
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from shared.models import Vote
+from snippets.counts import recount
+from snippets.models import Snippet, File, Comment, SnippetLanguage
+from topics.models import Topic
+from users.stats import reconcile
+
+User = get_user_model()
+
+MAX_CONTENT_LENGTH = 25000
+EXTENSIONS = ('py', 'js', 'ts', 'java', 'go', 'rb', 'c', 'cpp', 'cs', 'sh', 'sql', 'css', 'html')
+WORDS = ('value', 'result', 'items', 'user', 'snippet', 'index', 'config', 'data', 'count', 'name',
+         'request', 'response', 'token', 'cache', 'query', 'buffer', 'node', 'path', 'file', 'error')
+LINE_TEMPLATES = (
+    '{w1} = {w2}({w3})',
+    'if {w1} is not None:',
+    '    return {w1}.{w2}',
+    'for {w1} in {w2}:',
+    '    {w1}.append({w2})',
+    'def {w1}_{w2}({w3}):',
+    '# TODO: handle {w1} {w2}',
+    'const {w1} = await {w2}.{w3}();',
+    'print({w1}, {w2})',
+    '',
+)
+
+
+def _sized(rng, median, sigma, maximum):
+    """Log-normally distributed size, clamped to [1, maximum]."""
+
+    return max(1, min(maximum, int(rng.lognormvariate(0, sigma) * median)))
+
+
+def _power_law(rng, alpha, maximum):
+    """Pareto distributed count starting at zero, clamped to maximum."""
+
+    return min(maximum, int(rng.paretovariate(alpha)) - 1)
+
+
+def _text(rng, length):
+    lines = []
+    size = 0
+    while size < length:
+        words = rng.sample(WORDS, 3)
+        line = rng.choice(LINE_TEMPLATES).format(w1=words[0], w2=words[1], w3=words[2])
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines)[:length]
+
+
+def _seed_chunk(job):
+    """
+    Generate one chunk of snippets with their files, topics, comments and votes.
+
+    Each chunk owns its random generator (derived from the seed and the chunk index)
+    so the generated data doesn't depend on the number of workers.
+    """
+
+    index, count, user_ids, topic_ids, options = job
+    rng = random.Random(options['seed'] * 1000003 + index)
+    snippet_type = ContentType.objects.get_for_model(Snippet)
+    topic_weights = [1 / rank for rank in range(1, len(topic_ids) + 1)]
+    max_votes = min(options['max_votes'], len(user_ids))
+
+    snippets = []
+    snippet_votes = []
+    for position in range(count):
+        voters = rng.sample(user_ids, _power_law(rng, options['vote_skew'], max_votes))
+        upvote_ratio = rng.betavariate(5, 2)
+        votes = [(voter, 1 if rng.random() < upvote_ratio else -1) for voter in voters]
+        snippet_votes.append(votes)
+        snippets.append(Snippet(
+            user_id=rng.choice(user_ids),
+            name='Snippet {}-{}'.format(index, position),
+            description=_text(rng, _sized(rng, 200, 1.0, MAX_CONTENT_LENGTH)),
+            upvotes=sum(1 for _, score in votes if score == 1),
+            downvotes=-sum(1 for _, score in votes if score == -1),
+        ))
+
+    with transaction.atomic():
+        Snippet.objects.bulk_create(snippets, batch_size=options['batch_size'])
+
+        files = []
+        snippet_topics = []
+        comments = []
+        votes = []
+        for snippet, snippet_vote in zip(snippets, snippet_votes):
+            for position in range(1 + _power_law(rng, 2.5, options['max_files'] - 1)):
+                file = File(
+                    snippet_id=snippet.id,
+                    name='{}_{}.{}'.format(rng.choice(WORDS), position, rng.choice(EXTENSIONS)),
+                    content=_text(rng, _sized(rng, 800, 1.2, MAX_CONTENT_LENGTH)),
+                )
+                file.detect_language()
+                files.append(file)
+            if topic_ids:
+                chosen = set(rng.choices(topic_ids, weights=topic_weights, k=rng.randint(0, 3)))
+                snippet_topics += [Snippet.topics.through(snippet_id=snippet.id, topic_id=topic_id)
+                                   for topic_id in chosen]
+            for _ in range(_power_law(rng, options['comment_skew'], options['max_comments'])):
+                comments.append(Comment(
+                    snippet_id=snippet.id,
+                    user_id=rng.choice(user_ids),
+                    content=_text(rng, _sized(rng, 120, 0.8, MAX_CONTENT_LENGTH)),
+                ))
+            votes += [Vote(user_id=voter, score=score, content_type=snippet_type, object_id=snippet.id)
+                      for voter, score in snippet_vote]
+
+        File.objects.bulk_create(files, batch_size=options['batch_size'])
+        SnippetLanguage.objects.bulk_create(
+            [SnippetLanguage(snippet_id=snippet_id, language=language)
+             for snippet_id, language in {(file.snippet_id, file.language) for file in files if file.language}],
+            batch_size=options['batch_size'])
+        Snippet.topics.through.objects.bulk_create(snippet_topics, batch_size=options['batch_size'])
+        Comment.objects.bulk_create(comments, batch_size=options['batch_size'])
+        Vote.objects.bulk_create(votes, batch_size=options['batch_size'])
+
+        # Replies are attached to top level comments only, nested replies are not allowed
+        replies = []
+        for comment in comments:
+            if rng.random() >= options['reply_ratio']:
+                continue
+            for _ in range(1 + _power_law(rng, options['comment_skew'], options['max_comments'] - 1)):
+                replies.append(Comment(
+                    snippet_id=comment.snippet_id,
+                    parent_id=comment.id,
+                    user_id=rng.choice(user_ids),
+                    content=_text(rng, _sized(rng, 80, 0.8, MAX_CONTENT_LENGTH)),
+                ))
+        Comment.objects.bulk_create(replies, batch_size=options['batch_size'])
+        # The bulk creations bypass the signals maintaining the comment counts
+        recount([snippet.id for snippet in snippets])
+
+    return len(snippets), len(files), len(comments) + len(replies), len(votes)
+
+
+class Command(BaseCommand):
+    help = 'Generate reproducible synthetic users, topics, snippets, files, comments and votes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed generates the same data.')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--topics', type=int, default=10,
+                            help='Minimum number of topics, missing ones are created.')
+        parser.add_argument('--snippets', type=int, default=1000)
+        parser.add_argument('--max-files', type=int, default=10, help='Maximum number of files per snippet.')
+        parser.add_argument('--max-comments', type=int, default=200,
+                            help='Maximum number of top level comments per snippet and replies per comment.')
+        parser.add_argument('--max-votes', type=int, default=10000, help='Maximum number of votes per snippet.')
+        parser.add_argument('--vote-skew', type=float, default=1.2,
+                            help='Pareto shape of the votes per snippet distribution, lower is more skewed.')
+        parser.add_argument('--comment-skew', type=float, default=1.5,
+                            help='Pareto shape of the comments per snippet distribution, lower is more skewed.')
+        parser.add_argument('--reply-ratio', type=float, default=0.3,
+                            help='Probability for a top level comment to have replies.')
+        parser.add_argument('--password', default=None,
+                            help='Password of the generated users, unusable if not provided.')
+        parser.add_argument('--prefix', default='seed', help='Prefix of the generated usernames.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of snippets per chunk.')
+        parser.add_argument('--workers', type=int, default=1, help='Number of processes generating chunks.')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('The database backend must return primary keys from bulk inserts.')
+
+        user_ids = self.create_users(options)
+        topic_ids = self.create_topics(options)
+        if not user_ids:
+            raise CommandError('At least one user is required.')
+
+        # Only picklable generation settings are sent to the workers
+        chunk_options = {key: options[key] for key in (
+            'seed', 'max_files', 'max_comments', 'max_votes', 'vote_skew', 'comment_skew', 'reply_ratio', 'batch_size')}
+        jobs = []
+        remaining = options['snippets']
+        while remaining > 0:
+            count = min(options['batch_size'], remaining)
+            jobs.append((len(jobs), count, user_ids, topic_ids, chunk_options))
+            remaining -= count
+
+        workers = options['workers']
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stderr.write('SQLite does not support concurrent writers, falling back to a single worker.')
+            workers = 1
+
+        totals = [0, 0, 0, 0]
+        if workers > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            with get_context('fork').Pool(workers) as pool:
+                results = pool.imap_unordered(_seed_chunk, jobs)
+                for done, result in enumerate(results, 1):
+                    totals = [total + value for total, value in zip(totals, result)]
+                    self.stdout.write('Chunk {}/{} done'.format(done, len(jobs)))
+        else:
+            for done, job in enumerate(jobs, 1):
+                result = _seed_chunk(job)
+                totals = [total + value for total, value in zip(totals, result)]
+                self.stdout.write('Chunk {}/{} done'.format(done, len(jobs)))
+
+        # The bulk creations bypass the signals maintaining the users statistics
+        for start in range(0, len(user_ids), options['batch_size']):
+            with transaction.atomic():
+                reconcile(user_ids[start:start + options['batch_size']])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Created {} users, {} snippets, {} files, {} comments and {} votes.'.format(len(user_ids), *totals)))
+
+    def create_users(self, options):
+        usernames = ['{}-{}-{}'.format(options['prefix'], options['seed'], i) for i in range(options['users'])]
+        if User.objects.filter(username__in=usernames[:1]).exists():
+            raise CommandError(
+                'Users for seed {} already exist, use another --seed or --prefix.'.format(options['seed']))
+
+        # Hashing is deliberately slow, all generated users share a single hash
+        password = make_password(options['password'])
+        users = [User(username=username, email='{}@example.com'.format(username), password=password)
+                 for username in usernames]
+        User.objects.bulk_create(users, batch_size=options['batch_size'])
+        return [user.id for user in users]
+
+    def create_topics(self, options):
+        missing = options['topics'] - Topic.objects.count()
+        if missing > 0:
+            Topic.objects.bulk_create([Topic(name='Topic {}'.format(i)) for i in range(missing)])
+        return list(Topic.objects.order_by('id').values_list('id', flat=True))
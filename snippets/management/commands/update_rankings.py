@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from snippets.ranking import update_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending and controversial ranking scores of every snippet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Number of snippets per batch.')
+        parser.add_argument('--every', type=int, default=None,
+                            help='Keep running and recompute the scores every given number of seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            updated = update_rankings(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                'Updated {} snippets in {:.2f}s.'.format(updated, time.perf_counter() - started)))
+
+            if options['every'] is None:
+                return
+            time.sleep(max(0, options['every'] - (time.perf_counter() - started)))
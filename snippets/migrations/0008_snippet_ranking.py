@@ -0,0 +1,88 @@
+# Generated by Django 4.0.3 on 2026-10-19 10:02
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Min
+import django.utils.timezone
+
+# Age of the oldest existing snippet when there are no comments at all
+LEGACY_AGE = timedelta(days=30)
+
+
+def backfill_created_dates(apps, schema_editor):
+    """
+    Date the existing snippets, which had no creation date, rather than ranking them all as new.
+
+    A snippet is older than its first comment and than the snippets with higher
+    ids. The snippets with higher ids than every commented one are dated just
+    after the last first comment, or after LEGACY_AGE ago without comments, one
+    second apart in the order of their ids and at most now. Their hot scores
+    start at 0 until the rankings are updated.
+    """
+
+    Snippet = apps.get_model('snippets', 'Snippet')
+    Comment = apps.get_model('snippets', 'Comment')
+
+    first_comments = dict(Comment.objects.order_by().values('snippet_id')
+                          .annotate(first=Min('created_date')).values_list('snippet_id', 'first'))
+    dates = {}
+    undated = []
+    estimate = None
+    for snippet_id in Snippet.objects.order_by('-id').values_list('id', flat=True).iterator():
+        first = first_comments.get(snippet_id)
+        if first is not None and (estimate is None or first < estimate):
+            estimate = first
+        if estimate is None:
+            undated.append(snippet_id)
+        else:
+            dates[snippet_id] = estimate
+
+    now = django.utils.timezone.now()
+    latest = max(dates.values(), default=now - LEGACY_AGE)
+    # The undated snippets are in the descending order of their ids
+    for rank, snippet_id in enumerate(undated, 1):
+        dates[snippet_id] = min(latest + timedelta(seconds=len(undated) - rank + 1), now)
+
+    Snippet.objects.bulk_update(
+        [Snippet(id=snippet_id, created_date=created_date, hot_score=0) for snippet_id, created_date in dates.items()],
+        ['created_date', 'hot_score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0007_snippet_downvotes_snippet_upvotes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='created_date',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='hot_score',
+            field=models.FloatField(default=0.2871745887492588),
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='controversy_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_created_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['-hot_score', '-id'], name='snippet_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['-controversy_score', '-id'], name='snippet_controversy_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['created_date'], name='snippet_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.0.3 on 2026-10-19 09:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0008_snippet_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetSignature',
+            fields=[
+                ('snippet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='snippets.snippet')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('minhash', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SnippetBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='snippets.snippet')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='snippetbucket',
+            index=models.Index(fields=['key', 'snippet'], name='snippet_bucket_key_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.0.3 on 2026-10-19 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0009_similarity_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rendering',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('html', models.TextField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.3 on 2026-10-19 09:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0010_rendering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='language',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.CreateModel(
+            name='SnippetLanguage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=30)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='languages', to='snippets.snippet')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='snippetlanguage',
+            index=models.Index(fields=['language', 'snippet'], name='snippet_language_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='snippetlanguage',
+            constraint=models.UniqueConstraint(fields=('snippet', 'language'), name='unique_snippet_language'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.3 on 2026-10-19 10:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def backfill_comment_counts(apps, schema_editor):
+    """Count the active comments of the existing snippets and the active replies of the existing comments."""
+
+    Snippet = apps.get_model('snippets', 'Snippet')
+    Comment = apps.get_model('snippets', 'Comment')
+
+    for model, field, counted in ((Snippet, 'comment_count', 'snippet_id'), (Comment, 'reply_count', 'parent_id')):
+        # Correlated subquery, 0 for rows without active comments
+        subquery = Comment.objects.filter(active=True, **{counted: OuterRef('pk')}).order_by().values(counted) \
+            .annotate(count=Count('id')).values('count')
+        last_id = 0
+        while True:
+            ids = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+            if not ids:
+                break
+            model.objects.filter(id__in=ids).update(**{field: Coalesce(Subquery(subquery), Value(0))})
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0011_languages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_comment_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.3 on 2026-10-19 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0012_comment_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
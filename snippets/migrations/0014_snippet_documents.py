@@ -0,0 +1,23 @@
+# Generated by Django 4.0.3 on 2026-10-19 10:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0013_snippet_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetDocument',
+            fields=[
+                ('snippet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='snippets.snippet')),
+                ('document', models.JSONField()),
+                ('format_version', models.PositiveIntegerField(default=0)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models.deletion import CASCADE
 from django.contrib.auth import get_user_model
 
 from shared.models import VoteMixin
+from snippets.languages import detect_language
+from snippets.ranking import INITIAL_HOT_SCORE
 from topics.models import Topic
 
 User = get_user_model()
@@ -19,9 +21,22 @@ class Snippet(VoteMixin, models.Model):
     )
     topics = models.ManyToManyField(
         Topic, related_name='snippets')
+    created_date = models.DateTimeField(auto_now_add=True)
+    # Materialised ranking scores, recomputed periodically by update_rankings
+    hot_score = models.FloatField(default=INITIAL_HOT_SCORE)
+    controversy_score = models.FloatField(default=0)
+    # Active comments and replies, maintained by snippets.signals and recount_comments
+    comment_count = models.IntegerField(default=0)
+    # Incremented by every edit, for the optimistic concurrency of the updates
+    version = models.PositiveIntegerField(default=1)
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['-hot_score', '-id'], name='snippet_hot_idx'),
+            models.Index(fields=['-controversy_score', '-id'], name='snippet_controversy_idx'),
+            models.Index(fields=['created_date'], name='snippet_created_idx'),
+        ]
 
 
 class File(models.Model):
@@ -33,10 +48,38 @@ class File(models.Model):
         related_name='files',
         related_query_name='file'
     )
+    # Detected on save, set it explicitly before bulk creations
+    language = models.CharField(max_length=30, blank=True, default='')
 
     class Meta:
         ordering = ['-id']
 
+    def detect_language(self):
+        self.language = detect_language(self.name, self.content)
+
+    def save(self, *args, **kwargs):
+        self.detect_language()
+        super().save(*args, **kwargs)
+
+
+class SnippetLanguage(models.Model):
+    """Language of the files of a snippet, denormalised to filter snippets by language."""
+
+    snippet = models.ForeignKey(
+        Snippet,
+        on_delete=CASCADE,
+        related_name='languages'
+    )
+    language = models.CharField(max_length=30)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['snippet', 'language'], name='unique_snippet_language'),
+        ]
+        indexes = [
+            models.Index(fields=['language', 'snippet'], name='snippet_language_idx'),
+        ]
+
 
 class Comment(models.Model):
     user = models.ForeignKey(
@@ -61,6 +104,64 @@ class Comment(models.Model):
     active = models.BooleanField(default=True)
     created_date = models.DateTimeField(auto_now_add=True)
     content = models.TextField(max_length=25000, blank=False)
+    # Active replies, maintained by snippets.signals and recount_comments
+    reply_count = models.IntegerField(default=0)
 
     class Meta:
         ordering = ['created_date']
+
+    def save(self, *args, **kwargs):
+        # The counters are updated by post_save receivers, in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class SnippetSignature(models.Model):
+    """MinHash signature of the files of a snippet, see snippets.similarity."""
+
+    snippet = models.OneToOneField(
+        Snippet,
+        on_delete=CASCADE,
+        primary_key=True,
+        related_name='signature'
+    )
+    content_hash = models.CharField(max_length=64)
+    minhash = models.BinaryField()
+
+
+class SnippetBucket(models.Model):
+    """LSH bucket of a band of a snippet's signature, snippets sharing a bucket are similar candidates."""
+
+    snippet = models.ForeignKey(
+        Snippet,
+        on_delete=CASCADE,
+        related_name='buckets'
+    )
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'snippet'], name='snippet_bucket_key_idx'),
+        ]
+
+
+class Rendering(models.Model):
+    """HTML rendering of a file or description, keyed by the hash of its content, see snippets.rendering."""
+
+    key = models.CharField(max_length=64, primary_key=True)
+    html = models.TextField()
+
+
+class SnippetDocument(models.Model):
+    """Serialized snippet of the detail and multi-get reads, see snippets.documents."""
+
+    snippet = models.OneToOneField(
+        Snippet,
+        on_delete=CASCADE,
+        primary_key=True,
+        related_name='document'
+    )
+    document = models.JSONField()
+    # DOCUMENT_VERSION of the build, the documents of other versions are ignored
+    format_version = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,44 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'snippets:page:version:{}'
+
+
+def get_version(snippet_id):
+    """Token changing whenever the content of the snippet's page does, see snippets.signals."""
+
+    key = VERSION_KEY.format(snippet_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_versions(snippet_ids):
+    """Invalidate the cached pages of the snippets once the current transaction is committed."""
+
+    keys = [VERSION_KEY.format(snippet_id) for snippet_id in snippet_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def page_cache_key(snippet_id, version, rendered):
+    return 'snippets:page:{}:{}:{}'.format(snippet_id, version, int(rendered))
+
+
+def get_cached_page(snippet_id, version, rendered):
+    return cache.get(page_cache_key(snippet_id, version, rendered))
+
+
+def set_cached_page(snippet_id, version, rendered, page):
+    """
+    Cache a page under the version read before loading it, so that a page loaded
+    while a write committed is left under the replaced version rather than the new one.
+    """
+
+    cache.set(page_cache_key(snippet_id, version, rendered), page, getattr(settings, 'SNIPPET_PAGE_CACHE_TTL', 300))
@@ -0,0 +1,88 @@
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Hacker News style gravity, the higher the faster scores decay with age
+GRAVITY = 1.8
+
+# Hot score of a snippet without votes at creation time
+INITIAL_HOT_SCORE = 1 / 2 ** GRAVITY
+
+
+def hot_scores(upvotes, downvotes, age_hours):
+    """
+    Time decayed scores: (score + 1) / (age + 2) ^ GRAVITY.
+
+    Downvotes are stored as negative numbers, as in VoteMixin.
+    """
+
+    return (upvotes + downvotes + 1) / np.power(age_hours + 2, GRAVITY)
+
+
+def controversy_scores(upvotes, downvotes):
+    """
+    Number of votes raised to the power of the up/down balance, 0 without both kinds of votes.
+    """
+
+    downvotes = -downvotes
+    magnitude = upvotes + downvotes
+    balance = np.minimum(upvotes, downvotes) / np.maximum(np.maximum(upvotes, downvotes), 1)
+    return np.where((upvotes > 0) & (downvotes > 0), np.power(magnitude, balance), 0.0)
+
+
+def _supports_update_from():
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 33)
+    return connection.vendor == 'postgresql'
+
+
+def _write_scores(table, rows):
+    if _supports_update_from():
+        # A single UPDATE ... FROM a VALUES list per batch, much faster than bulk_update's CASE
+        max_rows = (connection.features.max_query_params or 30000) // 3
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(rows), max_rows):
+                batch = rows[start:start + max_rows]
+                cursor.execute(
+                    'WITH v (id, hot, controversy) AS (VALUES {}) '
+                    'UPDATE {table} SET hot_score = v.hot, controversy_score = v.controversy '
+                    'FROM v WHERE {table}.id = v.id'.format(
+                        ', '.join(['(%s, %s, %s)'] * len(batch)), table=connection.ops.quote_name(table)),
+                    [value for row in batch for value in row])
+    else:
+        from snippets.models import Snippet
+
+        Snippet.objects.bulk_update(
+            [Snippet(id=snippet_id, hot_score=hot, controversy_score=controversy)
+             for snippet_id, hot, controversy in rows],
+            ['hot_score', 'controversy_score'], batch_size=1000)
+
+
+def update_rankings(batch_size=10000):
+    """
+    Recompute the ranking scores of every snippet, in batches of primary keys.
+
+    Return the number of updated snippets.
+    """
+
+    from snippets.models import Snippet
+
+    now = timezone.now().timestamp()
+    queryset = Snippet.objects.order_by('id').values_list('id', 'upvotes', 'downvotes', 'created_date')
+    last_id = 0
+    updated = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            return updated
+
+        ids, upvotes, downvotes, created = zip(*rows)
+        upvotes = np.array(upvotes, dtype=np.float64)
+        downvotes = np.array(downvotes, dtype=np.float64)
+        ages = (now - np.array([date.timestamp() for date in created])) / 3600
+        hot = hot_scores(upvotes, downvotes, np.maximum(ages, 0))
+        controversy = controversy_scores(upvotes, downvotes)
+
+        _write_scores(Snippet._meta.db_table, list(zip(ids, hot.tolist(), controversy.tolist())))
+        last_id = ids[-1]
+        updated += len(rows)
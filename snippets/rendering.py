@@ -0,0 +1,131 @@
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import markdown
+import nh3
+from django.conf import settings
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import TextLexer, get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+# Part of the keys, increment it whenever the rendered HTML changes
+RENDERER_VERSION = 1
+
+DEFAULTS = {
+    'PROCESSES': 2,
+    'TIMEOUT': 30,
+}
+
+_formatter = HtmlFormatter(nowrap=True)
+_pool = None
+_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'RENDERING', {}).get(name, DEFAULTS[name])
+
+
+def render_file(name, content):
+    """Highlighted HTML of a file content, the tokens are spans with Pygments' CSS classes."""
+
+    try:
+        lexer = get_lexer_for_filename(name, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        lexer = TextLexer(stripnl=False, ensurenl=False)
+    html = highlight(content, lexer, _formatter)
+    # The formatter ends the last line, keep the lines of the content
+    return html[:-1] if html.endswith('\n') and not content.endswith('\n') else html
+
+
+def render_description(text):
+    """Markdown description rendered to HTML and sanitised of scripts, styles and event handlers."""
+
+    return nh3.clean(markdown.markdown(text, extensions=['fenced_code']))
+
+
+def render(job):
+    key, kind, name, content = job
+    return key, render_file(name, content) if kind == 'file' else render_description(content)
+
+
+def _job(kind, name, content):
+    digest = hashlib.sha256('{}\0{}\0{}\0'.format(RENDERER_VERSION, kind, name).encode())
+    digest.update(content.encode())
+    return digest.hexdigest(), kind, name, content
+
+
+def file_job(file):
+    return _job('file', file.name, file.content)
+
+
+def description_job(snippet):
+    return _job('description', '', snippet.description)
+
+
+def get_pool():
+    """Process pool of the cold renders, None when rendering in process."""
+
+    global _pool
+    processes = get_setting('PROCESSES')
+    if not processes:
+        return None
+    with _lock:
+        if _pool is None:
+            # Spawned rather than forked, the request workers have threads
+            _pool = ProcessPoolExecutor(processes, mp_context=get_context('spawn'))
+        return _pool
+
+
+def render_snippets(snippet_ids):
+    """Render the descriptions and files of the snippets which aren't rendered yet, in the process pool."""
+
+    from snippets.models import Snippet, Rendering
+
+    jobs = {}
+    for snippet in Snippet.objects.filter(id__in=snippet_ids).prefetch_related('files'):
+        for job in [description_job(snippet)] + [file_job(file) for file in snippet.files.all()]:
+            jobs[job[0]] = job
+    existing = set(Rendering.objects.filter(key__in=list(jobs)).values_list('key', flat=True))
+    jobs = [job for key, job in jobs.items() if key not in existing]
+    if not jobs:
+        return
+
+    pool = get_pool()
+    results = pool.map(render, jobs, timeout=get_setting('TIMEOUT')) if pool else map(render, jobs)
+    Rendering.objects.bulk_create([Rendering(key=key, html=html) for key, html in results], ignore_conflicts=True)
+
+
+def rendering_requested(context):
+    request = context.get('request')
+    return request is not None and request.query_params.get('render') == 'html'
+
+
+def preload_renderings(context, snippets=(), files=()):
+    """
+    Load the rendered HTML of the snippets descriptions and of the files into the
+    serializer context in a single query, enqueuing render jobs for the missing ones.
+    """
+
+    from snippets.models import Rendering
+
+    renderings = context.setdefault('renderings', {})
+    jobs = [(snippet.id, description_job(snippet)) for snippet in snippets] + \
+        [(file.snippet_id, file_job(file)) for file in files]
+    jobs = [(snippet_id, job) for snippet_id, job in jobs if job[0] not in renderings]
+    if not jobs:
+        return
+
+    renderings.update(Rendering.objects.filter(key__in=[job[0] for _, job in jobs]).values_list('key', 'html'))
+    missing = [(snippet_id, job) for snippet_id, job in jobs if job[0] not in renderings]
+    renderings.update((job[0], None) for _, job in missing)
+    if missing:
+        from snippets.jobs import enqueue_snippet_jobs
+
+        enqueue_snippet_jobs('snippets.render', [snippet_id for snippet_id, _ in missing])
+
+
+def rendered_html(context, job):
+    return context.get('renderings', {}).get(job[0])
@@ -1,27 +1,61 @@
-from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
+from changes.log import record
+from changes.models import Change
+from shared.concurrency import check_version, lock_version
 from shared.models import Vote
-from shared.serializers import RecursiveField
+from shared.serializers import Expandable, RecursiveField, SparseFieldsetsMixin
 from topics.models import Topic
 from topics.serializers import TopicSerializer
 from users.serializers import UserSerializer
-from .models import Snippet, File, Comment
+from .models import Snippet, File, Comment, SnippetLanguage
+from .rendering import description_job, file_job, preload_renderings, rendered_html, rendering_requested
 
 
 # FILE
 
-class FileSerializer(serializers.ModelSerializer):
+class FileListSerializer(serializers.ListSerializer):
+    """
+    Loads the rendered HTML of all the listed files in a single query when requested.
+    """
+
+    def to_representation(self, data):
+        files = list(data.all() if isinstance(data, models.Manager) else data)
+        if rendering_requested(self.context) and 'html' in self.child.fields:
+            preload_renderings(self.context, files=files)
+        return super().to_representation(files)
+
+
+class FileSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    html = serializers.SerializerMethodField(
+        help_text='Highlighted content, only with render=html and null until rendered.')
+
     class Meta:
         model = File
         fields = ('id',
                   'name',
-                  'content')
+                  'content',
+                  'html')
+        list_serializer_class = FileListSerializer
+        field_sources = {'html': ['name', 'content']}
+
+    @extend_schema_field(OpenApiTypes.STR)
+    def get_html(self, instance):
+        preload_renderings(self.context, files=[instance])
+        return rendered_html(self.context, file_job(instance))
+
+    def to_representation(self, instance):
+        if not rendering_requested(self.context):
+            self.fields.pop('html', None)
+        return super().to_representation(instance)
 
 
 # COMMENT
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     user = UserSerializer()
     replies = RecursiveField(many=True)
 
@@ -31,6 +65,7 @@ class CommentSerializer(serializers.ModelSerializer):
                   'user',
                   'created_date',
                   'content',
+                  'reply_count',
                   'replies')
 
 
@@ -47,35 +82,73 @@ class CommentWriteSerializer(CommentSerializer):
 
 # SNIPPET
 
-class BaseSnippetSerializer(serializers.ModelSerializer):
+class SnippetListSerializer(serializers.ListSerializer):
+    """
+    Loads the request user's votes of all the listed snippets in a single query.
+    """
+
+    def to_representation(self, data):
+        snippets = list(data.all() if isinstance(data, models.Manager) else data)
+        request = self.context.get('request')
+
+        if request is not None and request.user.is_authenticated and self.child.is_selected('userVote'):
+            votes = self.context.setdefault('user_votes', {})
+            votes.update(dict.fromkeys((snippet.id for snippet in snippets), 0))
+            votes.update(Vote.scores_for(request.user, snippets))
+
+        if rendering_requested(self.context):
+            # Only the selected renderings, the others may need deferred fields
+            descriptions = snippets if 'description_html' in self.child.fields else []
+            files = [file for snippet in snippets for file in snippet.files.all()] \
+                if 'files' in self.child.fields and 'html' in self.child.fields['files'].child.fields else []
+            preload_renderings(self.context, snippets=descriptions, files=files)
+
+        return super().to_representation(snippets)
+
+
+class BaseSnippetSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     topics = TopicSerializer(many=True, read_only=True)
+    description_html = serializers.SerializerMethodField(
+        help_text='Sanitised HTML of the markdown description, only with render=html and null until rendered.')
 
     class Meta:
         model = Snippet
         fields = ('id',
                   'name',
                   'description',
+                  'description_html',
                   'topics',
                   'upvotes',
-                  'downvotes')
-        read_only_fields = ('upvotes', 'downvotes')
+                  'downvotes',
+                  'comment_count',
+                  'version')
+        read_only_fields = ('upvotes', 'downvotes', 'comment_count', 'version')
+        list_serializer_class = SnippetListSerializer
+        expandable_fields = {
+            'author': Expandable(UserSerializer, source='user', select_related=['user__stats']),
+            'files': Expandable(FileSerializer, many=True, prefetch_related=['files']),
+        }
+        # Added by to_representation for authenticated users
+        optional_fields = ('userVote',)
+        field_sources = {'description_html': ['description'], 'userVote': []}
+
+    @extend_schema_field(OpenApiTypes.STR)
+    def get_description_html(self, instance):
+        preload_renderings(self.context, snippets=[instance])
+        return rendered_html(self.context, description_job(instance))
 
     def to_representation(self, instance):
+        if not rendering_requested(self.context):
+            self.fields.pop('description_html', None)
         representation = super(BaseSnippetSerializer, self).to_representation(instance)
-        user = self.context['request'].user
+        request = self.context.get('request')
 
         # If request user is authenticated include userVote field
-        if user.is_authenticated:
-            try:
-                vote = Vote.objects.get(
-                    user=user,
-                    content_type=ContentType.objects.get(model='snippet'),
-                    object_id=instance.id
-                )
-                representation['userVote'] = vote.score
-
-            except Vote.DoesNotExist:
-                representation['userVote'] = 0
+        if request is not None and request.user.is_authenticated and self.is_selected('userVote'):
+            score = self.context.get('user_votes', {}).get(instance.id)
+            if score is None:
+                score = Vote.scores_for(request.user, [instance]).get(instance.id, 0)
+            representation['userVote'] = score
 
         return representation
 
@@ -83,10 +156,11 @@ class BaseSnippetSerializer(serializers.ModelSerializer):
 class SnippetSerializer(BaseSnippetSerializer):
     files = FileSerializer(many=True)
 
-    class Meta:
+    class Meta(BaseSnippetSerializer.Meta):
         model = Snippet
         fields = BaseSnippetSerializer.Meta.fields + ('files',)
         read_only_fields = BaseSnippetSerializer.Meta.read_only_fields
+        list_serializer_class = SnippetListSerializer
 
 
 class SnippetWriteSerializer(BaseSnippetSerializer):
@@ -99,14 +173,29 @@ class SnippetWriteSerializer(BaseSnippetSerializer):
         fields = BaseSnippetSerializer.Meta.fields + ('topic_ids',)
         read_only_fields = BaseSnippetSerializer.Meta.read_only_fields
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        topics = validated_data.pop('topic_ids')
-
-        for field in validated_data:
-            setattr(instance, field, validated_data.get(
-                field, getattr(instance, field)))
-        instance.save()
-        instance.topics.set(topics)
+        """
+        Write only the changed fields, and the topics when they changed, bumping
+        the version. Fails when the version isn't one expected by If-Match.
+        """
+
+        topics = validated_data.pop('topic_ids', None)
+        changed = [field for field, value in validated_data.items() if getattr(instance, field) != value]
+        topics_changed = topics is not None and \
+            {topic.id for topic in topics} != {topic.id for topic in instance.topics.all()}
+        expected_versions = self.context.get('expected_versions')
+        if not changed and not topics_changed:
+            check_version(instance.version, expected_versions)
+            return instance
+
+        instance.version = lock_version(instance, expected_versions) + 1
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        # Only the edited fields, the counters are updated concurrently
+        instance.save(update_fields=changed + ['version'])
+        if topics_changed:
+            instance.topics.set(topics)
         return instance
 
 
@@ -116,6 +205,7 @@ class SnippetCreateSerializer(SnippetWriteSerializer, SnippetSerializer):
         fields = BaseSnippetSerializer.Meta.fields + ('files', 'topic_ids',)
         read_only_fields = BaseSnippetSerializer.Meta.read_only_fields
 
+    @transaction.atomic
     def create(self, validated_data):
         files_data = validated_data.pop('files')
         topics = validated_data.pop('topic_ids')
@@ -126,8 +216,44 @@ class SnippetCreateSerializer(SnippetWriteSerializer, SnippetSerializer):
             **validated_data)
 
         files = [File(snippet=instance, **file) for file in files_data]
+        for file in files:
+            file.detect_language()
         File.objects.bulk_create(files)
+        # Bulk creations have no post_save signal
+        record(Change.FILE, Change.CREATE, [file.id for file in files], instance.id)
+        languages = {file.language for file in files if file.language}
+        SnippetLanguage.objects.bulk_create(
+            [SnippetLanguage(snippet=instance, language=language) for language in languages])
 
         instance.topics.set(topics)
 
         return instance
+
+
+class RelatedSnippetSerializer(serializers.Serializer):
+    snippet = BaseSnippetSerializer()
+    similarity = serializers.FloatField()
+    duplicate = serializers.BooleanField()
+
+
+class SnippetPreviewBatchSerializer(serializers.Serializer):
+    results = BaseSnippetSerializer(many=True, allow_null=True,
+                                    help_text='In the order of the ids, null when not found.')
+    not_found = serializers.ListField(child=serializers.IntegerField())
+
+
+class SnippetBatchSerializer(serializers.Serializer):
+    results = SnippetSerializer(many=True, allow_null=True, help_text='In the order of the ids, null when not found.')
+    not_found = serializers.ListField(child=serializers.IntegerField())
+
+
+class CommentPageSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    next = serializers.URLField(allow_null=True, help_text='Next page of the comments list.')
+    results = CommentSerializer(many=True)
+
+
+class SnippetPageSerializer(serializers.Serializer):
+    snippet = SnippetSerializer()
+    author = UserSerializer()
+    comments = CommentPageSerializer(help_text='First page of the comments.')
@@ -0,0 +1,162 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from shared.models import score_changed
+from topics.models import Topic
+from .models import Snippet, File, Comment
+from .counts import increment_counts, recount
+from .documents import invalidate_documents, patch_counters
+from .events import publish_comment_created, publish_comment_deleted, publish_votes
+from .facets import FILTERED_FIELDS, bump_generation
+from .jobs import enqueue_snippet_jobs
+from .pages import bump_versions
+
+
+@receiver(post_save, sender=Snippet)
+def invalidate_saved_snippet_facets(sender, instance, created, update_fields, **kwargs):
+    # Votes, versions and counters don't change which snippets the filters match
+    if created or update_fields is None or FILTERED_FIELDS & set(update_fields):
+        bump_generation()
+
+
+@receiver(post_save, sender=Topic)
+def invalidate_saved_topic_facets(sender, instance, created, **kwargs):
+    # Topic names are part of the facets, new topics have no snippets yet
+    if not created:
+        bump_generation()
+
+
+@receiver(post_delete, sender=Snippet)
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=Topic)
+def invalidate_facets(**kwargs):
+    # Files are searched, and filtered by language
+    bump_generation()
+
+
+@receiver(m2m_changed, sender=Snippet.topics.through)
+def invalidate_snippet_topics_facets(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_generation()
+
+
+@receiver(post_save, sender=Snippet)
+def enqueue_saved_snippet_jobs(sender, instance, created, **kwargs):
+    # Files are created with the snippet, in the same transaction
+    if created:
+        enqueue_snippet_jobs('snippets.index_similarity', [instance.id])
+    enqueue_snippet_jobs('snippets.render', [instance.id])
+
+
+@receiver(post_save, sender=File)
+def enqueue_saved_file_jobs(sender, instance, **kwargs):
+    enqueue_snippet_jobs('snippets.index_similarity', [instance.snippet_id])
+    enqueue_snippet_jobs('snippets.render', [instance.snippet_id])
+
+
+@receiver(post_delete, sender=File)
+def enqueue_deleted_file_jobs(sender, instance, **kwargs):
+    enqueue_snippet_jobs('snippets.index_similarity', [instance.snippet_id])
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def enqueue_snippet_languages_job(sender, instance, **kwargs):
+    # Once per snippet after the commit, rather than for every file of the transaction
+    enqueue_snippet_jobs('snippets.update_languages', [instance.snippet_id])
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        if instance.active:
+            increment_counts(instance, 1)
+    else:
+        # Hidden and restored comments, only through the admin
+        recount([instance.snippet_id])
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.active:
+        increment_counts(instance, -1)
+
+
+@receiver(post_save, sender=Snippet)
+@receiver(post_delete, sender=Snippet)
+@receiver(score_changed, sender=Snippet)
+def invalidate_snippet_page(sender, instance, **kwargs):
+    bump_versions([instance.id])
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_snippet_page_of(sender, instance, **kwargs):
+    bump_versions([instance.snippet_id])
+
+
+@receiver(m2m_changed, sender=Snippet.topics.through)
+def invalidate_snippet_topics_page(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('post_'):
+        bump_versions((pk_set or []) if reverse else [instance.id])
+
+
+@receiver(post_save, sender=Topic)
+@receiver(pre_delete, sender=Topic)
+def invalidate_topic_snippets_pages(sender, instance, **kwargs):
+    # Before the deletion, which removes the topic from its snippets
+    bump_versions(list(instance.snippets.values_list('id', flat=True)))
+
+
+@receiver(post_save, sender=Comment)
+def publish_saved_comment(sender, instance, created, **kwargs):
+    if created and instance.active:
+        transaction.on_commit(partial(publish_comment_created, instance.id))
+
+
+@receiver(post_delete, sender=Comment)
+def publish_deleted_comment(sender, instance, **kwargs):
+    if instance.active:
+        transaction.on_commit(partial(publish_comment_deleted, instance.snippet_id, instance.id, instance.parent_id))
+
+
+@receiver(score_changed, sender=Snippet)
+def publish_snippet_votes(sender, instance, **kwargs):
+    transaction.on_commit(partial(publish_votes, instance.id))
+
+
+@receiver(post_save, sender=Snippet)
+def invalidate_snippet_document(sender, instance, **kwargs):
+    invalidate_documents([instance.id])
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def invalidate_snippet_document_of(sender, instance, **kwargs):
+    invalidate_documents([instance.snippet_id])
+
+
+@receiver(m2m_changed, sender=Snippet.topics.through)
+def invalidate_snippet_topics_document(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('post_'):
+        invalidate_documents((pk_set or []) if reverse else [instance.id])
+
+
+@receiver(post_save, sender=Topic)
+@receiver(pre_delete, sender=Topic)
+def invalidate_topic_snippets_documents(sender, instance, **kwargs):
+    invalidate_documents(instance.snippets.values_list('id', flat=True))
+
+
+@receiver(score_changed, sender=Snippet)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def patch_document_counters(sender, instance, **kwargs):
+    snippet_id = instance.id if sender is Snippet else instance.snippet_id
+    transaction.on_commit(partial(patch_counters, snippet_id))
@@ -0,0 +1,162 @@
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Subquery
+
+from snippets.models import Snippet, File, SnippetSignature, SnippetBucket
+
+# 32 bands of 4 rows, snippets become candidates from a Jaccard similarity of about 0.4
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+
+# Estimated similarities from which snippets are related and near-duplicates
+RELATED_THRESHOLD = 0.3
+DUPLICATE_THRESHOLD = 0.8
+# Candidates sharing the most buckets with a snippet, compared by signature
+MAX_CANDIDATES = 200
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SHINGLE_BASE = np.uint64(1000003)
+_generator = np.random.RandomState(42)
+_a = _generator.randint(1, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)[:, np.newaxis]
+_b = _generator.randint(0, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)[:, np.newaxis]
+
+_tokens = re.compile(r'\w+|[^\w\s]')
+
+
+def content_hash(contents):
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(content.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def shingles(contents):
+    """
+    Hashes of the overlapping sequences of SHINGLE_SIZE tokens of the files.
+
+    Tokenizing ignores whitespace, so reformatted code keeps the same shingles.
+    Each distinct token is hashed once and the shingle hashes are rolled from the
+    token hashes with numpy.
+    """
+
+    hashes = []
+    for content in contents:
+        tokens = _tokens.findall(content)
+        if not tokens:
+            continue
+        token_hashes = {token: zlib.crc32(token.encode()) for token in set(tokens)}
+        values = np.fromiter((token_hashes[token] for token in tokens), dtype=np.uint64, count=len(tokens))
+        count = max(1, len(values) - SHINGLE_SIZE + 1)
+        rolled = np.zeros(count, dtype=np.uint64)
+        for offset in range(min(SHINGLE_SIZE, len(values))):
+            rolled = (rolled * _SHINGLE_BASE + values[offset:offset + count]) & _MAX_HASH
+        hashes.append(rolled)
+    return np.unique(np.concatenate(hashes)) if hashes else np.empty(0, dtype=np.uint64)
+
+
+def signature(contents):
+    """MinHash signature of the files, None when they have no tokens."""
+
+    hashes = shingles(contents)
+    if not hashes.size:
+        return None
+    # Universal hashing (a * x + b) mod p, the products of 32 bits numbers can't overflow
+    permuted = ((_a * hashes + _b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def bucket_keys(minhash):
+    """One bucket key per band, prefixed by the band index so that bands never collide."""
+
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + minhash[band * ROWS:(band + 1) * ROWS].tobytes(),
+                                       digest_size=8).digest(), 'little', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def compute_signatures(snippets):
+    """Return (snippet id, content hash, signature bytes or None) of each (snippet id, contents) pair."""
+
+    results = []
+    for snippet_id, contents in snippets:
+        minhash = signature(contents)
+        results.append((snippet_id, content_hash(contents), None if minhash is None else minhash.tobytes()))
+    return results
+
+
+@transaction.atomic
+def save_signatures(results):
+    """Replace the signatures and buckets of the snippets, skipping the deleted ones."""
+
+    ids = [snippet_id for snippet_id, _, _ in results]
+    existing = set(Snippet.objects.filter(id__in=ids).values_list('id', flat=True))
+    SnippetBucket.objects.filter(snippet_id__in=ids).delete()
+    SnippetSignature.objects.filter(snippet_id__in=ids).delete()
+
+    signatures = []
+    buckets = []
+    for snippet_id, content_hash, minhash in results:
+        if snippet_id not in existing:
+            continue
+        signatures.append(SnippetSignature(snippet_id=snippet_id, content_hash=content_hash, minhash=minhash or b''))
+        if minhash is not None:
+            buckets.extend(SnippetBucket(snippet_id=snippet_id, key=key)
+                           for key in bucket_keys(np.frombuffer(minhash, dtype=np.uint32)))
+    SnippetSignature.objects.bulk_create(signatures)
+    SnippetBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+def index_snippets(snippet_ids):
+    """Compute the signatures of the snippets whose files changed since their last one."""
+
+    files = File.objects.filter(snippet_id__in=snippet_ids).order_by('snippet_id', 'id') \
+        .values_list('snippet_id', 'content')
+    contents = {snippet_id: [] for snippet_id in snippet_ids}
+    for snippet_id, content in files:
+        contents[snippet_id].append(content)
+
+    hashes = dict(SnippetSignature.objects.filter(snippet_id__in=snippet_ids)
+                  .values_list('snippet_id', 'content_hash'))
+    changed = [(snippet_id, contents[snippet_id]) for snippet_id in snippet_ids
+               if hashes.get(snippet_id) != content_hash(contents[snippet_id])]
+    if changed:
+        save_signatures(compute_signatures(changed))
+
+
+def related_snippets(snippet_id, limit=10):
+    """
+    Return (snippet id, estimated similarity) pairs of the most similar snippets.
+
+    Candidates are the snippets sharing an LSH bucket with the snippet, their
+    signatures are then compared to estimate the Jaccard similarity of the shingles.
+    """
+
+    keys = SnippetBucket.objects.filter(snippet_id=snippet_id).values('key')
+    candidates = SnippetBucket.objects.filter(key__in=Subquery(keys)).exclude(snippet_id=snippet_id) \
+        .values('snippet_id').annotate(shared=Count('id')).order_by('-shared', 'snippet_id')[:MAX_CANDIDATES]
+    signatures = dict(SnippetSignature.objects.filter(
+        snippet_id__in=[snippet_id] + [candidate['snippet_id'] for candidate in candidates]
+    ).exclude(minhash=b'').values_list('snippet_id', 'minhash'))
+
+    minhash = signatures.pop(snippet_id, None)
+    if minhash is None or not signatures:
+        return []
+
+    ids = list(signatures)
+    matrix = np.frombuffer(b''.join(bytes(signatures[related_id]) for related_id in ids), dtype=np.uint32) \
+        .reshape(len(ids), NUM_PERMUTATIONS)
+    similarities = (matrix == np.frombuffer(bytes(minhash), dtype=np.uint32)).mean(axis=1)
+    related = sorted(
+        ((related_id, float(similarity)) for related_id, similarity in zip(ids, similarities)
+         if similarity >= RELATED_THRESHOLD),
+        key=lambda item: (-item[1], item[0]))
+    return related[:limit]
@@ -1,9 +1,32 @@
 import json
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+
+import msgpack
+import numpy as np
+from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase
-from snippets.models import Snippet, File, Comment
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from shared.filter_backends import TopicsFilterBackend
+from shared.models import Vote
+from shared.query_inspector import QueryInspector, QueryInspectionError, fingerprint
+from snippets.languages import detect_language
+from snippets.models import Snippet, File, Comment, Rendering, SnippetDocument, SnippetLanguage, SnippetSignature
+from snippets.pages import bump_versions, get_cached_page, get_version, set_cached_page
+from snippets.ranking import INITIAL_HOT_SCORE, controversy_scores, hot_scores
+from snippets.rendering import render_description, render_file
 from snippets.serializers import SnippetSerializer
+from snippets.similarity import signature
 from topics.models import Topic
 
 User = get_user_model()
@@ -11,6 +34,8 @@ User = get_user_model()
 
 class AuthAPITestCase(APITestCase):
     def setUp(self):
+        # Login throttling history is kept in the cache
+        cache.clear()
         user = User(email='testuser@snip.com', username='test_user')
         user.set_password('test_pass')
         user.save()
@@ -195,4 +220,955 @@ class SnippetCommentsTestCase(AuthAPITestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(result['count'], 1)
         comment = result['results'][0]
-        self.assertEqual(len(comment['replies']), 2)
\ No newline at end of file
+        self.assertEqual(len(comment['replies']), 2)
+
+
+class ServerTimingTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_server_timing_header(self):
+        """
+        Verify sampled responses include database, auth, handler and render timings
+        """
+
+        with self.assertLogs('shared.instrumentation', 'INFO') as logs:
+            response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        metrics = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(['db', 'auth', 'handler', 'render', 'total'], metrics)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['path'], self.url)
+        self.assertGreater(line['db_queries'], 0)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_server_timing_not_sampled(self):
+        """
+        Verify requests outside of the sample are not profiled
+        """
+
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTestCase(AuthAPITestCase):
+
+    def test_viewset_action_metrics(self):
+        """
+        Verify requests are counted per viewset action and exposed in the Prometheus format
+        """
+
+        self.client.get(reverse("snippets:snippet-list"))
+        self.client.get(reverse("snippets:snippet-detail", kwargs={"pk": 0}))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer secret')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(200, response.status_code)
+        content = response.content.decode()
+        self.assertIn('api_requests_total{action="list",method="GET",status="200",viewset="SnippetViewSet"}', content)
+        self.assertIn('api_requests_total{action="retrieve",method="GET",status="404",viewset="SnippetViewSet"}',
+                      content)
+        self.assertIn('api_request_db_queries_bucket{action="list",le="+Inf",viewset="SnippetViewSet"}', content)
+
+    def test_metrics_token(self):
+        """
+        Verify the metrics endpoint requires the configured token, and isn't exposed without one
+        """
+
+        self.assertEqual(401, self.client.get(reverse('metrics')).status_code)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(404, self.client.get(reverse('metrics')).status_code)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer secret')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(200, response.status_code)
+
+
+class QueryInspectorTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    def test_fingerprint(self):
+        """
+        Verify statements differing only by their parameters share a fingerprint
+        """
+
+        self.assertEqual(
+            fingerprint('SELECT "id" FROM "t" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            fingerprint('SELECT "id"  FROM "t" WHERE "id" IN (%s) LIMIT 1'),
+        )
+        self.assertNotEqual(fingerprint('SELECT "id" FROM "t"'), fingerprint('SELECT "name" FROM "t"'))
+
+    @override_settings(QUERY_INSPECTOR={'MODE': 'raise', 'REPEATED_THRESHOLD': 3, 'STACK_SAMPLE_RATE': 1.0})
+    def test_repeated_queries(self):
+        """
+        Verify repeated statements are reported with the call site stack
+        """
+
+        inspector = QueryInspector()
+        for snippet_id in range(3):
+            inspector.record('SELECT * FROM "snippets_file" WHERE "snippet_id" = %s', 1.0)
+        inspector.record('SELECT * FROM "topics_topic"', 1.0)
+
+        issues = inspector.issues()
+        self.assertEqual(len(issues['repeated']), 1)
+        self.assertEqual(issues['repeated'][0]['count'], 3)
+        self.assertTrue(any('snippets/tests.py' in frame for frame in issues['repeated'][0]['stack']))
+        with self.assertRaises(QueryInspectionError):
+            inspector.report('GET', '/')
+
+    @override_settings(QUERY_INSPECTOR={'MODE': 'log', 'SLOW_QUERY_MS': 0, 'STACK_SAMPLE_RATE': 0})
+    def test_slow_queries_logged(self):
+        """
+        Verify slow statements are logged without failing the request in the log mode
+        """
+
+        with self.assertLogs('shared.query_inspector', 'WARNING') as logs:
+            response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(json.loads(logs.records[0].getMessage())['slow'])
+
+    def test_snippet_list_queries(self):
+        """
+        Verify listing snippets doesn't run queries per snippet
+        """
+
+        for i in range(10):
+            snippet = Snippet.objects.create(user=self.user, name='Snippet {}'.format(i))
+            File.objects.create(snippet=snippet, name='file.py', content='print()')
+
+        # Count, page, topics, files and user votes, the user and its content type are cached
+        self.client.get(self.url)
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(len(json.loads(response.content)['results']), 10)
+
+
+class SeedDataTestCase(APITestCase):
+
+    def seed(self, **options):
+        call_command('seed_data', users=20, topics=5, snippets=30, batch_size=10, stdout=StringIO(), **options)
+        return [
+            (snippet.name, snippet.upvotes, snippet.downvotes, len(snippet.description),
+             sorted(len(file.content) for file in snippet.files.all()), snippet.topics.count(),
+             snippet.comments.count())
+            for snippet in Snippet.objects.order_by('name')
+        ]
+
+    def test_seed_data(self):
+        """
+        Verify generated data counts and vote counters consistency
+        """
+
+        self.seed(seed=1)
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Topic.objects.count(), 5)
+        self.assertEqual(Snippet.objects.count(), 30)
+        self.assertTrue(File.objects.exists())
+        for snippet in Snippet.objects.all():
+            self.assertEqual(snippet.upvotes, Vote.objects.filter(object_id=snippet.id, score=1).count())
+            self.assertEqual(snippet.downvotes, -Vote.objects.filter(object_id=snippet.id, score=-1).count())
+        self.assertFalse(Comment.objects.filter(parent__parent__isnull=False).exists())
+
+    def test_seed_data_reproducible(self):
+        """
+        Verify the same seed generates the same data
+        """
+
+        first = self.seed(seed=2)
+        User.objects.all().delete()
+        self.assertEqual(first, self.seed(seed=2))
+
+
+class RankingTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    def setUp(self):
+        super().setUp()
+        self.old = Snippet.objects.create(user=self.user, name='Old', upvotes=50, downvotes=-5)
+        Snippet.objects.filter(id=self.old.id).update(created_date=timezone.now() - timedelta(days=3))
+        self.recent = Snippet.objects.create(user=self.user, name='Recent', upvotes=5, downvotes=-4)
+        self.new = Snippet.objects.create(user=self.user, name='New')
+
+    def get_names(self, ordering):
+        response = self.client.get(self.url, {'ordering': ordering})
+        self.assertEqual(200, response.status_code)
+        return [snippet['name'] for snippet in json.loads(response.content)['results']]
+
+    def test_scores(self):
+        """
+        Verify hot scores decay with age and controversy needs both kinds of votes
+        """
+
+        hot = hot_scores(np.array([10.0, 10.0]), np.array([0.0, 0.0]), np.array([0.0, 24.0]))
+        self.assertGreater(hot[0], hot[1])
+        self.assertAlmostEqual(hot_scores(np.array([0.0]), np.array([0.0]), np.array([0.0]))[0], INITIAL_HOT_SCORE)
+
+        controversy = controversy_scores(np.array([10.0, 10.0, 10.0]), np.array([-10.0, -2.0, 0.0]))
+        self.assertEqual(controversy.tolist(), [20.0, 12.0 ** 0.2, 0.0])
+
+    def test_update_rankings(self):
+        """
+        Verify the scores are recomputed for every snippet
+        """
+
+        call_command('update_rankings', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(self.get_names('trending'), ['Recent', 'New', 'Old'])
+        self.assertEqual(self.get_names('controversial')[:2], ['Recent', 'Old'])
+
+    def test_top_orderings(self):
+        """
+        Verify top orderings only keep the snippets of the period
+        """
+
+        self.assertEqual(self.get_names('top_day'), ['Recent', 'New'])
+        self.assertEqual(self.get_names('top_week'), ['Old', 'Recent', 'New'])
+        self.assertEqual(self.get_names('new'), ['New', 'Recent', 'Old'])
+
+    def test_existing_snippets_dates(self):
+        """
+        Verify the migration dates the existing snippets in the order of their ids
+        """
+
+        commented = timezone.now() - timedelta(days=2)
+        comment = Comment.objects.create(snippet=self.recent, user=self.user, content='Comment')
+        Comment.objects.filter(id=comment.id).update(created_date=commented)
+        Snippet.objects.create(user=self.user, name='Latest')
+
+        migration = import_module('snippets.migrations.0008_snippet_ranking')
+        migration.backfill_created_dates(apps, None)
+        dates = dict(Snippet.objects.values_list('name', 'created_date'))
+        self.assertEqual(dates['Old'], commented)
+        self.assertEqual(dates['Recent'], commented)
+        self.assertEqual(dates['New'], commented + timedelta(seconds=1))
+        self.assertEqual(dates['Latest'], commented + timedelta(seconds=2))
+
+    def test_invalid_ordering(self):
+        """
+        Verify unknown orderings are rejected
+        """
+
+        response = self.client.get(self.url, {'ordering': 'oldest'})
+        self.assertEqual(400, response.status_code)
+
+
+class TopicsFilterTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    def setUp(self):
+        super().setUp()
+        js, python, test = Topic.objects.create(name='JS'), Topic.objects.create(name='PY'), \
+            Topic.objects.create(name='TEST')
+        self.topics = [js, python, test]
+        Snippet.objects.create(user=self.user, name='JS and PY').topics.set([js, python])
+        Snippet.objects.create(user=self.user, name='JS and TEST').topics.set([js, test])
+        Snippet.objects.create(user=self.user, name='PY').topics.set([python])
+
+    def get_names(self, **params):
+        params = {key: ','.join(str(topic.id) for topic in topics) for key, topics in params.items()}
+        response = self.client.get(self.url, params)
+        self.assertEqual(200, response.status_code)
+        result = json.loads(response.content)
+        self.assertEqual(result['count'], len(result['results']))
+        return sorted(snippet['name'] for snippet in result['results'])
+
+    def test_topics_any(self):
+        """
+        Verify snippets matching several topics are returned once
+        """
+
+        js, python, test = self.topics
+        self.assertEqual(self.get_names(topics_any=[js, python]), ['JS and PY', 'JS and TEST', 'PY'])
+        self.assertEqual(self.get_names(topics=[test]), ['JS and TEST'])
+
+    def test_topics_all(self):
+        """
+        Verify snippets must have every topic
+        """
+
+        js, python, test = self.topics
+        self.assertEqual(self.get_names(topics_all=[js, python]), ['JS and PY'])
+        self.assertEqual(self.get_names(topics_all=[js], topics_any=[python, test]), ['JS and PY', 'JS and TEST'])
+
+    def test_query_shape(self):
+        """
+        Verify topics are filtered with EXISTS subqueries instead of joins
+        """
+
+        js, python, test = self.topics
+        request = Request(APIRequestFactory().get('/', {
+            'topics_any': js.id,
+            'topics_all': '{},{}'.format(python.id, test.id),
+        }))
+        sql = str(TopicsFilterBackend().filter_queryset(request, Snippet.objects.all(), None).query)
+
+        self.assertEqual(sql.count('EXISTS'), 3)
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_invalid_topics(self):
+        """
+        Verify malformed topic ids are rejected
+        """
+
+        self.assertEqual(400, self.client.get(self.url, {'topics': '1,js'}).status_code)
+        self.assertEqual(400, self.client.get(self.url, {'topics_all': ','.join(map(str, range(30)))}).status_code)
+
+
+class TopicFacetsTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    def setUp(self):
+        super().setUp()
+        self.js, self.python = Topic.objects.create(name='JS'), Topic.objects.create(name='PY')
+        for i in range(12):
+            snippet = Snippet.objects.create(user=self.user, name='Snippet {}'.format(i))
+            snippet.topics.set([self.js, self.python] if i % 3 == 0 else [self.js])
+
+    def get_facets(self, **params):
+        response = self.client.get(self.url, {'facets': 'topics', **params})
+        self.assertEqual(200, response.status_code)
+        return json.loads(response.content)['facets']['topics']
+
+    def test_topic_facets(self):
+        """
+        Verify topic counts follow the current filters
+        """
+
+        self.assertEqual(self.get_facets(), [
+            {'id': self.js.id, 'name': 'JS', 'count': 12},
+            {'id': self.python.id, 'name': 'PY', 'count': 4},
+        ])
+        self.assertEqual(self.get_facets(topics_all=self.python.id, search='Snippet 9'), [
+            {'id': self.js.id, 'name': 'JS', 'count': 1},
+            {'id': self.python.id, 'name': 'PY', 'count': 1},
+        ])
+        self.assertNotIn('facets', json.loads(self.client.get(self.url).content))
+
+    def test_topic_facets_cache(self):
+        """
+        Verify counts are cached across pages until the filtered snippets or their topics change
+        """
+
+        # Count, page, topics, files and user votes, without the facets query
+        self.get_facets()
+        with self.assertNumQueries(5):
+            self.get_facets(page=2)
+
+        # Votes and counters don't change the counts
+        snippet = Snippet.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            snippet.upvote(self.user)
+            snippet.save(update_fields=['version'])
+        with self.assertNumQueries(5):
+            self.get_facets(page=2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Snippet.objects.create(user=self.user, name='Snippet').topics.set([self.python])
+        self.assertEqual(self.get_facets()[1]['count'], 5)
+
+
+class SimilarityTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    content = '\n'.join('def handler_{0}(request):\n    return request.data["value_{0}"] * {0}'.format(i)
+                        for i in range(30))
+
+    def create_snippet(self, name, contents):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {
+                'name': name,
+                'files': [{'name': 'file.py', 'content': content} for content in contents],
+                'topic_ids': [],
+            }, format='json')
+        self.assertEqual(201, response.status_code)
+        return json.loads(response.content)['id']
+
+    def get_related(self, snippet_id):
+        response = self.client.get(reverse("snippets:snippet-related", kwargs={"pk": snippet_id}))
+        self.assertEqual(200, response.status_code)
+        return [(result['snippet']['name'], result['duplicate']) for result in json.loads(response.content)]
+
+    def test_signature(self):
+        """
+        Verify signatures ignore whitespace and estimate the similarity
+        """
+
+        original = signature([self.content])
+        self.assertTrue((original == signature([self.content.replace('\n', '\n\n').replace(' ', '  ')])).all())
+        self.assertLess((original == signature(['SELECT * FROM snippets_snippet WHERE id = 1'])).mean(), 0.1)
+        self.assertIsNone(signature(['  ']))
+
+    def test_related_snippets(self):
+        """
+        Verify near-duplicates are found once the snippets are indexed
+        """
+
+        snippet_id = self.create_snippet('Original', [self.content])
+        self.create_snippet('Copy', [self.content.replace('handler_29', 'view_29')])
+        self.create_snippet('Unrelated', ['SELECT name, count(*) FROM topics_topic GROUP BY name'])
+
+        self.assertEqual(self.get_related(snippet_id), [('Copy', True)])
+        self.assertEqual(404, self.client.get(reverse("snippets:snippet-related", kwargs={"pk": 0})).status_code)
+
+    def test_rebuild_similarity_index(self):
+        """
+        Verify the rebuild command indexes every snippet across worker processes
+        """
+
+        for i in range(4):
+            snippet = Snippet.objects.create(user=self.user, name='Snippet {}'.format(i))
+            File.objects.create(snippet=snippet, name='file.py', content=self.content + '\n# {}'.format(i))
+        SnippetSignature.objects.all().delete()
+
+        call_command('rebuild_similarity_index', workers=2, batch_size=3, stdout=StringIO())
+
+        self.assertEqual(SnippetSignature.objects.count(), 4)
+        self.assertEqual(len(self.get_related(snippet.id)), 3)
+
+
+class RenderingTestCase(AuthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snippet = Snippet.objects.create(user=self.user, name='Snippet',
+                                                  description='**Bold** <script>alert(1)</script>')
+            self.file = File.objects.create(snippet=self.snippet, name='main.py', content='def main():\n    pass\n')
+
+    def test_render(self):
+        """
+        Verify files are highlighted from their name and descriptions are sanitised
+        """
+
+        self.assertIn('<span class="k">def</span>', render_file('main.py', 'def main(): pass'))
+        self.assertEqual(render_file('notes.unknown', '<b>'), '&lt;b&gt;')
+        self.assertEqual(render_description('**Bold** <script>alert(1)</script>'), '<p><strong>Bold</strong> </p>')
+
+    def test_rendered_snippet(self):
+        """
+        Verify rendered HTML is only served when requested
+        """
+
+        url = reverse("snippets:snippet-detail", kwargs={"pk": self.snippet.pk})
+        result = json.loads(self.client.get(url, {'render': 'html'}).content)
+        self.assertEqual(result['description_html'], '<p><strong>Bold</strong> </p>')
+        self.assertIn('<span class="nf">main</span>', result['files'][0]['html'])
+
+        result = json.loads(self.client.get(url).content)
+        self.assertNotIn('description_html', result)
+        self.assertNotIn('html', result['files'][0])
+
+    def test_cold_render(self):
+        """
+        Verify missing renders are served as null and rendered in the background
+        """
+
+        Rendering.objects.all().delete()
+        url = reverse("snippets:snippet-files-list", kwargs={"snippet_id": self.snippet.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(json.loads(self.client.get(url, {'render': 'html'}).content)[0]['html'])
+        # Snippet, files and their renderings
+        with self.assertNumQueries(3):
+            result = json.loads(self.client.get(url, {'render': 'html'}).content)
+        self.assertIn('<span class="k">pass</span>', result[0]['html'])
+
+
+class LanguagesTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    def create_snippet(self, name, files):
+        response = self.client.post(self.url, {
+            'name': name,
+            'files': [{'name': file_name, 'content': content} for file_name, content in files],
+            'topic_ids': [],
+        }, format='json')
+        self.assertEqual(201, response.status_code)
+        return Snippet.objects.get(id=json.loads(response.content)['id'])
+
+    def get_names(self, languages):
+        response = self.client.get(self.url, {'languages': languages})
+        self.assertEqual(200, response.status_code)
+        return sorted(snippet['name'] for snippet in json.loads(response.content)['results'])
+
+    def test_detect_language(self):
+        """
+        Verify languages are detected from the file name, then the content
+        """
+
+        self.assertEqual(detect_language('main.py', ''), 'python')
+        self.assertEqual(detect_language('App.TSX', ''), 'typescript')
+        self.assertEqual(detect_language('Dockerfile', 'FROM python'), 'docker')
+        self.assertEqual(detect_language('deploy', '#!/usr/bin/env bash\nset -e'), 'bash')
+        self.assertEqual(detect_language('snippet.txt', 'SELECT * FROM users;'), 'sql')
+        self.assertEqual(detect_language('notes', 'Remember the milk'), '')
+
+    def test_languages_filter(self):
+        """
+        Verify snippets are filtered by the languages of their files
+        """
+
+        python = self.create_snippet('Python', [('main.py', 'print(1)'), ('query.sql', 'SELECT 1')])
+        self.create_snippet('Go', [('main.go', 'package main')])
+
+        self.assertEqual(self.get_names('python'), ['Python'])
+        self.assertEqual(self.get_names('SQL,go'), ['Go', 'Python'])
+        self.assertEqual(400, self.client.get(self.url, {'languages': 'c;drop'}).status_code)
+
+        # Updated once committed
+        with self.captureOnCommitCallbacks(execute=True):
+            python.files.get(name='main.py').delete()
+            self.assertEqual(self.get_names('python'), ['Python'])
+        self.assertEqual(self.get_names('python'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            File.objects.create(snippet=python, name='app.js', content='console.log(1)')
+        self.assertEqual(self.get_names('javascript'), ['Python'])
+
+    def test_backfill_languages(self):
+        """
+        Verify the backfill command detects missing languages and rebuilds the snippets ones
+        """
+
+        snippet = self.create_snippet('Snippet', [('main.rb', 'puts 1')])
+        File.objects.update(language='')
+        SnippetLanguage.objects.all().delete()
+
+        call_command('backfill_languages', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(File.objects.get().language, 'ruby')
+        self.assertEqual(list(snippet.languages.values_list('language', flat=True)), ['ruby'])
+
+
+class CommentCountsTestCase(AuthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.snippet = Snippet.objects.create(user=self.user, name='Snippet')
+        self.url = reverse("snippets:snippet-comments-list", kwargs={"snippet_id": self.snippet.pk})
+
+    def get_counts(self, comment):
+        self.snippet.refresh_from_db()
+        comment.refresh_from_db()
+        return self.snippet.comment_count, comment.reply_count
+
+    def test_comment_counts(self):
+        """
+        Verify the counts follow the comments creations, deletions and active toggles
+        """
+
+        comment_id = self.client.post(self.url, {'content': 'Comment'}, format='json').json()['id']
+        comment = Comment.objects.get(id=comment_id)
+        for content in ('Reply 1', 'Reply 2'):
+            self.client.post(self.url, {'content': content, 'parent': comment_id}, format='json')
+        self.assertEqual((3, 2), self.get_counts(comment))
+
+        reply = comment.replies.first()
+        reply.active = False
+        reply.save()
+        self.assertEqual((2, 1), self.get_counts(comment))
+
+        comment.replies.exclude(id=reply.id).delete()
+        self.assertEqual((1, 0), self.get_counts(comment))
+
+        response = self.client.get(self.url)
+        self.assertEqual(0, response.json()['results'][0]['reply_count'])
+        response = self.client.get(reverse("snippets:snippet-detail", kwargs={"pk": self.snippet.pk}))
+        self.assertEqual(1, response.json()['comment_count'])
+
+    def test_existing_comment_counts(self):
+        """
+        Verify the counts of the comments existing before the signals are computed by the migration
+        """
+
+        comment = Comment.objects.create(snippet=self.snippet, user=self.user, content='Comment')
+        Comment.objects.create(snippet=self.snippet, user=self.user, content='Reply', parent=comment)
+        Comment.objects.create(snippet=self.snippet, user=self.user, content='Deleted', parent=comment, active=False)
+        Snippet.objects.update(comment_count=0)
+        Comment.objects.update(reply_count=0)
+
+        migration = import_module('snippets.migrations.0012_comment_counts')
+        migration.backfill_comment_counts(apps, None)
+        self.assertEqual((2, 1), self.get_counts(comment))
+
+    def test_recount_comments(self):
+        """
+        Verify the recount command finds and fixes drifted counts
+        """
+
+        comment = Comment.objects.create(snippet=self.snippet, user=self.user, content='Comment')
+        Comment.objects.create(snippet=self.snippet, user=self.user, content='Reply', parent=comment)
+        Snippet.objects.update(comment_count=0)
+        Comment.objects.update(reply_count=5)
+
+        out = StringIO()
+        call_command('recount_comments', '--dry-run', stdout=out)
+        self.assertIn('Found 1 drifted snippet and 2 drifted comment counts of 1 snippets', out.getvalue())
+        self.assertEqual((0, 5), self.get_counts(comment))
+
+        call_command('recount_comments', stdout=StringIO())
+        self.assertEqual((2, 1), self.get_counts(comment))
+
+
+class MultiGetTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-batch")
+
+    def setUp(self):
+        super().setUp()
+        topic = Topic.objects.create(name='JS')
+        self.snippets = [Snippet.objects.create(user=self.user, name='Snippet {}'.format(i)) for i in range(3)]
+        for snippet in self.snippets:
+            snippet.topics.add(topic)
+            File.objects.create(snippet=snippet, name='main.js', content='console.log(1)')
+        self.snippets[1].upvote(self.user)
+
+    def test_batch(self):
+        """
+        Verify snippets are returned in the order of the ids with markers for the missing ones
+        """
+
+        ids = [self.snippets[2].id, 0, self.snippets[0].id, self.snippets[1].id, self.snippets[2].id]
+        # User active status, documents, then without documents the snippets, topics, files and the user votes
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url, {'ids': ','.join(map(str, ids))})
+        result = response.json()
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([ids[0], None, ids[2], ids[3]],
+                         [snippet and snippet['id'] for snippet in result['results']])
+        self.assertEqual([0], result['not_found'])
+        self.assertEqual(1, result['results'][3]['userVote'])
+        self.assertEqual(1, len(result['results'][0]['files']))
+
+        response = self.client.get(reverse("snippets:preview-batch"), {'ids': ids[0]})
+        self.assertNotIn('files', response.json()['results'][0])
+
+    def test_invalid_batch(self):
+        """
+        Verify missing, invalid and too many ids are rejected
+        """
+
+        self.assertEqual(400, self.client.get(self.url).status_code)
+        self.assertEqual(400, self.client.get(self.url, {'ids': '1,a'}).status_code)
+        self.assertEqual(400, self.client.get(self.url, {'ids': ','.join(map(str, range(51)))}).status_code)
+
+
+class SnippetPageTestCase(AuthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.snippet = Snippet.objects.create(user=self.user, name='Snippet')
+        self.snippet.topics.add(Topic.objects.create(name='JS'))
+        File.objects.create(snippet=self.snippet, name='main.js', content='console.log(1)')
+        comment = Comment.objects.create(snippet=self.snippet, user=self.user, content='Comment')
+        Comment.objects.create(snippet=self.snippet, user=self.user, content='Reply', parent=comment)
+        self.url = reverse("snippets:snippet-page", kwargs={"pk": self.snippet.pk})
+
+    def test_snippet_page(self):
+        """
+        Verify the page bundles the snippet, author, comments and vote state
+        """
+
+        self.snippet.upvote(self.user)
+        result = self.client.get(self.url).json()
+
+        self.assertEqual('Snippet', result['snippet']['name'])
+        self.assertEqual(1, len(result['snippet']['files']))
+        self.assertEqual(1, result['snippet']['userVote'])
+        self.assertEqual('test_user', result['author']['username'])
+        self.assertEqual(1, result['author']['stats']['snippet_count'])
+        self.assertEqual(1, result['comments']['count'])
+        self.assertEqual('Reply', result['comments']['results'][0]['replies'][0]['content'])
+        self.assertEqual(404, self.client.get(reverse("snippets:snippet-page", kwargs={"pk": 0})).status_code)
+
+    def test_snippet_page_cache(self):
+        """
+        Verify the page is cached until the snippet's comments or votes change
+        """
+
+        self.client.get(self.url)
+        # Only the user vote
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(snippet=self.snippet, user=self.user, content='Another comment')
+        self.assertEqual(2, self.client.get(self.url).json()['comments']['count'])
+
+    def test_snippet_page_cache_race(self):
+        """
+        Verify a page loaded while a write is committed isn't cached under the new version
+        """
+
+        version = get_version(self.snippet.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_versions([self.snippet.id])
+        set_cached_page(self.snippet.id, version, False, {'stale': True})
+        self.assertIsNone(get_cached_page(self.snippet.id, get_version(self.snippet.id), False))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snippet.downvote(self.user)
+        self.assertEqual(-1, self.client.get(self.url).json()['snippet']['downvotes'])
+
+
+class SparseFieldsetsTestCase(AuthAPITestCase):
+    url = reverse("snippets:snippet-list")
+
+    def setUp(self):
+        super().setUp()
+        self.snippet = Snippet.objects.create(user=self.user, name='Snippet', description='Description')
+        self.snippet.topics.add(Topic.objects.create(name='JS'))
+        File.objects.create(snippet=self.snippet, name='main.js', content='console.log(1)')
+        # Active status of the user
+        self.client.get(self.url)
+
+    def test_fields(self):
+        """
+        Verify only the selected fields are loaded and rendered
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,name,files.name'})
+        self.assertEqual([{'id': self.snippet.id, 'name': 'Snippet', 'files': [{'name': 'main.js'}]}],
+                         response.json()['results'])
+        # Count, snippets and files, without the topics and the user votes
+        self.assertEqual(3, len(queries))
+        self.assertNotIn('description', queries[1]['sql'])
+        self.assertNotIn('content', queries[2]['sql'])
+
+        response = self.client.get(reverse("snippets:snippet-detail", kwargs={"pk": self.snippet.pk}),
+                                   {'fields': 'name,userVote'})
+        self.assertEqual({'name': 'Snippet', 'userVote': 0}, response.json())
+
+    def test_expand(self):
+        """
+        Verify expanded fields are added with their queries
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("snippets:preview-list"), {
+                'expand': 'author,files', 'fields': 'id,author.username,files.name'})
+        self.assertEqual([{'id': self.snippet.id, 'author': {'username': 'test_user'}, 'files': [{'name': 'main.js'}]}],
+                         response.json()['results'])
+        # Count, snippets joined with their authors and files
+        self.assertEqual(3, len(queries))
+        self.assertIn('JOIN "users_user"', queries[1]['sql'])
+
+    def test_unknown_fields(self):
+        """
+        Verify unknown fields are rejected
+        """
+
+        self.assertEqual(400, self.client.get(self.url, {'fields': 'id,secret'}).status_code)
+        self.assertEqual(400, self.client.get(self.url, {'expand': 'secret'}).status_code)
+
+
+class MessagePackTestCase(AuthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.snippet = Snippet.objects.create(user=self.user, name='Snippet', description='Description')
+        self.snippet.topics.add(Topic.objects.create(name='JS'))
+        File.objects.create(snippet=self.snippet, name='main.js', content='console.log(1)')
+        Comment.objects.create(snippet=self.snippet, user=self.user, content='Comment')
+
+    def test_responses_match_json(self):
+        """
+        Verify the MessagePack responses have the same content as the JSON ones
+        """
+
+        urls = [
+            reverse('snippets:snippet-list'),
+            reverse('snippets:snippet-detail', kwargs={'pk': self.snippet.pk}),
+            reverse('snippets:snippet-page', kwargs={'pk': self.snippet.pk}),
+            reverse('snippets:snippet-comments-list', kwargs={'snippet_id': self.snippet.pk}),
+            reverse('user-list'),
+        ]
+        for url in urls:
+            expected = self.client.get(url).json()
+            response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+            self.assertEqual(200, response.status_code)
+            self.assertEqual('application/msgpack', response['Content-Type'])
+            self.assertEqual(expected, msgpack.unpackb(response.content, raw=False), url)
+
+    def test_request_body(self):
+        """
+        Verify snippets can be created with MessagePack bodies and malformed ones are rejected
+        """
+
+        url = reverse('snippets:snippet-list')
+        body = msgpack.packb({'name': 'Packed', 'description': 'Description', 'topic_ids': [],
+                              'files': [{'name': 'a.py', 'content': 'pass'}]})
+        response = self.client.post(url, body, content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(201, response.status_code)
+        result = msgpack.unpackb(response.content, raw=False)
+        self.assertEqual('Packed', result['name'])
+        self.assertEqual(['a.py'], [file.name for file in File.objects.filter(snippet_id=result['id'])])
+
+        response = self.client.post(url, b'\xc1', content_type='application/msgpack')
+        self.assertEqual(400, response.status_code)
+        self.assertIn('MessagePack parse error', response.json()['detail'])
+
+
+class SnippetUpdateTestCase(AuthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.topics = [Topic.objects.create(name='JS'), Topic.objects.create(name='TEST')]
+        self.snippet = Snippet.objects.create(user=self.user, name='Snippet', description='Description')
+        self.snippet.topics.set(self.topics)
+        self.url = reverse('snippets:snippet-detail', kwargs={'pk': self.snippet.pk})
+
+    def test_if_match(self):
+        """
+        Verify updates of modified snippets are rejected when the client sends the version it fetched
+        """
+
+        response = self.client.get(self.url)
+        self.assertEqual('"1"', response['ETag'])
+        self.assertEqual(1, response.json()['version'])
+
+        response = self.client.patch(self.url, {'name': 'First'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('"2"', response['ETag'])
+        self.assertEqual(2, response.json()['version'])
+
+        response = self.client.patch(self.url, {'name': 'Second'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(412, response.status_code)
+        self.assertEqual('First', Snippet.objects.get(pk=self.snippet.pk).name)
+
+        # Weak tags never match
+        response = self.client.patch(self.url, {'name': 'Second'}, HTTP_IF_MATCH='W/"2"')
+        self.assertEqual(412, response.status_code)
+
+        # Without If-Match the updates always apply
+        response = self.client.patch(self.url, {'name': 'Third'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, Snippet.objects.get(pk=self.snippet.pk).version)
+
+    def test_changed_fields(self):
+        """
+        Verify only the changed fields and topics are written
+        """
+
+        data = {'name': 'Snippet', 'description': 'Description', 'topic_ids': [topic.id for topic in self.topics]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(self.url, data, HTTP_IF_MATCH='"1"')
+        self.assertEqual(200, response.status_code)
+        writes = [query['sql'] for query in queries if not query['sql'].startswith('SELECT')]
+        self.assertEqual([], [sql for sql in writes if 'snippets_snippet' in sql])
+        self.assertEqual(1, Snippet.objects.get(pk=self.snippet.pk).version)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(self.url, dict(data, name='Renamed'))
+        self.assertEqual(200, response.status_code)
+        writes = [query['sql'] for query in queries if query['sql'].startswith((
+            'UPDATE "snippets_snippet"', 'INSERT INTO "snippets_snippet_topics"',
+            'DELETE FROM "snippets_snippet_topics"'))]
+        self.assertEqual(1, len(writes))
+        self.assertNotIn('description', writes[0])
+
+        response = self.client.patch(self.url, {'topic_ids': [self.topics[0].id]})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['JS'], [topic['name'] for topic in response.json()['topics']])
+        self.assertEqual(3, response.json()['version'])
+
+
+class NestedResourcesTestCase(AuthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(username='other', email='other@snip.com', password='test_pass')
+        self.snippet = Snippet.objects.create(user=self.other, name='Snippet')
+        self.file = File.objects.create(snippet=self.snippet, name='main.py', content='pass')
+        self.files_url = reverse('snippets:snippet-files-list', kwargs={'snippet_id': self.snippet.pk})
+        self.file_url = reverse('snippets:snippet-files-detail',
+                                kwargs={'snippet_id': self.snippet.pk, 'pk': self.file.pk})
+
+    def test_parent_owner_permissions(self):
+        """
+        Verify only the owner of a snippet can write its files, and only the owners can update their objects
+        """
+
+        self.assertEqual(403, self.client.post(self.files_url, {'name': 'a.py', 'content': 'pass'}).status_code)
+        self.assertEqual(403, self.client.patch(self.file_url, {'content': 'changed'}).status_code)
+        self.assertEqual(403, self.client.delete(self.file_url).status_code)
+        self.assertEqual(403, self.client.patch(
+            reverse('snippets:snippet-detail', kwargs={'pk': self.snippet.pk}), {'name': 'Changed'}).status_code)
+        self.assertEqual('pass', File.objects.get(pk=self.file.pk).content)
+        self.assertEqual(404, self.client.post(
+            reverse('snippets:snippet-files-list', kwargs={'snippet_id': 0}), {'name': 'a.py', 'content': 'pass'}
+        ).status_code)
+
+        self.snippet.user = self.user
+        self.snippet.save()
+        self.assertEqual(201, self.client.post(self.files_url, {'name': 'a.py', 'content': 'pass'}).status_code)
+        self.assertEqual(204, self.client.delete(self.file_url).status_code)
+
+    def test_single_parent_lookup(self):
+        """
+        Verify writes of nested files look up their snippet once
+        """
+
+        self.snippet.user = self.user
+        self.snippet.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.file_url, {'content': 'changed'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len([query for query in queries if query['sql'].startswith('SELECT')
+                                 and 'FROM "snippets_snippet" ' in query['sql']]))
+
+
+class SnippetDocumentsTestCase(AuthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.snippet = Snippet.objects.create(user=self.user, name='Snippet', description='Description')
+        self.snippet.topics.add(Topic.objects.create(name='JS'))
+        self.file = File.objects.create(snippet=self.snippet, name='main.js', content='console.log(1)')
+        self.url = reverse('snippets:snippet-detail', kwargs={'pk': self.snippet.pk})
+        # Active status of the user
+        self.client.get(reverse('snippets:snippet-list'))
+
+    def test_document_reads(self):
+        """
+        Verify snippets are read from their documents in a single query with the same content
+        """
+
+        expected = self.client.get(self.url).json()
+        out = StringIO()
+        call_command('rebuild_snippet_documents', '--workers', '1', stdout=out)
+        self.assertIn('Built 1 documents', out.getvalue())
+
+        # The document and the user vote
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(2, len(queries))
+        self.assertEqual(expected, response.json())
+        self.assertEqual('"1"', response['ETag'])
+
+        response = self.client.get(reverse('snippets:snippet-batch'), {'ids': '{},0'.format(self.snippet.pk)})
+        self.assertEqual([expected, None], response.json()['results'])
+
+    def test_document_updates(self):
+        """
+        Verify documents are dropped with the changes of their snippets, rebuilt after the commit and patched for votes
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.file.content = 'console.log(2)'
+            self.file.save()
+        document = SnippetDocument.objects.get(pk=self.snippet.pk).document
+        self.assertEqual('console.log(2)', document['files'][0]['content'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snippet.upvote(self.user)
+        self.assertEqual(1, SnippetDocument.objects.get(pk=self.snippet.pk).document['upvotes'])
+        self.assertEqual(1, self.client.get(self.url).json()['userVote'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {'name': 'Renamed'})
+        self.assertEqual('Renamed', SnippetDocument.objects.get(pk=self.snippet.pk).document['name'])
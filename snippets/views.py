@@ -1,38 +1,142 @@
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from rest_framework import permissions, filters, mixins
 from rest_framework.decorators import action
 from rest_framework.viewsets import GenericViewSet
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from shared.filter_backends import TopicsFilterBackend
-from shared.mixins import DynamicSerializersMixin, DynamicPermissionsMixin
-from shared.permissions import IsOwner
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from shared.concurrency import format_etag
+from shared.filter_backends import LanguagesFilterBackend, RankingFilterBackend, TopicsFilterBackend
+from shared.mixins import DynamicSerializersMixin, DynamicPermissionsMixin, InstrumentedViewMixin, MultiGetMixin, \
+    NestedResourceMixin, SparseQuerysetMixin, VersionedUpdateMixin
+from shared.models import Vote
+from shared.permissions import IsAdminOrOwner
+from shared.schema import fieldset_parameters
+from shared.serializers import get_fieldset
 from shared.views import BaseModelViewSet
+from users.serializers import UserSerializer
 from .serializers import SnippetWriteSerializer, FileSerializer, BaseSnippetSerializer, SnippetSerializer, \
-    CommentSerializer, CommentWriteSerializer, SnippetCreateSerializer
+    CommentSerializer, CommentWriteSerializer, SnippetCreateSerializer, RelatedSnippetSerializer, \
+    SnippetBatchSerializer, SnippetPreviewBatchSerializer, SnippetPageSerializer
 from .models import Snippet, File, Comment
+from .documents import get_documents
+from .facets import TopicFacetsMixin
+from .jobs import enqueue_snippet_jobs
+from .pages import get_cached_page, get_version, set_cached_page
+from .rendering import preload_renderings, rendering_requested
+from .similarity import DUPLICATE_THRESHOLD, related_snippets
+
+render_parameter = OpenApiParameter(
+    name='render',
+    type=str,
+    enum=['html'],
+    location=OpenApiParameter.QUERY,
+    required=False,
+    description='Add the rendered HTML of the descriptions and files, null until rendered.'
+)
+
+if_match_parameter = OpenApiParameter(
+    name='If-Match',
+    type=str,
+    location=OpenApiParameter.HEADER,
+    required=False,
+    description='ETag of the snippet when it was fetched, like "3". The update fails with a 412 when the snippet '
+                'was modified since.'
+)
+
+batch_parameters = [
+    OpenApiParameter(
+        name='ids',
+        type={'type': 'array', 'items': {'type': 'integer'}},
+        location=OpenApiParameter.QUERY,
+        required=True,
+        explode=False,
+        description='Ids of the snippets, at most 50.'
+    ),
+    render_parameter,
+]
+
+snippet_list_parameters = [
+    OpenApiParameter(
+        name='topics',
+        type={'type': 'array', 'items': {'type': 'number'}},
+        location=OpenApiParameter.QUERY,
+        required=False,
+        explode=False,
+        description='Alias of topics_any.'
+    ),
+    OpenApiParameter(
+        name='topics_any',
+        type={'type': 'array', 'items': {'type': 'number'}},
+        location=OpenApiParameter.QUERY,
+        required=False,
+        explode=False,
+        description='Snippets having at least one of the topics.'
+    ),
+    OpenApiParameter(
+        name='topics_all',
+        type={'type': 'array', 'items': {'type': 'number'}},
+        location=OpenApiParameter.QUERY,
+        required=False,
+        explode=False,
+        description='Snippets having all the topics.'
+    ),
+    OpenApiParameter(
+        name='facets',
+        type=str,
+        enum=['topics'],
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description='Add the number of snippets per topic for the current filters to the page.'
+    ),
+    OpenApiParameter(
+        name='languages',
+        type={'type': 'array', 'items': {'type': 'string'}},
+        location=OpenApiParameter.QUERY,
+        required=False,
+        explode=False,
+        description='Snippets having a file in one of the languages, like python or javascript.'
+    ),
+    render_parameter,
+    OpenApiParameter(
+        name='ordering',
+        type=str,
+        enum=['new', 'trending', 'top_day', 'top_week', 'controversial'],
+        location=OpenApiParameter.QUERY,
+        required=False
+    ),
+]
+
+
+def comment_tree(snippet_id):
+    """Active top level comments of a snippet with their authors and replies."""
+
+    replies = Comment.objects.select_related('user__stats').prefetch_related('replies')
+    return Comment.objects.filter(snippet_id=snippet_id, active=True, parent=None) \
+        .select_related('user__stats').prefetch_related(Prefetch('replies', queryset=replies))
 
 
 @extend_schema_view(
-    list=extend_schema(description='Get paginated list of snippets.', parameters=[
-        OpenApiParameter(
-            name='topics',
-            type={'type': 'array', 'items': {'type': 'number'}},
-            location=OpenApiParameter.QUERY,
-            required=False,
-            explode=False
-        )
-    ]),
-    retrieve=extend_schema(description='Get snippet.'),
+    list=extend_schema(description='Get paginated list of snippets.', parameters=snippet_list_parameters),
+    retrieve=extend_schema(description='Get snippet.', parameters=[render_parameter]),
+    batch=extend_schema(description='Get many snippets by id, in the order of the ids.',
+                        parameters=batch_parameters + fieldset_parameters(SnippetSerializer),
+                        responses=SnippetBatchSerializer),
     create=extend_schema(description='Create snippet.'),
-    update=extend_schema(description='Update snippet.'),
-    partial_update=extend_schema(description='Partially update snippet.'),
+    update=extend_schema(description='Update snippet.', parameters=[if_match_parameter]),
+    partial_update=extend_schema(description='Partially update snippet.', parameters=[if_match_parameter]),
     destroy=extend_schema(description='Delete snippet.'),
 )
-class SnippetViewSet(BaseModelViewSet):
-    queryset = Snippet.objects.all()
+class SnippetViewSet(VersionedUpdateMixin, TopicFacetsMixin, MultiGetMixin, BaseModelViewSet):
+    queryset = Snippet.objects.prefetch_related('topics', 'files')
     search_fields = ['name', 'description', 'file__name', 'file__content']
-    filter_backends = (TopicsFilterBackend, filters.SearchFilter)
+    filter_backends = (TopicsFilterBackend, LanguagesFilterBackend, filters.SearchFilter, RankingFilterBackend)
 
     serializer_class = SnippetSerializer
     serializer_classes_by_action = {
@@ -43,13 +147,57 @@ class SnippetViewSet(BaseModelViewSet):
 
     permission_classes_by_action = {
         'create': (permissions.IsAuthenticated,),
-        'update': (permissions.IsAdminUser | IsOwner,),
-        'partial_update': (permissions.IsAdminUser | IsOwner,),
-        'destroy': (permissions.IsAdminUser | IsOwner,),
+        'update': (IsAdminOrOwner,),
+        'partial_update': (IsAdminOrOwner,),
+        'destroy': (IsAdminOrOwner,),
         'upvote_snippet': (permissions.IsAuthenticated,),
         'downvote_snippet': (permissions.IsAuthenticated,),
     }
 
+    def reads_documents(self):
+        # Documents are whole snippets, without the renderings
+        return get_fieldset(self.request) == (None, None) and not rendering_requested({'request': self.request})
+
+    def add_user_votes(self, representations):
+        if self.request.user.is_authenticated:
+            votes = Vote.scores_for(self.request.user, [Snippet(id=snippet_id) for snippet_id in representations])
+            for snippet_id, representation in representations.items():
+                representation['userVote'] = votes.get(snippet_id, 0)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Snippets are read from their documents in a single query, see
+        snippets.documents, and serialized when they have none yet.
+        """
+
+        pk = self.kwargs['pk']
+        if not self.reads_documents() or not pk.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+
+        document = get_documents([int(pk)]).get(int(pk))
+        if document is None:
+            response = super().retrieve(request, *args, **kwargs)
+            enqueue_snippet_jobs('snippets.build_documents', [int(pk)])
+            return response
+
+        self.add_user_votes({document['id']: document})
+        response = Response(document)
+        response['ETag'] = format_etag(document['version'])
+        return response
+
+    def get_batch_representations(self, ids):
+        if not self.reads_documents():
+            return super().get_batch_representations(ids)
+
+        documents = get_documents(ids)
+        self.add_user_votes(documents)
+        missing = [snippet_id for snippet_id in ids if snippet_id not in documents]
+        if missing:
+            representations = super().get_batch_representations(missing)
+            enqueue_snippet_jobs('snippets.build_documents', list(representations))
+            documents.update(representations)
+        return documents
+
     @action(methods=["get"], detail=True, url_path='upvote', url_name="upvote")
     def upvote_snippet(self, request, pk):
         """
@@ -74,51 +222,139 @@ class SnippetViewSet(BaseModelViewSet):
         serializer = self.get_serializer(snippet)
         return Response(serializer.data)
 
+    @extend_schema(description='Get a snippet with its files, author, first page of comments and vote state.',
+                   parameters=[render_parameter], responses=SnippetPageSerializer)
+    @action(methods=["get"], detail=True, url_path='page', url_name="page")
+    def page(self, request, pk):
+        """
+        Everything a snippet page shows in a single request. The parts shared by
+        all the users are cached per version of the snippet, which changes with
+        the snippet, its files, topics, comments and votes. Only the user vote is
+        queried for every request.
+
+        The statistics of the author and of the comments' authors also change with
+        their other snippets, comments and votes, they can be up to
+        SNIPPET_PAGE_CACHE_TTL seconds old.
+        """
+
+        try:
+            snippet_id = int(pk)
+        except ValueError:
+            raise Http404
+        context = self.get_serializer_context()
+        # Whole pages, they are cached regardless of the fields parameters
+        context['fieldset'] = None
+        rendered = rendering_requested(context)
+
+        # Before loading the page, see set_cached_page
+        version = get_version(snippet_id)
+        page = get_cached_page(snippet_id, version, rendered)
+        if page is None:
+            snippet = get_object_or_404(self.queryset.select_related('user__stats'), id=snippet_id)
+            # The user vote is added below, outside of the cached page
+            context['user_votes'] = {snippet.id: 0}
+            comments = Paginator(comment_tree(snippet.id), api_settings.PAGE_SIZE).page(1)
+            next_url = None
+            if comments.has_next():
+                next_url = replace_query_param(request.build_absolute_uri(
+                    reverse('snippets:snippet-comments-list', kwargs={'snippet_id': snippet.id})), 'page', 2)
+
+            page = {
+                'snippet': SnippetSerializer(snippet, context=context).data,
+                'author': UserSerializer(snippet.user, context=context).data,
+                'comments': {
+                    'count': comments.paginator.count,
+                    'next': next_url,
+                    'results': CommentSerializer(comments.object_list, many=True, context=context).data,
+                },
+            }
+            page['snippet'].pop('userVote', None)
+            # Not rendered yet, cached once they are
+            if None not in context.get('renderings', {}).values():
+                set_cached_page(snippet_id, version, rendered, page)
+
+        if request.user.is_authenticated:
+            score = Vote.scores_for(request.user, [Snippet(id=snippet_id)]).get(snippet_id, 0)
+            page = dict(page, snippet=dict(page['snippet'], userVote=score))
+        return Response(page)
+
+    @extend_schema(description='Get the near-duplicates and related snippets of a snippet, most similar first.',
+                   parameters=[OpenApiParameter(name='limit', type=int, location=OpenApiParameter.QUERY,
+                                                required=False)],
+                   responses=RelatedSnippetSerializer(many=True))
+    @action(methods=["get"], detail=True, url_path='related', url_name="related")
+    def related(self, request, pk):
+        """
+        Snippets whose files are similar to the snippet's ones, "duplicate" is set
+        from an estimated similarity of 0.8.
+        """
+
+        get_object_or_404(Snippet, id=pk)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+
+        similarities = related_snippets(int(pk), limit)
+        snippets = Snippet.objects.prefetch_related('topics').in_bulk([snippet_id for snippet_id, _ in similarities])
+        context = self.get_serializer_context()
+        if request.user.is_authenticated:
+            context['user_votes'] = {snippet_id: 0 for snippet_id in snippets}
+            context['user_votes'].update(Vote.scores_for(request.user, snippets.values()))
+        if rendering_requested(context):
+            preload_renderings(context, snippets=snippets.values())
+
+        serializer = RelatedSnippetSerializer([
+            {'snippet': snippets[snippet_id], 'similarity': similarity, 'duplicate': similarity >= DUPLICATE_THRESHOLD}
+            for snippet_id, similarity in similarities if snippet_id in snippets
+        ], many=True, context=context)
+        return Response(serializer.data)
+
 
 @extend_schema_view(
-    list=extend_schema(description='Get paginated list of snippets previews.', parameters=[
-        OpenApiParameter(
-            name='topics',
-            type={'type': 'array', 'items': {'type': 'number'}},
-            location=OpenApiParameter.QUERY,
-            required=False,
-            explode=False
-        )
-    ]),
-    retrieve=extend_schema(description='Get snippet preview.'),
+    list=extend_schema(description='Get paginated list of snippets previews.', parameters=snippet_list_parameters),
+    retrieve=extend_schema(description='Get snippet preview.', parameters=[render_parameter]),
+    batch=extend_schema(description='Get many snippets previews by id, in the order of the ids.',
+                        parameters=batch_parameters + fieldset_parameters(BaseSnippetSerializer),
+                        responses=SnippetPreviewBatchSerializer),
 )
-class SnippetPreviewViewSet(mixins.RetrieveModelMixin,
+class SnippetPreviewViewSet(InstrumentedViewMixin,
+                            SparseQuerysetMixin,
+                            TopicFacetsMixin,
+                            MultiGetMixin,
+                            mixins.RetrieveModelMixin,
                             mixins.ListModelMixin,
                             GenericViewSet):
-    queryset = Snippet.objects.all()
+    queryset = Snippet.objects.prefetch_related('topics')
     search_fields = ['name', 'description', 'file__name', 'file__content']
-    filter_backends = (TopicsFilterBackend, filters.SearchFilter)
+    filter_backends = (TopicsFilterBackend, LanguagesFilterBackend, filters.SearchFilter, RankingFilterBackend)
     serializer_class = BaseSnippetSerializer
 
 
 @extend_schema_view(
-    list=extend_schema(description='Get paginated list of snippet\'s files.'),
-    retrieve=extend_schema(description='Get snippet\'s file.'),
+    list=extend_schema(description='Get paginated list of snippet\'s files.', parameters=[render_parameter]),
+    retrieve=extend_schema(description='Get snippet\'s file.', parameters=[render_parameter]),
     create=extend_schema(description='Create snippet\'s file.'),
     update=extend_schema(description='Update snippet\'s file.'),
     partial_update=extend_schema(description='Partially update snippet\'s file.'),
     destroy=extend_schema(description='Delete snippet\'s file.'),
 )
-class FileViewSet(BaseModelViewSet):
+class FileViewSet(NestedResourceMixin, BaseModelViewSet):
     serializer_class = FileSerializer
     pagination_class = None
+    parent_queryset = Snippet.objects.all()
+    parent_lookup_kwarg = 'snippet_id'
+    owned_by_parent = True
 
     permission_classes_by_action = {
-        'create': (permissions.IsAdminUser | IsOwner,),
-        'update': (permissions.IsAdminUser | IsOwner,),
-        'partial_update': (permissions.IsAdminUser | IsOwner,),
-        'destroy': (permissions.IsAdminUser | IsOwner,),
+        'create': (IsAdminOrOwner,),
+        'update': (IsAdminOrOwner,),
+        'partial_update': (IsAdminOrOwner,),
+        'destroy': (IsAdminOrOwner,),
     }
 
     def get_queryset(self):
-        snippet_id = self.kwargs['snippet_id']
-        get_object_or_404(Snippet, id=snippet_id)
-        return File.objects.filter(snippet__id=snippet_id)
+        return self.prune_queryset(File.objects.filter(snippet_id=self.get_parent().id))
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -127,14 +363,7 @@ class FileViewSet(BaseModelViewSet):
         return context
 
     def perform_create(self, serializer):
-        snippet_id = self.kwargs['snippet_id']
-        get_object_or_404(Snippet, id=snippet_id)
-        serializer.save(snippet_id=snippet_id)
-
-    def perform_update(self, serializer):
-        snippet_id = self.kwargs['snippet_id']
-        get_object_or_404(Snippet, id=snippet_id)
-        serializer.save()
+        serializer.save(snippet_id=self.get_parent().id)
 
 
 @extend_schema_view(
@@ -142,7 +371,10 @@ class FileViewSet(BaseModelViewSet):
     create=extend_schema(description='Create snippet\'s comment.'),
     destroy=extend_schema(description='Delete snippet\'s comment.'),
 )
-class CommentViewSet(mixins.CreateModelMixin,
+class CommentViewSet(InstrumentedViewMixin,
+                     NestedResourceMixin,
+                     SparseQuerysetMixin,
+                     mixins.CreateModelMixin,
                      mixins.ListModelMixin,
                      mixins.DestroyModelMixin,
                      DynamicSerializersMixin,
@@ -150,7 +382,7 @@ class CommentViewSet(mixins.CreateModelMixin,
                      GenericViewSet):
     permission_classes_by_action = {
         'create': (permissions.IsAuthenticated,),
-        'destroy': (permissions.IsAdminUser | IsOwner,),
+        'destroy': (IsAdminOrOwner,),
     }
 
     serializer_class = CommentSerializer
@@ -158,13 +390,12 @@ class CommentViewSet(mixins.CreateModelMixin,
         'list': CommentSerializer,
         'create': CommentWriteSerializer,
     }
+    parent_queryset = Snippet.objects.all()
+    parent_lookup_kwarg = 'snippet_id'
 
     def get_queryset(self):
-        snippet_id = self.kwargs['snippet_id']
-        get_object_or_404(Snippet, id=snippet_id)
-        return Comment.objects.filter(snippet__id=snippet_id, active=True, parent=None)
+        return self.prune_queryset(comment_tree(self.get_parent().id))
 
     def perform_create(self, serializer):
         user = self.request.user
-        snippet_id = self.kwargs['snippet_id']
-        serializer.save(user=user, snippet_id=snippet_id)
+        serializer.save(user=user, snippet_id=self.get_parent().id)
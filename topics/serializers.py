@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from shared.serializers import SparseFieldsetsMixin
 from .models import Topic
 
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = Topic
         fields = ('id', 'name', 'color', 'icon')
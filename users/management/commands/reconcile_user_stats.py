@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import User
+from users.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalised statistics of the users and fix the drifted ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of users per batch.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted statistics.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last_id = 0
+        users = 0
+        missing = 0
+        drifted = 0
+        while True:
+            ids = list(User.objects.filter(id__gt=last_id).order_by('id')
+                       .values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                batch_missing, batch_drifted = reconcile(ids, fix=not options['dry_run'])
+            missing += batch_missing
+            drifted += batch_drifted
+            users += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            '{} {} missing and {} drifted statistics of {} users in {:.2f}s.'.format(
+                'Found' if options['dry_run'] else 'Fixed', missing, drifted, users, time.perf_counter() - started)))
@@ -0,0 +1,62 @@
+# Generated by Django 4.0.3 on 2026-10-19 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def _aggregate(model, aggregate, **filters):
+    # Correlated subquery of the aggregate of the user's rows, 0 for users without rows
+    subquery = model.objects.filter(user_id=OuterRef('id'), **filters).order_by().values('user_id') \
+        .annotate(value=aggregate).values('value')
+    return Coalesce(Subquery(subquery), Value(0))
+
+
+def create_user_stats(apps, schema_editor):
+    """Compute the statistics of the existing users, the signals only maintain them from here on."""
+
+    User = apps.get_model('users', 'User')
+    UserStats = apps.get_model('users', 'UserStats')
+    Snippet = apps.get_model('snippets', 'Snippet')
+    Comment = apps.get_model('snippets', 'Comment')
+
+    users = User.objects.order_by('id').annotate(
+        snippet_count=_aggregate(Snippet, Count('id')),
+        comment_count=_aggregate(Comment, Count('id'), active=True),
+        upvotes=_aggregate(Snippet, Sum('upvotes')),
+        downvotes=_aggregate(Snippet, Sum('downvotes')),
+    ).values_list('id', 'snippet_count', 'comment_count', 'upvotes', 'downvotes')
+    batch = []
+    for user_id, snippet_count, comment_count, upvotes, downvotes in users.iterator():
+        batch.append(UserStats(user_id=user_id, snippet_count=snippet_count, comment_count=comment_count,
+                               upvotes=upvotes, downvotes=downvotes))
+        if len(batch) == BATCH_SIZE:
+            UserStats.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    UserStats.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_claimsuser'),
+        ('snippets', '0007_snippet_downvotes_snippet_upvotes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('snippet_count', models.IntegerField(default=0)),
+                ('comment_count', models.IntegerField(default=0)),
+                ('upvotes', models.IntegerField(default=0)),
+                ('downvotes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_user_stats, migrations.RunPython.noop),
+    ]
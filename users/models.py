@@ -7,3 +7,51 @@ class User(AbstractUser):
 
     class Meta:
         ordering = ['-id']
+
+
+class UserStats(models.Model):
+    """
+    Denormalised statistics of a user, maintained incrementally by the signals
+    of users.signals and checked by the reconcile_user_stats command, which is
+    run by hand or on a schedule.
+
+    The votes are the ones received by the user's snippets, downvotes being
+    negative like the snippets' ones.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    snippet_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+
+    @property
+    def karma(self):
+        return self.upvotes + self.downvotes
+
+
+class ClaimsUser(User):
+    """
+    User built from the claims of an access token without querying the database.
+
+    Fields missing from the claims are deferred, the first access to any of them
+    loads all of them in a single query.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, claims):
+        return cls.from_db(None, list(claims), list(claims.values()))
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred_fields = self.get_deferred_fields()
+        if fields is not None and deferred_fields.issuperset(fields):
+            fields = list(deferred_fields)
+        super().refresh_from_db(using, fields)
@@ -1,15 +1,33 @@
 from rest_framework import serializers
-from .models import User
+from shared.serializers import SparseFieldsetsMixin
+from .models import User, UserStats
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserStatsSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    karma = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UserStats
+        fields = ('snippet_count',
+                  'comment_count',
+                  'upvotes',
+                  'downvotes',
+                  'karma')
+        read_only_fields = fields
+        field_sources = {'karma': ['upvotes', 'downvotes']}
+
+
+class UserSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    stats = UserStatsSerializer(read_only=True)
+
     class Meta:
         model = User
         fields = ('id',
                   'username',
                   'first_name',
                   'last_name',
-                  'date_joined')
+                  'date_joined',
+                  'stats')
 
 
 class UpdateUserSerializer(serializers.ModelSerializer):
@@ -20,7 +38,9 @@ class UpdateUserSerializer(serializers.ModelSerializer):
                   'last_name')
 
 
-class FullUserSerializer(serializers.ModelSerializer):
+class FullUserSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    stats = UserStatsSerializer(read_only=True)
+
     class Meta:
         model = User
         fields = ('id',
@@ -28,4 +48,5 @@ class FullUserSerializer(serializers.ModelSerializer):
                   'email',
                   'first_name',
                   'last_name',
-                  'date_joined')
+                  'date_joined',
+                  'stats')
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shared.models import score_changed
+from snippets.models import Snippet, Comment
+from .models import User, UserStats
+from .stats import increment, recount_comments
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Snippet)
+def count_created_snippet(sender, instance, created, **kwargs):
+    if created:
+        increment(instance.user_id, snippet_count=1)
+
+
+@receiver(post_delete, sender=Snippet)
+def count_deleted_snippet(sender, instance, **kwargs):
+    # Votes received by the snippet are no longer part of the author's ones
+    increment(instance.user_id, snippet_count=-1, upvotes=-instance.upvotes, downvotes=-instance.downvotes)
+
+
+@receiver(score_changed, sender=Snippet)
+def count_snippet_votes(sender, instance, upvotes, downvotes, **kwargs):
+    increment(instance.user_id, upvotes=upvotes, downvotes=downvotes)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        increment(instance.user_id, comment_count=1 if instance.active else 0)
+    else:
+        # Hidden and restored comments, only through the admin
+        recount_comments(instance.user_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    increment(instance.user_id, comment_count=-1 if instance.active else 0)
@@ -0,0 +1,64 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from users.models import User, UserStats
+
+FIELDS = ('snippet_count', 'comment_count', 'upvotes', 'downvotes')
+
+
+def increment(user_id, **deltas):
+    """Add the deltas to the statistics of a user in a single UPDATE, safe with concurrent writes."""
+
+    deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if deltas:
+        UserStats.objects.filter(user_id=user_id).update(**deltas)
+
+
+def _aggregate(queryset, aggregate):
+    # Correlated subquery of the aggregate grouped by user, 0 for users without rows
+    subquery = queryset.filter(user_id=OuterRef('user_id')).order_by().values('user_id') \
+        .annotate(value=aggregate).values('value')
+    return Coalesce(Subquery(subquery), Value(0))
+
+
+def expected_stats():
+    """Expressions of the statistics of the users computed from the snippets and comments, by field."""
+
+    from snippets.models import Snippet, Comment
+
+    return {
+        'snippet_count': _aggregate(Snippet.objects.all(), Count('id')),
+        'comment_count': _aggregate(Comment.objects.filter(active=True), Count('id')),
+        'upvotes': _aggregate(Snippet.objects.all(), Sum('upvotes')),
+        'downvotes': _aggregate(Snippet.objects.all(), Sum('downvotes')),
+    }
+
+
+def recount_comments(user_id):
+    UserStats.objects.filter(user_id=user_id).update(comment_count=expected_stats()['comment_count'])
+
+
+def reconcile(user_ids, fix=True):
+    """
+    Compare the statistics of the users with the ones recomputed from the
+    snippets and comments, and overwrite the drifted ones when fixing.
+
+    Missing statistics are created. Each step is a single statement over all
+    the users, the expected values are correlated subqueries using the
+    snippets and comments user indexes. Returns the numbers of users with
+    missing and with drifted statistics.
+    """
+
+    missing = list(User.objects.filter(id__in=user_ids, stats__isnull=True).values_list('id', flat=True))
+    if fix and missing:
+        UserStats.objects.bulk_create([UserStats(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+
+    expected = expected_stats()
+    drifted = UserStats.objects.filter(user_id__in=user_ids) \
+        .annotate(**{'expected_' + field: expected[field] for field in FIELDS}) \
+        .filter(Q(*[~Q(**{field: F('expected_' + field)}) for field in FIELDS], _connector=Q.OR))
+    drifted = list(drifted.values_list('user_id', flat=True))
+
+    if fix and drifted:
+        UserStats.objects.filter(user_id__in=drifted).update(**expected)
+    return len(missing), len(drifted)
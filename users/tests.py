@@ -1,3 +1,98 @@
-from django.test import TestCase
+from importlib import import_module
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from snippets.models import Snippet, Comment
+from users.models import User, UserStats
+
+
+class UserStatsTestCase(APITestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@snip.com', password='test_pass')
+        self.voter = User.objects.create_user(username='voter', email='voter@snip.com', password='test_pass')
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual(expected, {field: getattr(stats, field) for field in expected})
+
+    def test_incremental_stats(self):
+        """
+        Verify the statistics follow the snippets, comments and votes writes
+        """
+
+        snippet = Snippet.objects.create(user=self.author, name='Snippet')
+        other = Snippet.objects.create(user=self.author, name='Other snippet')
+        comment = Comment.objects.create(snippet=snippet, user=self.voter, content='Comment')
+        Comment.objects.create(snippet=snippet, user=self.voter, content='Reply', parent=comment)
+        snippet.upvote(self.voter)
+        other.upvote(self.voter)
+        other.downvote(self.voter)
+        self.assertStats(self.author, snippet_count=2, comment_count=0, upvotes=1, downvotes=-1, karma=0)
+        self.assertStats(self.voter, snippet_count=0, comment_count=2, upvotes=0, downvotes=0)
+
+        comment.active = False
+        comment.save()
+        self.assertStats(self.voter, comment_count=1)
+
+        snippet.delete()
+        self.assertStats(self.author, snippet_count=1, upvotes=0, downvotes=-1)
+        self.assertStats(self.voter, comment_count=0)
+
+    def test_user_stats_serialized(self):
+        """
+        Verify the users are listed with their statistics without a query per user
+        """
+
+        Snippet.objects.create(user=self.author, name='Snippet').upvote(self.voter)
+
+        response = self.client.get(reverse('user-user', kwargs={'username': 'author'}))
+        self.assertEqual(
+            {'snippet_count': 1, 'comment_count': 0, 'upvotes': 1, 'downvotes': 0, 'karma': 1},
+            response.json()['stats'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(queries))
+
+    def test_existing_users_stats(self):
+        """
+        Verify the statistics of the users existing before the signals are computed by the migration
+        """
+
+        snippet = Snippet.objects.create(user=self.author, name='Snippet')
+        snippet.upvote(self.voter)
+        Comment.objects.create(snippet=snippet, user=self.voter, content='Comment')
+        Comment.objects.create(snippet=snippet, user=self.voter, content='Deleted', active=False)
+        UserStats.objects.all().delete()
+
+        migration = import_module('users.migrations.0004_user_stats')
+        migration.create_user_stats(apps, None)
+        self.assertStats(self.author, snippet_count=1, comment_count=0, upvotes=1, downvotes=0)
+        self.assertStats(self.voter, snippet_count=0, comment_count=1, upvotes=0, downvotes=0)
+
+    def test_reconcile_user_stats(self):
+        """
+        Verify the reconciliation finds and fixes drifted and missing statistics
+        """
+
+        Snippet.objects.create(user=self.author, name='Snippet').upvote(self.voter)
+        UserStats.objects.filter(user=self.author).update(snippet_count=5, upvotes=0)
+        UserStats.objects.filter(user=self.voter).delete()
+
+        out = StringIO()
+        call_command('reconcile_user_stats', '--dry-run', stdout=out)
+        self.assertIn('Found 1 missing and 1 drifted statistics of 2 users', out.getvalue())
+        self.assertStats(self.author, snippet_count=5, upvotes=0)
+
+        out = StringIO()
+        call_command('reconcile_user_stats', '--batch-size', '1', stdout=out)
+        self.assertIn('Fixed 1 missing and 1 drifted statistics of 2 users', out.getvalue())
+        self.assertStats(self.author, snippet_count=1, upvotes=1)
+        self.assertStats(self.voter, snippet_count=0, comment_count=0)
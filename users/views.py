@@ -3,8 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from rest_framework.viewsets import GenericViewSet
-from shared.mixins import DynamicPermissionsMixin, DynamicSerializersMixin
-from shared.permissions import IsOwner
+from shared.mixins import DynamicPermissionsMixin, DynamicSerializersMixin, InstrumentedViewMixin, SparseQuerysetMixin
+from shared.permissions import IsAdminOrOwner
 from .serializers import FullUserSerializer, UpdateUserSerializer, UserSerializer
 from .models import User
 from snippets.models import Snippet
@@ -18,19 +18,21 @@ from drf_spectacular.utils import extend_schema, extend_schema_view
     partial_update=extend_schema(description='Partially update user data.'),
     destroy=extend_schema(description='Delete a user.'),
 )
-class UserViewSet(DynamicSerializersMixin,
+class UserViewSet(InstrumentedViewMixin,
+                  SparseQuerysetMixin,
+                  DynamicSerializersMixin,
                   DynamicPermissionsMixin,
                   mixins.ListModelMixin,
                   mixins.UpdateModelMixin,
                   mixins.DestroyModelMixin,
                   GenericViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('stats')
     serializer_class = UserSerializer
 
     permission_classes_by_action = {
-        'update': (permissions.IsAdminUser | IsOwner,),
-        'partial_update': (permissions.IsAdminUser | IsOwner,),
-        'destroy': (permissions.IsAdminUser | IsOwner,),
+        'update': (IsAdminOrOwner,),
+        'partial_update': (IsAdminOrOwner,),
+        'destroy': (IsAdminOrOwner,),
         'get_current_user': (permissions.IsAuthenticated,),
         'get_current_user_snippets': (permissions.IsAuthenticated,),
     }
@@ -47,7 +49,7 @@ class UserViewSet(DynamicSerializersMixin,
     def get_user_by_username(self, request, username):
         """Get user data by username."""
 
-        user = get_object_or_404(User, username=username)
+        user = get_object_or_404(self.get_queryset(), username=username)
         serializer = self.get_serializer(user)
         return Response(serializer.data)
 
@@ -55,14 +57,17 @@ class UserViewSet(DynamicSerializersMixin,
     def get_current_user(self, request):
         """Get currently logged user data."""
 
-        serializer = self.get_serializer(request.user)
+        # The fields missing from the token claims and the statistics in a single query
+        user = self.get_queryset().get(pk=request.user.pk)
+        serializer = self.get_serializer(user)
         return Response(serializer.data)
 
     @action(methods=["get"], detail=False, url_path='(?P<username>[^/.]+)/snippets', url_name="snippets")
     def get_user_snippets(self, request, username):
         """Get snippets created by the specified user."""
 
-        user_snippets = Snippet.objects.all().filter(user__username=username).order_by('-id')
+        user_snippets = self.prune_queryset(
+            Snippet.objects.prefetch_related('topics', 'files').filter(user__username=username).order_by('-id'))
 
         page = self.paginate_queryset(user_snippets)
         if page is not None:
@@ -76,7 +81,8 @@ class UserViewSet(DynamicSerializersMixin,
     def get_current_user_snippets(self, request):
         """Get snippets created by currently logged user."""
 
-        user_snippets = Snippet.objects.all().filter(user=request.user).order_by('-id')
+        user_snippets = self.prune_queryset(
+            Snippet.objects.prefetch_related('topics', 'files').filter(user=request.user).order_by('-id'))
 
         page = self.paginate_queryset(user_snippets)
         if page is not None: